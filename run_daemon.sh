@@ -0,0 +1,4 @@
+#!/bin/bash
+cd /home/gramma/sincronizacao_shopify/scripts
+source /home/gramma/sincronizacao_shopify/venv/bin/activate
+exec python3 daemon.py "$@" >> ../logs/daemon.log 2>&1
@@ -0,0 +1,148 @@
+"""Geração de catálogos e pedidos sintéticos para os benchmarks"""
+import random
+from datetime import datetime, timedelta
+
+TAMANHOS_NUMERICOS = ['36', '38', '40', '42']
+TAMANHOS_LETRAS = ['P', 'M', 'G', 'GG']
+NOMES = ['Calça Jeans', 'Camiseta Básica', 'Vestido Midi', 'Saia Plissada', 'Blusa Cropped',
+         'Jaqueta Jacquard', 'Bermuda Sarja', 'Macacão Linho', 'Boné Aba Curva', 'Shorts Alfaiataria']
+MODELOS = ['Maria', 'Saphira', 'Clara', 'Helena', 'Alice', 'Laura', 'Sofia', 'Valentina']
+
+def gerar_catalogo(total_variantes, variantes_por_produto=4, divergencia=0.05,
+                   apenas_hiper=0.02, apenas_shopify=0.02, seed=42):
+    """
+    Gera catálogos equivalentes de Hiper e Shopify
+
+    Args:
+        total_variantes (int): Quantidade aproximada de variantes
+        variantes_por_produto (int): Variantes (tamanhos) por produto
+        divergencia (float): Fração de variantes com estoque diferente entre os lados
+        apenas_hiper (float): Fração de produtos que existem só no Hiper
+        apenas_shopify (float): Fração de produtos que existem só na Shopify
+        seed (int): Semente para gerar sempre o mesmo catálogo
+    Returns:
+        tuple: (lista de produtos Hiper, lista de produtos Shopify no formato REST)
+    """
+    rnd = random.Random(seed)
+    produtos_hiper = []
+    produtos_shopify = []
+    total_produtos = max(1, total_variantes // variantes_por_produto)
+    inicio = datetime(2023, 1, 1)
+
+    for i in range(total_produtos):
+        codigo = 10000 + i
+        nome = f"{rnd.choice(NOMES)} {rnd.choice(MODELOS)} {codigo}"
+        tamanhos = (TAMANHOS_NUMERICOS if i % 2 == 0 else TAMANHOS_LETRAS)[:variantes_por_produto]
+        sku_base = f"C{codigo:07d}"
+        preco = round(rnd.uniform(49.9, 399.9), 2)
+        sorteio = rnd.random()
+        so_hiper = sorteio < apenas_hiper
+        so_shopify = apenas_hiper <= sorteio < apenas_hiper + apenas_shopify
+
+        produto_id = 7000000000000 + i * 10
+        criado_em = (inicio + timedelta(minutes=i * 7)).isoformat() + '-03:00'
+        variantes_shopify = []
+
+        for j, tamanho in enumerate(tamanhos):
+            sku = f"{sku_base}{tamanho}"
+            quantidade = rnd.randint(0, 30)
+            quantidade_shopify = quantidade
+            if rnd.random() < divergencia:
+                quantidade_shopify = max(0, quantidade + rnd.choice([-5, -2, -1, 1, 3, 8]))
+                if quantidade_shopify == quantidade:
+                    quantidade_shopify += 1
+
+            if not so_shopify:
+                produtos_hiper.append({
+                    'codigo': codigo,
+                    'codigoDeBarras': sku,
+                    'nome': f"{nome} - {tamanho}",
+                    'quantidadeEmEstoque': quantidade,
+                    'preco': preco
+                })
+            if not so_hiper:
+                variantes_shopify.append({
+                    'id': 40000000000000 + i * 10 + j,
+                    'product_id': produto_id,
+                    'title': tamanho,
+                    'option1': tamanho,
+                    'sku': sku,
+                    'price': f"{preco:.2f}",
+                    'inventory_item_id': 45000000000000 + i * 10 + j,
+                    'inventory_quantity': quantidade_shopify,
+                    'inventory_management': 'shopify'
+                })
+
+        if variantes_shopify:
+            produtos_shopify.append({
+                'id': produto_id,
+                'title': nome,
+                'vendor': 'Marca não especificada',
+                'product_type': 'Roupas',
+                'created_at': criado_em,
+                'updated_at': criado_em,
+                'status': 'active',
+                'variants': variantes_shopify
+            })
+
+    return produtos_hiper, produtos_shopify
+
+def gerar_pedidos(total_pedidos, produtos_shopify, itens_por_pedido=3, seed=7):
+    """
+    Gera pedidos no formato REST da Shopify usando variantes do catálogo
+
+    Args:
+        total_pedidos (int): Quantidade de pedidos
+        produtos_shopify (list): Catálogo Shopify gerado por gerar_catalogo
+        itens_por_pedido (int): Máximo de itens por pedido
+        seed (int): Semente do gerador
+    """
+    rnd = random.Random(seed)
+    variantes = [(p, v) for p in produtos_shopify for v in p['variants']]
+    pedidos = []
+    inicio = datetime(2024, 6, 1)
+
+    for i in range(total_pedidos):
+        itens = []
+        for j in range(rnd.randint(1, itens_por_pedido)):
+            produto, variante = rnd.choice(variantes)
+            itens.append({
+                'id': 13000000000000 + i * 10 + j,
+                'variant_id': variante['id'],
+                'product_id': produto['id'],
+                'sku': variante['sku'],
+                'title': produto['title'],
+                'price': variante['price'],
+                'quantity': rnd.randint(1, 3),
+                'total_discount': f"{rnd.choice([0, 0, 5, 10]):.2f}"
+            })
+        total = sum(float(item['price']) * item['quantity'] for item in itens)
+        endereco = {
+            'address1': f"Rua {rnd.choice(MODELOS)}, {rnd.randint(1, 999)}",
+            'address2': str(rnd.randint(1, 300)),
+            'company': '',
+            'zip': f"{rnd.randint(10000, 99999)}-{rnd.randint(100, 999)}",
+            'city': 'Curitiba',
+            'province': 'PR'
+        }
+        pedidos.append({
+            'id': 5500000000000 + i,
+            'order_number': 1001 + i,
+            'email': f"cliente{i}@example.com",
+            'created_at': (inicio + timedelta(minutes=i)).isoformat() + '-03:00',
+            'total_price': f"{total:.2f}",
+            'customer': {
+                'id': 6600000000000 + i,
+                'first_name': rnd.choice(MODELOS),
+                'last_name': 'Silva',
+                'phone': f"(41) 9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}"
+            },
+            'billing_address': dict(endereco),
+            'shipping_address': dict(endereco),
+            'total_shipping_price_set': {'shop_money': {'amount': '19.90', 'currency_code': 'BRL'}},
+            'line_items': itens
+        })
+
+    # A Shopify devolve os mais recentes primeiro
+    pedidos.reverse()
+    return pedidos
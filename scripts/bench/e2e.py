@@ -0,0 +1,140 @@
+"""
+Benchmark ponta a ponta offline de sync_stock.main() e sync_orders.main()
+
+Sobe os servidores locais (bench/servidores.py), roda cada sincronização em um
+processo novo e mede tempo total, chamadas de API e pico de memória (RSS).
+
+Uso:
+    python bench/e2e.py --variantes 1000,10000,100000 --latencia 0.02
+    python bench/e2e.py --variantes 1000 --saida bench/baselines/e2e.json
+    python bench/e2e.py --variantes 1000 --comparar bench/baselines/e2e.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+from servidores import iniciar_servidores, parar_servidores, ambiente_para
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOBS = {
+    'estoque': 'sync_stock',
+    'pedidos': 'sync_orders'
+}
+
+def _estatisticas(porta, zerar=False):
+    url = f"http://127.0.0.1:{porta}/__reset" if zerar else f"http://127.0.0.1:{porta}/__stats"
+    requisicao = urllib.request.Request(url, data=b'' if zerar else None, method='POST' if zerar else 'GET')
+    with urllib.request.urlopen(requisicao) as resposta:
+        return json.loads(resposta.read())
+
+def executar_job(job, info, diretorio, log_level='WARNING', extra_args=None):
+    """
+    Roda um job de sincronização em um processo novo contra os servidores locais
+
+    Returns:
+        dict: tempo, pico de RSS (MB), código de saída e chamadas por serviço
+    """
+    modulo = JOBS[job]
+    env = ambiente_para(info)
+    env.update({
+        'SYNC_LOG_DIR': os.path.join(diretorio, 'logs'),
+        'SYNC_CACHE_DIR': os.path.join(diretorio, 'cache'),
+        'LOG_LEVEL': log_level
+    })
+    codigo = f"import sys; sys.argv += {list(extra_args or [])!r}; import {modulo}; {modulo}.main()"
+
+    _estatisticas(info['hiper'], zerar=True)
+    _estatisticas(info['shopify'], zerar=True)
+
+    with open(os.path.join(diretorio, f"{job}.out"), 'w') as saida:
+        inicio = time.perf_counter()
+        processo = subprocess.Popen([sys.executable, '-c', codigo], cwd=SCRIPTS_DIR, env=env,
+                                    stdout=saida, stderr=subprocess.STDOUT)
+        _, status, uso = os.wait4(processo.pid, 0)
+        duracao = time.perf_counter() - inicio
+        processo.returncode = os.waitstatus_to_exitcode(status)
+
+    hiper = _estatisticas(info['hiper'])
+    shopify = _estatisticas(info['shopify'])
+    return {
+        'job': job,
+        'segundos': round(duracao, 3),
+        'pico_rss_mb': round(uso.ru_maxrss / 1024, 1),
+        'codigo_saida': processo.returncode,
+        'chamadas_hiper': hiper['total'],
+        'chamadas_shopify': shopify['total'],
+        'chamadas_limitadas': hiper['limitadas'] + shopify['limitadas'],
+        'rotas': {'hiper': hiper['rotas'], 'shopify': shopify['rotas']}
+    }
+
+def rodar(tamanhos, jobs, latencia, taxa_rest, locations, log_level, extra_args=None):
+    """Roda os jobs para cada tamanho de catálogo com servidores novos"""
+    resultados = []
+    for variantes in tamanhos:
+        info = iniciar_servidores(variantes, latencia=latencia, taxa_rest=taxa_rest, locations=locations)
+        try:
+            for job in jobs:
+                with tempfile.TemporaryDirectory(prefix='bench_e2e_') as diretorio:
+                    resultado = executar_job(job, info, diretorio, log_level, extra_args)
+                resultado['variantes'] = variantes
+                resultados.append(resultado)
+                print(f"{job:<8} {variantes:>7} variantes  {resultado['segundos']:>9.2f}s  "
+                      f"{resultado['chamadas_hiper']:>4} Hiper  {resultado['chamadas_shopify']:>6} Shopify  "
+                      f"{resultado['chamadas_limitadas']:>5} 429  {resultado['pico_rss_mb']:>8.1f} MB  "
+                      f"(saída {resultado['codigo_saida']})")
+        finally:
+            parar_servidores(info)
+    return resultados
+
+def comparar(resultados, baseline, tolerancia):
+    """Retorna as regressões acima da tolerância em relação à baseline"""
+    anteriores = {(r['job'], r['variantes']): r for r in baseline}
+    regressoes = []
+    for atual in resultados:
+        anterior = anteriores.get((atual['job'], atual['variantes']))
+        if not anterior:
+            continue
+        for metrica in ('segundos', 'pico_rss_mb', 'chamadas_shopify', 'chamadas_hiper'):
+            if anterior[metrica] and atual[metrica] > anterior[metrica] * (1 + tolerancia):
+                regressoes.append(
+                    f"{atual['job']} {atual['variantes']}: {metrica} {anterior[metrica]} -> {atual[metrica]}"
+                )
+    return regressoes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta offline")
+    parser.add_argument('--variantes', default='1000,10000,100000',
+                        help="Tamanhos de catálogo separados por vírgula")
+    parser.add_argument('--jobs', default='estoque,pedidos')
+    parser.add_argument('--latencia', type=float, default=0.0, help="Latência por requisição (s)")
+    parser.add_argument('--taxa-rest', type=float, default=2.0, help="Chamadas REST/s (0 = sem limite)")
+    parser.add_argument('--locations', type=int, default=1)
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--saida', help="Grava os resultados em JSON (ex: nova baseline)")
+    parser.add_argument('--comparar', help="Baseline JSON para detectar regressões")
+    parser.add_argument('--tolerancia', type=float, default=0.2)
+    args = parser.parse_args()
+
+    tamanhos = [int(v) for v in args.variantes.split(',') if v]
+    jobs = [j for j in args.jobs.split(',') if j]
+    resultados = rodar(tamanhos, jobs, args.latencia, args.taxa_rest, args.locations, args.log_level)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"Resultados salvos em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            regressoes = comparar(resultados, json.load(f), args.tolerancia)
+        if regressoes:
+            print("\nRegressões encontradas:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            sys.exit(1)
+        print("Nenhuma regressão acima da tolerância")
@@ -0,0 +1,135 @@
+"""
+Teste local da sincronização em fatias (sync_shards.py) com vários processos
+
+Sobe os servidores locais (bench/servidores.py), roda o coordenador com N
+trabalhadores locais, derruba um deles no meio das escritas (SIGKILL) e
+confere que toda fatia recebeu trabalho, que a queda aconteceu e a fatia foi
+reatribuída, que a loja não devolveu 429 com o orçamento dividido e que uma
+segunda execução não encontra nada a gravar.
+
+Uso:
+    python bench/fatias.py --variantes 20000 --fatias 3
+    python bench/fatias.py --variantes 20000 --fatias 3 --matar 1 --apos 50
+    python bench/fatias.py --variantes 5000 --fatias 2 --matar -1   # sem queda
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+
+from servidores import iniciar_servidores, parar_servidores, ambiente_para
+from e2e import _estatisticas
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _confirmadas(caminho):
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return sum(1 for linha in f if '"confirmada"' in linha)
+    except FileNotFoundError:
+        return 0
+
+def derrubar_trabalhador(diretorio, fatia, apos, coordenador, limite=300):
+    """Mata o trabalhador da fatia depois de `apos` escritas confirmadas; devolve o pid ou None"""
+    journal = os.path.join(diretorio, f"fatia_{fatia}.journal")
+    pulso = os.path.join(diretorio, f"fatia_{fatia}.pulso")
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim and coordenador.poll() is None:
+        if _confirmadas(journal) >= apos:
+            try:
+                with open(pulso, 'r', encoding='utf-8') as f:
+                    pid = json.load(f)['pid']
+            except (OSError, ValueError, KeyError):
+                time.sleep(0.1)
+                continue
+            os.kill(pid, signal.SIGKILL)
+            return pid
+        time.sleep(0.1)
+    return None
+
+def executar_coordenador(env, diretorio, fatias, matar=-1, apos=0, limite=600):
+    """Roda o coordenador num processo novo; opcionalmente derruba um trabalhador"""
+    comando = [sys.executable, os.path.join(SCRIPTS_DIR, 'sync_shards.py'), 'coordenar',
+               '--fatias', str(fatias), '--dir', diretorio]
+    inicio = time.perf_counter()
+    with open(os.path.join(diretorio, 'coordenador.out'), 'a') as saida:
+        processo = subprocess.Popen(comando, cwd=SCRIPTS_DIR, env=env, stdout=saida, stderr=subprocess.STDOUT)
+        morto = derrubar_trabalhador(diretorio, matar, apos, processo) if matar >= 0 else None
+        processo.wait(timeout=limite)
+    with open(os.path.join(diretorio, 'resumo.json'), 'r', encoding='utf-8') as f:
+        resumo = json.load(f)
+    return {
+        'segundos': round(time.perf_counter() - inicio, 3),
+        'codigo_saida': processo.returncode,
+        'trabalhador_derrubado': morto,
+        'resumo': resumo
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste local da sincronização em fatias")
+    parser.add_argument('--variantes', type=int, default=20000)
+    parser.add_argument('--fatias', type=int, default=3)
+    parser.add_argument('--matar', type=int, default=1, help="Fatia cujo trabalhador é derrubado (-1 = nenhuma)")
+    parser.add_argument('--apos', type=int, default=50, help="Escritas confirmadas antes da queda")
+    parser.add_argument('--latencia', type=float, default=0.02)
+    parser.add_argument('--taxa-rest', type=float, default=20.0)
+    parser.add_argument('--locations', type=int, default=1)
+    args = parser.parse_args()
+
+    info = iniciar_servidores(args.variantes, latencia=args.latencia, taxa_rest=args.taxa_rest,
+                              locations=args.locations)
+    try:
+        with tempfile.TemporaryDirectory(prefix='bench_fatias_') as base:
+            env = dict(os.environ, **ambiente_para(info))
+            env.update({
+                'SYNC_LOG_DIR': os.path.join(base, 'logs'),
+                'SYNC_CACHE_DIR': os.path.join(base, 'cache'),
+                'SHOPIFY_REST_TAXA': str(args.taxa_rest),
+                'SHOPIFY_REST_BALDE': str(int(args.taxa_rest * 2)),
+                'FATIA_PULSO': '0.5',
+                'FATIA_PULSO_LIMITE': '10',
+                'LOG_LEVEL': 'WARNING'
+            })
+            diretorio = os.path.join(base, 'fatias')
+            os.makedirs(diretorio)
+
+            _estatisticas(info['shopify'], zerar=True)
+            primeira = executar_coordenador(env, diretorio, args.fatias, args.matar, args.apos)
+            shopify = _estatisticas(info['shopify'])
+            resumo = primeira['resumo']
+            print(f"1ª execução: {primeira['segundos']:.2f}s, saída {primeira['codigo_saida']}, "
+                  f"trabalhador derrubado: {primeira['trabalhador_derrubado']}")
+            print(f"  planejadas {resumo['planejadas']}, confirmadas {resumo['confirmadas']}, "
+                  f"erros {resumo['erros']}, reatribuições {resumo['reatribuicoes']}, "
+                  f"abandonadas {resumo['abandonadas']}")
+            for fatia in resumo['por_fatia']:
+                print(f"  fatia {fatia['fatia']}: {fatia['planejadas']} planejadas, "
+                      f"{fatia['gravadas_agora']} gravadas pelo último trabalhador (pid {fatia['pid']})")
+            print(f"  Shopify: {shopify['total']} chamadas, {shopify['limitadas']} 429, rotas {shopify['rotas']}")
+
+            segunda = executar_coordenador(env, diretorio, args.fatias)
+            print(f"2ª execução: {segunda['segundos']:.2f}s, planejadas {segunda['resumo']['planejadas']}")
+
+            falhas = []
+            if resumo['confirmadas'] != resumo['planejadas'] or resumo['abandonadas']:
+                falhas.append("nem todas as alterações foram confirmadas")
+            vazias = [fatia['fatia'] for fatia in resumo['por_fatia'] if not fatia['planejadas']]
+            if vazias or len(resumo['por_fatia']) < args.fatias:
+                falhas.append(f"fatias sem alterações planejadas: {vazias or 'sem resultado'}")
+            if args.matar >= 0 and not primeira['trabalhador_derrubado']:
+                falhas.append(f"o trabalhador da fatia {args.matar} não chegou a {args.apos} escritas e não foi derrubado")
+            elif args.matar >= 0 and not resumo['reatribuicoes']:
+                falhas.append("a fatia do trabalhador derrubado não foi reatribuída")
+            if shopify['limitadas']:
+                falhas.append(f"a loja devolveu {shopify['limitadas']} respostas 429")
+            if segunda['resumo']['planejadas']:
+                falhas.append("a segunda execução ainda encontrou alterações")
+            for falha in falhas:
+                print(f"FALHA: {falha}")
+            sys.exit(1 if falhas else 0)
+    finally:
+        parar_servidores(info)
@@ -0,0 +1,139 @@
+"""
+Benchmark de inicialização dos pontos de entrada (python -X importtime)
+
+Cada rodada importa o módulo num interpretador novo e lê o relatório do
+-X importtime: tempo acumulado do import, tempo total do processo e os
+pacotes mais pesados. Também confere que módulos pesados que o ponto de
+entrada não usa (ex: biblioteca shopify, NumPy, pandas) não foram carregados.
+
+A sincronização direcionada (sync_stock --sku) tem um orçamento de
+inicialização salvo na baseline; ultrapassá-lo além do limite falha o
+benchmark.
+
+Uso:
+    python bench/inicializacao.py                 # compara com bench/baselines/inicializacao.json
+    python bench/inicializacao.py --salvar        # grava uma nova baseline
+    python bench/inicializacao.py --modulos sync_stock --rodadas 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PADRAO = os.path.join(BENCH_DIR, 'baselines', 'inicializacao.json')
+
+# Módulos que cada ponto de entrada não deve carregar na inicialização
+PROIBIDOS = {
+    'sync_stock': ('shopify', 'pyactiveresource', 'numpy', 'pandas', 'reportlab'),
+    'sync_prices': ('shopify', 'pyactiveresource', 'numpy', 'pandas', 'reportlab'),
+    'sync_lojas': ('shopify', 'pyactiveresource', 'numpy', 'pandas', 'reportlab'),
+    'sync_shards': ('shopify', 'pyactiveresource', 'numpy', 'pandas', 'reportlab'),
+    'sync_orders': ('numpy', 'pandas', 'reportlab'),
+    'daemon': ('numpy', 'pandas', 'reportlab')
+}
+
+# Ponto de entrada com orçamento de inicialização (a sincronização direcionada)
+ORCAMENTO = 'sync_stock'
+
+def _ler_importtime(saida):
+    """Linhas do -X importtime como (módulo, profundidade, próprio us, acumulado us)"""
+    registros = []
+    for linha in saida.splitlines():
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        proprio, acumulado, nome = linha[len('import time:'):].split('|', 2)
+        # Um espaço depois da barra e mais dois por nível de aninhamento
+        profundidade = (len(nome) - len(nome.lstrip()) - 1) // 2
+        registros.append((nome.strip(), profundidade, int(proprio), int(acumulado)))
+    return registros
+
+def medir_modulo(modulo, rodadas, env):
+    """Importa o módulo em `rodadas` interpretadores novos e resume os tempos"""
+    acumulados, totais, pesados, carregados = [], [], {}, set()
+    for _ in range(rodadas):
+        inicio = time.perf_counter()
+        processo = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {modulo}"],
+                                  cwd=SCRIPTS_DIR, env=env, capture_output=True, text=True)
+        totais.append(time.perf_counter() - inicio)
+        if processo.returncode != 0:
+            raise RuntimeError(f"Falha ao importar {modulo}: {processo.stderr.strip().splitlines()[-1]}")
+        registros = _ler_importtime(processo.stderr)
+        carregados.update(nome for nome, _, _, _ in registros)
+        acumulados.append(next(us for nome, prof, _, us in registros if nome == modulo and prof == 0))
+        # Imports diretos do módulo, agrupados por pacote raiz
+        for nome, profundidade, _, us in registros:
+            if profundidade == 1:
+                raiz = nome.split('.')[0]
+                pesados.setdefault(raiz, []).append(us)
+    return {
+        'import_ms': round(statistics.median(acumulados) / 1000, 2),
+        'processo_ms': round(statistics.median(totais) * 1000, 2),
+        'mais_pesados': sorted(((raiz, round(statistics.median(us) / 1000, 2)) for raiz, us in pesados.items()),
+                               key=lambda item: -item[1])[:5],
+        'proibidos_carregados': sorted(
+            nome for nome in carregados
+            if nome.split('.')[0] in PROIBIDOS.get(modulo, ())
+        )
+    }
+
+def comparar(resultados, baseline, limite):
+    """Orçamento da sincronização direcionada e módulos pesados carregados à toa"""
+    problemas = []
+    for modulo, resultado in resultados.items():
+        if resultado['proibidos_carregados']:
+            raizes = sorted({nome.split('.')[0] for nome in resultado['proibidos_carregados']})
+            problemas.append(f"{modulo}: carrega {', '.join(raizes)} na inicialização")
+    orcamento = baseline.get('orcamento', {}).get(ORCAMENTO)
+    atual = resultados.get(ORCAMENTO)
+    if orcamento and atual:
+        for metrica in ('import_ms', 'processo_ms'):
+            if atual[metrica] > orcamento[metrica] * (1 + limite):
+                problemas.append(f"{ORCAMENTO}: {metrica} {atual[metrica]} acima do orçamento {orcamento[metrica]}")
+    return problemas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de inicialização com -X importtime")
+    parser.add_argument('--modulos', default=','.join(PROIBIDOS), help="Pontos de entrada separados por vírgula")
+    parser.add_argument('--rodadas', type=int, default=10)
+    parser.add_argument('--baseline', default=BASELINE_PADRAO)
+    parser.add_argument('--salvar', action='store_true', help="Grava os resultados como nova baseline")
+    parser.add_argument('--limite', type=float, default=0.3, help="Folga tolerada sobre o orçamento (fração)")
+    args = parser.parse_args()
+
+    # Evita que importar config crie a pasta de logs do projeto
+    env = dict(os.environ, SYNC_LOG_DIR=os.path.join(tempfile.gettempdir(), 'bench_inicializacao_logs'))
+    resultados = {}
+    for modulo in [m for m in args.modulos.split(',') if m]:
+        resultados[modulo] = r = medir_modulo(modulo, args.rodadas, env)
+        pesados = ', '.join(f"{raiz} {ms}" for raiz, ms in r['mais_pesados'])
+        print(f"{modulo:<12} import {r['import_ms']:>8.2f} ms  processo {r['processo_ms']:>8.2f} ms  ({pesados})")
+
+    if args.salvar:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {'python': platform.python_version(), 'maquina': platform.machine()},
+                'orcamento': {modulo: {'import_ms': r['import_ms'], 'processo_ms': r['processo_ms']}
+                              for modulo, r in resultados.items() if modulo == ORCAMENTO},
+                'modulos': resultados
+            }, f, ensure_ascii=False, indent=2)
+        print(f"Baseline salva em {args.baseline}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    problemas = comparar(resultados, baseline, args.limite)
+    if problemas:
+        print("\nProblemas de inicialização:")
+        for problema in problemas:
+            print(f"  - {problema}")
+        sys.exit(1)
+    print("Inicialização dentro do orçamento")
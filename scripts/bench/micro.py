@@ -0,0 +1,217 @@
+"""
+Micro-benchmarks das funções puras de maior custo por item
+
+Mede custo por item (ns) e memória alocada (pico e blocos retidos via
+tracemalloc) sobre fixtures geradas, comparando com a baseline salva. O pico
+é comparado em bytes absolutos, o que só vale para fixtures do mesmo tamanho:
+a comparação é recusada quando o tamanho salvo na baseline é outro. Os bytes
+por item são a inclinação entre a fixture inteira e a metade dela, sem o custo
+fixo que domina o pico em entradas pequenas.
+
+Uso:
+    python bench/micro.py                      # compara com bench/baselines/micro.json
+    python bench/micro.py --salvar             # grava uma nova baseline
+    python bench/micro.py --filtro normalizar  # roda só os benchmarks que casam
+    python bench/micro.py --variantes 50000 --baseline bench/baselines/micro_50k.json --salvar
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import tracemalloc
+from types import SimpleNamespace
+from itertools import islice
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PADRAO = os.path.join(BENCH_DIR, 'baselines', 'micro.json')
+
+# Evita que importar config crie a pasta de logs do projeto
+os.environ.setdefault('SYNC_LOG_DIR', os.path.join(tempfile.gettempdir(), 'bench_micro_logs'))
+sys.path.insert(0, SCRIPTS_DIR)
+
+import sync_stock
+import sync_orders
+from catalogo import gerar_catalogo, gerar_pedidos
+
+def _como_objeto(valor, chave=None):
+    """Converte o pedido REST em objetos com atributos, como o ActiveResource entrega"""
+    if chave == 'total_shipping_price_set':
+        return valor
+    if isinstance(valor, dict):
+        return SimpleNamespace(**{k: _como_objeto(v, k) for k, v in valor.items()})
+    if isinstance(valor, list):
+        return [_como_objeto(v) for v in valor]
+    return valor
+
+def montar_fixtures(variantes, pedidos):
+    """Gera as entradas de cada benchmark a partir do catálogo sintético"""
+    produtos_hiper, produtos_shopify = gerar_catalogo(variantes)
+    agrupados = sync_stock.processar_produtos_hiper(produtos_hiper)
+    titulos = [v['title'] for p in produtos_shopify for v in p['variants']]
+    textos_tamanho = titulos + ['Tamanho Unico', 'GG - Azul', 'Extra Large', 'XGG', '1M']
+    return {
+        'nomes': [p['nome'] for p in produtos_hiper],
+        'textos_tamanho': textos_tamanho,
+        'tamanhos': titulos,
+        'produtos_hiper': produtos_hiper,
+        'agrupados': agrupados,
+        'pedidos': [_como_objeto(p) for p in gerar_pedidos(pedidos, produtos_shopify)]
+    }
+
+def _por_item(funcao):
+    def executar(itens):
+        for item in itens:
+            funcao(item)
+    return executar
+
+# nome -> (função que roda a rodada inteira, chave da fixture, contagem de itens)
+BENCHMARKS = {
+    'normalizar_nome': (_por_item(sync_stock.normalizar_nome), 'nomes', len),
+    'extrair_tamanho': (_por_item(sync_stock.extrair_tamanho), 'textos_tamanho', len),
+    'mapear_tamanho': (_por_item(sync_stock.mapear_tamanho), 'tamanhos', len),
+    'processar_produtos_hiper': (sync_stock.processar_produtos_hiper, 'produtos_hiper', len),
+    'montar_estoque_hiper': (
+        sync_stock.montar_estoque_hiper, 'agrupados',
+        lambda agrupados: sum(len(p['variantes']) for p in agrupados.values())
+    ),
+    'mapear_pedido_para_hiper': (_por_item(sync_orders.mapear_pedido_para_hiper), 'pedidos', len),
+}
+
+def _metade(entrada):
+    """Primeira metade da fixture (lista ou dict), para medir a inclinação da memória"""
+    if isinstance(entrada, dict):
+        return dict(islice(entrada.items(), len(entrada) // 2))
+    return entrada[:len(entrada) // 2]
+
+def _pico(funcao, entrada):
+    """Pico de bytes alocados durante uma chamada"""
+    tracemalloc.start()
+    base_atual, _ = tracemalloc.get_traced_memory()
+    resultado = funcao(entrada)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultado
+    return pico - base_atual
+
+def medir(funcao, entrada, contar, rodadas):
+    """
+    Mede uma função sobre a entrada inteira
+
+    Returns:
+        dict: ns por item (mínimo e mediana), pico de bytes, bytes por item
+            (inclinação entre a metade e a entrada inteira) e blocos retidos
+    """
+    itens = contar(entrada)
+    funcao(entrada)  # aquecimento
+
+    tempos = []
+    for _ in range(rodadas):
+        inicio = time.perf_counter_ns()
+        funcao(entrada)
+        tempos.append(time.perf_counter_ns() - inicio)
+
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base_atual, _ = tracemalloc.get_traced_memory()
+    resultado = funcao(entrada)
+    _, pico = tracemalloc.get_traced_memory()
+    depois = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retidos = sum(d.count_diff for d in depois.compare_to(antes, 'filename'))
+    del resultado
+
+    metade = _metade(entrada)
+    itens_metade = contar(metade)
+    pico_metade = _pico(funcao, metade)
+    pico_total = pico - base_atual
+
+    return {
+        'itens': itens,
+        'ns_por_item': round(min(tempos) / itens, 1),
+        'ns_por_item_mediana': round(statistics.median(tempos) / itens, 1),
+        'pico_bytes': pico_total,
+        'bytes_por_item': round((pico_total - pico_metade) / max(itens - itens_metade, 1), 1),
+        'blocos_retidos': retidos
+    }
+
+def tamanho_diferente(meta, variantes, pedidos):
+    """Descrição da diferença de tamanho das fixtures em relação à baseline, ou None"""
+    salvos = (meta.get('variantes'), meta.get('pedidos'))
+    if salvos == (variantes, pedidos):
+        return None
+    return (f"baseline gerada com {salvos[0]} variantes e {salvos[1]} pedidos, "
+            f"execução com {variantes} e {pedidos}")
+
+def comparar(resultados, baseline, limite):
+    """Lista as regressões de tempo ou memória acima do limite (fixtures do mesmo tamanho)"""
+    regressoes = []
+    for nome, atual in resultados.items():
+        anterior = baseline.get('benchmarks', {}).get(nome)
+        if not anterior:
+            continue
+        for metrica in ('ns_por_item', 'pico_bytes'):
+            if anterior.get(metrica, 0) > 0 and atual[metrica] > anterior[metrica] * (1 + limite):
+                regressoes.append(f"{nome}: {metrica} {anterior[metrica]} -> {atual[metrica]}")
+    return regressoes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos hot paths puros")
+    parser.add_argument('--variantes', type=int, default=10000)
+    parser.add_argument('--pedidos', type=int, default=500)
+    parser.add_argument('--rodadas', type=int, default=10)
+    parser.add_argument('--filtro', default='')
+    parser.add_argument('--baseline', default=BASELINE_PADRAO)
+    parser.add_argument('--salvar', action='store_true', help="Grava os resultados como nova baseline")
+    parser.add_argument('--limite', type=float, default=0.3, help="Regressão tolerada (fração)")
+    args = parser.parse_args()
+
+    # As funções registram cada item em INFO; o benchmark mede só o trabalho
+    logging.disable(logging.INFO)
+    fixtures = montar_fixtures(args.variantes, args.pedidos)
+
+    resultados = {}
+    for nome, (funcao, chave, contar) in BENCHMARKS.items():
+        if args.filtro and args.filtro not in nome:
+            continue
+        entrada = fixtures[chave]
+        resultados[nome] = medir(funcao, entrada, contar, args.rodadas)
+        r = resultados[nome]
+        print(f"{nome:<26} {r['itens']:>7} itens  {r['ns_por_item']:>10.1f} ns/item  "
+              f"(mediana {r['ns_por_item_mediana']:.1f})  pico {r['pico_bytes']:>10} B  "
+              f"{r['bytes_por_item']:>8.1f} B/item  {r['blocos_retidos']:>7} blocos retidos")
+
+    if args.salvar:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'meta': {
+                    'python': platform.python_version(),
+                    'maquina': platform.machine(),
+                    'variantes': args.variantes,
+                    'pedidos': args.pedidos
+                },
+                'benchmarks': resultados
+            }, f, ensure_ascii=False, indent=2)
+        print(f"Baseline salva em {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        diferenca = tamanho_diferente(baseline.get('meta', {}), args.variantes, args.pedidos)
+        if diferenca:
+            print(f"\nComparação recusada: {diferenca}. Rode com o mesmo tamanho ou grave uma "
+                  f"baseline para este tamanho (--baseline outro.json --salvar)")
+            sys.exit(2)
+        regressoes = comparar(resultados, baseline, args.limite)
+        if regressoes:
+            print("\nRegressões acima do limite:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            sys.exit(1)
+        print("Sem regressões em relação à baseline")
@@ -0,0 +1,949 @@
+"""
+Servidores locais que imitam as APIs do Hiper e da Shopify para benchmarks offline
+
+Uso avulso:
+    python bench/servidores.py --variantes 10000 --latencia 0.05
+"""
+import os
+import sys
+import json
+import time
+import math
+import re
+import bisect
+import base64
+import argparse
+import functools
+import threading
+import multiprocessing
+from email import policy
+from email.parser import BytesParser
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from catalogo import gerar_catalogo, gerar_pedidos
+
+TOKEN_HIPER = 'token-bench-hiper'
+PREFIXO_HIPER = '/api/v1'
+
+class Estatisticas:
+    """Contadores de chamadas por rota, compartilhados entre as threads do servidor"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.zerar()
+
+    def zerar(self):
+        with self.lock:
+            self.rotas = {}
+            self.total = 0
+            self.limitadas = 0
+
+    def registrar(self, rota, limitada=False):
+        with self.lock:
+            self.total += 1
+            self.rotas[rota] = self.rotas.get(rota, 0) + 1
+            if limitada:
+                self.limitadas += 1
+
+    def como_dict(self):
+        with self.lock:
+            return {'total': self.total, 'limitadas': self.limitadas, 'rotas': dict(self.rotas)}
+
+class BaldeVazante:
+    """Leaky bucket no estilo do limite de taxa da Shopify"""
+    def __init__(self, capacidade, vazao):
+        self.capacidade = capacidade
+        self.vazao = vazao
+        self.nivel = 0.0
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _vazar(self):
+        agora = time.monotonic()
+        self.nivel = max(0.0, self.nivel - (agora - self.ultimo) * self.vazao)
+        self.ultimo = agora
+
+    def consumir(self, custo=1):
+        """Retorna (aceito, nível atual)"""
+        with self.lock:
+            self._vazar()
+            if self.vazao <= 0:
+                return True, self.nivel
+            if self.nivel + custo > self.capacidade:
+                return False, self.nivel
+            self.nivel += custo
+            return True, self.nivel
+
+    def devolver(self, custo):
+        """Devolve ao balde a parte do custo pedido que não foi usada"""
+        with self.lock:
+            self._vazar()
+            self.nivel = max(0.0, self.nivel - custo)
+
+    def disponivel(self):
+        with self.lock:
+            self._vazar()
+            return self.capacidade - self.nivel
+
+class HandlerBase(BaseHTTPRequestHandler):
+    """Funções comuns de resposta JSON"""
+    protocol_version = 'HTTP/1.1'
+    servidor_estado = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _ler_corpo(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        if not tamanho:
+            return {}
+        corpo = self.rfile.read(tamanho)
+        try:
+            return json.loads(corpo)
+        except ValueError:
+            return {'_bruto': corpo}
+
+    def _responder(self, status, corpo, headers=None):
+        if isinstance(corpo, (bytes, bytearray)):
+            dados = corpo
+        else:
+            dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(dados)))
+        for chave, valor in (headers or {}).items():
+            self.send_header(chave, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _controle(self, metodo):
+        """Rotas internas de estatística (não contam como chamadas de API)"""
+        estado = self.servidor_estado
+        if self.path.startswith('/__stats'):
+            self._responder(200, estado.estatisticas.como_dict())
+            return True
+        if self.path.startswith('/__reset') and metodo == 'POST':
+            estado.estatisticas.zerar()
+            self._responder(200, {'ok': True})
+            return True
+        if self.path.startswith('/__falhas') and metodo == 'POST':
+            # Próximas N chamadas de API respondem com o status pedido (padrão 503)
+            parametros = parse_qs(urlparse(self.path).query)
+            with estado.lock:
+                estado.falhas = int(parametros.get('quantidade', ['1'])[0])
+                estado.status_falha = int(parametros.get('status', ['503'])[0])
+            self._responder(200, {'ok': True})
+            return True
+        with estado.lock:
+            falhar = estado.falhas > 0
+            if falhar:
+                estado.falhas -= 1
+        if falhar:
+            self._ler_corpo()
+            estado.estatisticas.registrar('falha_injetada')
+            self._responder(estado.status_falha, {'errors': 'Falha injetada pelo benchmark'})
+            return True
+        return False
+
+    def _latencia(self):
+        if self.servidor_estado.latencia:
+            time.sleep(self.servidor_estado.latencia)
+
+# ---------------------------------------------------------------------------
+# Hiper
+# ---------------------------------------------------------------------------
+
+class EstadoHiper:
+    def __init__(self, produtos, latencia):
+        self.latencia = latencia
+        self.estatisticas = Estatisticas()
+        self.produtos = produtos
+        self.corpo_produtos = json.dumps({'produtos': produtos}, ensure_ascii=False).encode('utf-8')
+        self.pedidos = []
+        self.lock = threading.Lock()
+        # Falhas injetadas por POST /__falhas
+        self.falhas = 0
+        self.status_falha = 503
+
+class HandlerHiper(HandlerBase):
+    def do_GET(self):
+        if self._controle('GET'):
+            return
+        estado = self.servidor_estado
+        caminho = urlparse(self.path).path
+        self._latencia()
+
+        if caminho.startswith(f"{PREFIXO_HIPER}/auth/gerar-token/"):
+            estado.estatisticas.registrar('auth/gerar-token')
+            self._responder(200, {'token': TOKEN_HIPER})
+            return
+
+        if caminho == f"{PREFIXO_HIPER}/produtos/pontoDeSincronizacao":
+            estado.estatisticas.registrar('produtos/pontoDeSincronizacao')
+            if self.headers.get('Authorization') != f"Bearer {TOKEN_HIPER}":
+                self._responder(401, {'message': 'Token inválido'})
+                return
+            self._responder(200, estado.corpo_produtos)
+            return
+
+        estado.estatisticas.registrar('desconhecida')
+        self._responder(404, {'message': f"Rota não encontrada: {caminho}"})
+
+    def do_POST(self):
+        if self._controle('POST'):
+            return
+        estado = self.servidor_estado
+        caminho = urlparse(self.path).path.rstrip('/')
+        corpo = self._ler_corpo()
+
+        if caminho == '/__estoque':
+            # Altera o estoque de SKUs do catálogo ({sku: quantidade}); não conta como chamada de API
+            with estado.lock:
+                for produto in estado.produtos:
+                    if produto.get('codigoDeBarras') in corpo:
+                        produto['quantidadeEmEstoque'] = corpo[produto['codigoDeBarras']]
+                estado.corpo_produtos = json.dumps({'produtos': estado.produtos}, ensure_ascii=False).encode('utf-8')
+            self._responder(200, {'ok': True})
+            return
+
+        self._latencia()
+        if caminho == f"{PREFIXO_HIPER}/pedido-de-venda":
+            estado.estatisticas.registrar('pedido-de-venda')
+            with estado.lock:
+                estado.pedidos.append(corpo)
+                identificador = len(estado.pedidos)
+            self._responder(201, {'id': identificador})
+            return
+
+        estado.estatisticas.registrar('desconhecida')
+        self._responder(404, {'message': f"Rota não encontrada: {caminho}"})
+
+# ---------------------------------------------------------------------------
+# Shopify
+# ---------------------------------------------------------------------------
+
+class EstadoShopify:
+    def __init__(self, produtos, pedidos, latencia, taxa_rest, custo_graphql, locations):
+        self.latencia = latencia
+        self.estatisticas = Estatisticas()
+        self.balde_rest = BaldeVazante(40, taxa_rest)
+        self.balde_graphql = BaldeVazante(1000, custo_graphql)
+        self.lock = threading.Lock()
+        # Falhas injetadas por POST /__falhas
+        self.falhas = 0
+        self.status_falha = 503
+        self.produtos = sorted(produtos, key=lambda p: p['id'])
+        self.pedidos = pedidos
+        self.locations = [
+            {'id': 60000000000 + i, 'name': f"Loja {i + 1}", 'active': True}
+            for i in range(locations)
+        ]
+        # Arquivos enviados por staged upload e resultados de operações em massa
+        self.arquivos = {}
+        self.operacoes = {}
+        # Níveis por (inventory_item_id, location_id); o estoque inicial fica na primeira location
+        self.niveis = {}
+        self.variantes_por_item = {}
+        for produto in self.produtos:
+            for variante in produto['variants']:
+                item_id = variante['inventory_item_id']
+                self.variantes_por_item[item_id] = variante
+                for i, location in enumerate(self.locations):
+                    self.niveis[(item_id, location['id'])] = variante['inventory_quantity'] if i == 0 else 0
+
+    def criar_produto(self, dados):
+        """Cria um produto com ids novos; o estoque das variantes começa zerado"""
+        with self.lock:
+            produto_id = self.produtos[-1]['id'] + 10 if self.produtos else 7000000000000
+            criado_em = time.strftime('%Y-%m-%dT%H:%M:%S-03:00')
+            variantes = []
+            for j, variante in enumerate(dados.get('variants') or [{}]):
+                item_id = 45000000000000 + (produto_id - 7000000000000) + j
+                nova = {
+                    'id': 40000000000000 + (produto_id - 7000000000000) + j,
+                    'product_id': produto_id,
+                    'title': variante.get('option1') or 'Default Title',
+                    'option1': variante.get('option1'),
+                    'sku': variante.get('sku') or '',
+                    'price': f"{float(variante.get('price') or 0):.2f}",
+                    'inventory_item_id': item_id,
+                    'inventory_quantity': 0,
+                    'inventory_management': variante.get('inventory_management')
+                }
+                variantes.append(nova)
+                self.variantes_por_item[item_id] = nova
+                for location in self.locations:
+                    self.niveis[(item_id, location['id'])] = 0
+            produto = {
+                'id': produto_id,
+                'title': dados.get('title') or '',
+                'vendor': dados.get('vendor') or '',
+                'product_type': dados.get('product_type') or '',
+                'created_at': criado_em,
+                'updated_at': criado_em,
+                'status': dados.get('status') or 'active',
+                'variants': variantes
+            }
+            self.produtos.append(produto)
+            return produto
+
+    def _produto(self, produto_id):
+        posicao = bisect.bisect_left(self.produtos, produto_id, key=lambda p: p['id'])
+        if posicao < len(self.produtos) and self.produtos[posicao]['id'] == produto_id:
+            return self.produtos[posicao]
+        return None
+
+    def atualizar_variantes(self, produto_id, alteracoes):
+        """Aplica {variante_id: campos} às variantes do produto; devolve os userErrors"""
+        with self.lock:
+            produto = self._produto(produto_id)
+            if produto is None:
+                return [{'field': ['productId'], 'message': 'Product does not exist'}]
+            variantes = {v['id']: v for v in produto['variants']}
+            erros = [{'field': ['variants', str(i), 'id'], 'message': 'Product variant does not exist'}
+                     for i, variante_id in enumerate(alteracoes) if variante_id not in variantes]
+            if erros:
+                return erros
+            for variante_id, campos in alteracoes.items():
+                variantes[variante_id].update(campos)
+            produto['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S-03:00')
+            return []
+
+    def excluir_produto(self, produto_id):
+        """Remove o produto e os níveis das variantes; False se o id não existe"""
+        with self.lock:
+            posicao = bisect.bisect_left(self.produtos, produto_id, key=lambda p: p['id'])
+            if posicao == len(self.produtos) or self.produtos[posicao]['id'] != produto_id:
+                return False
+            produto = self.produtos.pop(posicao)
+            for variante in produto['variants']:
+                self.variantes_por_item.pop(variante['inventory_item_id'], None)
+                for location in self.locations:
+                    self.niveis.pop((variante['inventory_item_id'], location['id']), None)
+            return True
+
+    def definir_nivel(self, item_id, location_id, disponivel):
+        with self.lock:
+            if (item_id, location_id) not in self.niveis:
+                return None
+            self.niveis[(item_id, location_id)] = disponivel
+            variante = self.variantes_por_item[item_id]
+            variante['inventory_quantity'] = sum(
+                self.niveis[(item_id, location['id'])] for location in self.locations
+            )
+            return {
+                'inventory_item_id': item_id,
+                'location_id': location_id,
+                'available': disponivel,
+                'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S-03:00')
+            }
+
+def _cursor(dados):
+    return base64.urlsafe_b64encode(json.dumps(dados).encode()).decode()
+
+def _ler_cursor(valor):
+    return json.loads(base64.urlsafe_b64decode(valor.encode()))
+
+@functools.lru_cache(maxsize=None)
+def _data(valor):
+    """Data ISO 8601 com fuso (sem fuso = UTC), comparável entre fusos diferentes"""
+    data = datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    return data if data.tzinfo else data.replace(tzinfo=timezone.utc)
+
+def _filtrar_produtos(produtos, filtros):
+    """Aplica os filtros REST de products.json mantendo a ordem por id"""
+    resultado = produtos
+    if filtros.get('ids'):
+        ids = {int(i) for i in filtros['ids'].split(',')}
+        resultado = [p for p in resultado if p['id'] in ids]
+    if filtros.get('since_id'):
+        since_id = int(filtros['since_id'])
+        resultado = [p for p in resultado if p['id'] > since_id]
+    for campo, comparacao in (('created_at_min', 'ge'), ('created_at_max', 'le'),
+                              ('updated_at_min', 'ge'), ('updated_at_max', 'le')):
+        if filtros.get(campo):
+            chave = campo.rsplit('_', 1)[0]
+            limite = _data(filtros[campo])
+            if comparacao == 'ge':
+                resultado = [p for p in resultado if _data(p[chave]) >= limite]
+            else:
+                resultado = [p for p in resultado if _data(p[chave]) <= limite]
+    return resultado
+
+FILTROS_PRODUTOS = ('ids', 'since_id', 'created_at_min', 'created_at_max', 'updated_at_min', 'updated_at_max')
+
+def _gid(tipo, numero):
+    return f"gid://shopify/{tipo}/{numero}"
+
+def _numero(gid):
+    return int(str(gid).rsplit('/', 1)[-1])
+
+def _produto_create(estado, variaveis):
+    """productCreate (ProductInput da 2024-01) sobre o catálogo local"""
+    entrada = variaveis.get('input') or {}
+    if not entrada.get('title'):
+        return {'product': None, 'userErrors': [{'field': ['title'], 'message': "Title can't be blank"}]}
+    produto = estado.criar_produto({
+        'title': entrada['title'],
+        'vendor': entrada.get('vendor'),
+        'product_type': entrada.get('productType'),
+        'variants': [
+            {
+                'option1': (variante.get('options') or [None])[0],
+                'sku': variante.get('sku'),
+                'price': variante.get('price'),
+                'inventory_management': (variante.get('inventoryManagement') or '').lower() or None
+            }
+            for variante in entrada.get('variants') or []
+        ]
+    })
+    return {
+        'product': {
+            'id': _gid('Product', produto['id']),
+            'title': produto['title'],
+            'variants': {'edges': [
+                {'node': {'id': _gid('ProductVariant', v['id']), 'sku': v['sku']}}
+                for v in produto['variants']
+            ]}
+        },
+        'userErrors': []
+    }
+
+# Mutations que o servidor sabe executar em massa (nome no documento -> resolvedor)
+MUTACOES_EM_MASSA = {
+    'productCreate': _produto_create
+}
+
+def _executar_operacao(estado, operacao, mutacao, linhas):
+    nome, resolvedor = next(((n, r) for n, r in MUTACOES_EM_MASSA.items() if n in mutacao), (None, None))
+    resultado = []
+    operacao['status'] = 'RUNNING'
+    for numero, linha in enumerate(linhas):
+        if resolvedor is None:
+            resultado.append({'errors': [{'message': 'Mutation não suportada'}], '__lineNumber': numero})
+        else:
+            resultado.append({'data': {nome: resolvedor(estado, json.loads(linha))}, '__lineNumber': numero})
+        operacao['objectCount'] = str(numero + 1)
+        if estado.latencia:
+            time.sleep(estado.latencia / 20)
+    chave = f"resultados/{_numero(operacao['id'])}.jsonl"
+    estado.arquivos[chave] = '\n'.join(json.dumps(r, ensure_ascii=False) for r in resultado).encode('utf-8')
+    operacao['url'] = f"{estado.url_base}/__arquivos/{chave}"
+    operacao['status'] = 'COMPLETED'
+
+def _staged_uploads_create(handler, variaveis):
+    estado = handler.servidor_estado
+    alvos = []
+    for entrada in variaveis.get('input') or []:
+        chave = f"tmp/bulk/{len(estado.arquivos) + 1}/{entrada.get('filename', 'arquivo')}"
+        alvos.append({
+            'url': f"http://{handler.headers.get('Host')}/__staged",
+            'resourceUrl': f"http://{handler.headers.get('Host')}/__arquivos/{chave}",
+            'parameters': [{'name': 'key', 'value': chave}, {'name': 'Content-Type', 'value': entrada.get('mimeType')}]
+        })
+    return {'stagedUploadsCreate': {'stagedTargets': alvos, 'userErrors': []}}
+
+def _bulk_operation_run_mutation(handler, variaveis):
+    estado = handler.servidor_estado
+    conteudo = estado.arquivos.get(variaveis.get('stagedUploadPath'))
+    if conteudo is None:
+        return {'bulkOperationRunMutation': {'bulkOperation': None, 'userErrors': [
+            {'field': ['stagedUploadPath'], 'message': 'Arquivo não encontrado'}]}}
+    with estado.lock:
+        operacao = {
+            'id': _gid('BulkOperation', 1000 + len(estado.operacoes)),
+            'status': 'CREATED', 'errorCode': None, 'objectCount': '0', 'url': None, 'partialDataUrl': None
+        }
+        estado.operacoes[operacao['id']] = operacao
+    estado.url_base = f"http://{handler.headers.get('Host')}"
+    linhas = [linha for linha in conteudo.decode('utf-8').split('\n') if linha.strip()]
+    threading.Thread(target=_executar_operacao, args=(estado, operacao, variaveis.get('mutation', ''), linhas),
+                     daemon=True).start()
+    return {'bulkOperationRunMutation': {'bulkOperation': {'id': operacao['id'], 'status': 'CREATED'}, 'userErrors': []}}
+
+# Campos productDelete apelidados: "p0: productDelete(input: {id: $id0})"
+_PRODUCT_DELETE = re.compile(r'(\w+)\s*:\s*productDelete\s*\(\s*input\s*:\s*\{\s*id\s*:\s*\$(\w+)\s*\}\s*\)')
+
+def _product_delete(handler, variaveis):
+    """Um productDelete por alias; ids inexistentes voltam como userError"""
+    resultado = {}
+    for alias, variavel in _PRODUCT_DELETE.findall(handler.query):
+        gid = variaveis.get(variavel)
+        if gid and handler.servidor_estado.excluir_produto(_numero(gid)):
+            resultado[alias] = {'deletedProductId': gid, 'userErrors': []}
+        else:
+            resultado[alias] = {'deletedProductId': None,
+                                'userErrors': [{'field': ['id'], 'message': 'Product does not exist'}]}
+    return resultado
+
+# Campos productVariantsBulkUpdate apelidados: "m0: productVariantsBulkUpdate(productId: $productId0, variants: $variants0)"
+_VARIANTS_BULK_UPDATE = re.compile(
+    r'(\w+)\s*:\s*productVariantsBulkUpdate\s*\(\s*productId\s*:\s*\$(\w+)\s*,\s*variants\s*:\s*\$(\w+)\s*\)'
+)
+
+def _product_variants_bulk_update(handler, variaveis):
+    """Um productVariantsBulkUpdate por alias (só o preço é aplicado)"""
+    resultado = {}
+    for alias, produto, variantes in _VARIANTS_BULK_UPDATE.findall(handler.query):
+        gid = variaveis.get(produto)
+        alteracoes = {
+            _numero(variante['id']): {'price': f"{float(variante['price']):.2f}"}
+            for variante in variaveis.get(variantes) or [] if 'price' in variante
+        }
+        erros = handler.servidor_estado.atualizar_variantes(_numero(gid), alteracoes) if gid else [
+            {'field': ['productId'], 'message': 'Product does not exist'}]
+        resultado[alias] = {'product': None if erros else {'id': gid}, 'userErrors': erros}
+    return resultado
+
+def _niveis_da_location(estado, location_id):
+    """[(item_id, disponível)] da location em ordem de item (a ordem dos cursores)"""
+    with estado.lock:
+        return sorted((item, disponivel) for (item, location), disponivel in estado.niveis.items()
+                      if location == location_id)
+
+def _nivel(item_id, disponivel, location_id):
+    return {
+        'id': f"{_gid('InventoryLevel', location_id)}?inventory_item_id={item_id}",
+        'item': {'legacyResourceId': str(item_id)},
+        'quantities': [{'quantity': disponivel}]
+    }
+
+def _inventory_levels(handler, variaveis):
+    """location(id).inventoryLevels(first, after) com o cursor sendo o id do item"""
+    estado = handler.servidor_estado
+    location_id = _numero(variaveis.get('location', '0'))
+    if not any(location['id'] == location_id for location in estado.locations):
+        return {'location': None}
+    niveis = _niveis_da_location(estado, location_id)
+    inicio = bisect.bisect_right(niveis, (int(variaveis['after']), float('inf'))) if variaveis.get('after') else 0
+    pagina = niveis[inicio:inicio + int(variaveis.get('first') or 50)]
+    return {'location': {'inventoryLevels': {
+        'edges': [{'node': _nivel(item, disponivel, location_id)} for item, disponivel in pagina],
+        'pageInfo': {
+            'hasNextPage': inicio + len(pagina) < len(niveis),
+            'endCursor': str(pagina[-1][0]) if pagina else None
+        }
+    }}}
+
+def _executar_consulta(estado, operacao):
+    """Gera o JSONL da consulta de níveis em massa: cada location seguida dos seus níveis"""
+    operacao['status'] = 'RUNNING'
+    linhas = []
+    for location in estado.locations:
+        gid = _gid('Location', location['id'])
+        linhas.append({'id': gid})
+        for item, disponivel in _niveis_da_location(estado, location['id']):
+            linhas.append({**_nivel(item, disponivel, location['id']), '__parentId': gid})
+        operacao['objectCount'] = str(len(linhas))
+    if estado.latencia:
+        time.sleep(estado.latencia * 10)
+    chave = f"resultados/{_numero(operacao['id'])}.jsonl"
+    estado.arquivos[chave] = '\n'.join(json.dumps(linha) for linha in linhas).encode('utf-8')
+    operacao['url'] = f"{estado.url_base}/__arquivos/{chave}" if linhas else None
+    operacao['status'] = 'COMPLETED'
+
+def _bulk_operation_run_query(handler, variaveis):
+    """Só a consulta de inventoryLevels por location é suportada; uma por vez, como na Shopify"""
+    estado = handler.servidor_estado
+    if 'inventoryLevels' not in (variaveis.get('query') or ''):
+        return {'bulkOperationRunQuery': {'bulkOperation': None, 'userErrors': [
+            {'field': ['query'], 'message': 'Consulta não suportada pelo servidor de benchmark'}]}}
+    with estado.lock:
+        if any(o.get('tipo') == 'QUERY' and o['status'] in ('CREATED', 'RUNNING') for o in estado.operacoes.values()):
+            return {'bulkOperationRunQuery': {'bulkOperation': None, 'userErrors': [
+                {'field': None, 'message': 'A bulk query operation for this app and shop is already in progress'}]}}
+        operacao = {
+            'id': _gid('BulkOperation', 1000 + len(estado.operacoes)), 'tipo': 'QUERY',
+            'status': 'CREATED', 'errorCode': None, 'objectCount': '0', 'url': None, 'partialDataUrl': None
+        }
+        estado.operacoes[operacao['id']] = operacao
+    estado.url_base = f"http://{handler.headers.get('Host')}"
+    threading.Thread(target=_executar_consulta, args=(estado, operacao), daemon=True).start()
+    return {'bulkOperationRunQuery': {'bulkOperation': {'id': operacao['id'], 'status': 'CREATED'}, 'userErrors': []}}
+
+# Apelidos de products(first: N, sortKey: CREATED_AT[, reverse: true])
+_PRODUCTS_CRIACAO = re.compile(
+    r'(\w+)\s*:\s*products\s*\(\s*first\s*:\s*(\d+)\s*,\s*sortKey\s*:\s*CREATED_AT\s*(,\s*reverse\s*:\s*true)?\s*\)'
+)
+
+def _products_por_criacao(handler, variaveis):
+    """products ordenados por createdAt (só o createdAt de cada produto)"""
+    estado = handler.servidor_estado
+    with estado.lock:
+        ordenados = sorted(estado.produtos, key=lambda p: _data(p['created_at']))
+    resultado = {}
+    for apelido, primeiros, reverso in _PRODUCTS_CRIACAO.findall(handler.query):
+        lista = ordenados[::-1] if reverso else ordenados
+        resultado[apelido] = {'edges': [{'node': {'createdAt': p['created_at']}} for p in lista[:int(primeiros)]]}
+    return resultado
+
+# Termos sku:"..." (ou sku:...) da busca de productVariants
+_TERMO_SKU = re.compile(r'sku:(?:"((?:[^"\\]|\\.)*)"|(\S+))')
+
+# inventoryLevels(first: N) aninhado na busca de productVariants
+_NIVEIS_POR_VARIANTE = re.compile(r'inventoryLevels\s*\(\s*first\s*:\s*(\d+)')
+
+def _product_variants(handler, variaveis):
+    """
+    productVariants(query: "sku:A OR sku:B") com o estoque de cada location
+
+    Como a busca por termo da Shopify, devolve também os SKUs que só começam
+    com o termo (ex: sku:AB traz AB-P e ABC-P), na ordem do catálogo e
+    paginados por first/after.
+    """
+    estado = handler.servidor_estado
+    skus = tuple({re.sub(r'\\(.)', r'\1', entre_aspas) if entre_aspas else solto
+                  for entre_aspas, solto in _TERMO_SKU.findall(variaveis.get('query') or '')})
+    limite_niveis = int((_NIVEIS_POR_VARIANTE.findall(handler.query) or ['10'])[0])
+    inicio = int(variaveis['after']) if variaveis.get('after') else 0
+    primeiros = int(variaveis.get('first') or 50)
+    arestas = []
+    encontrados = 0
+    with estado.lock:
+        for produto in estado.produtos:
+            for variante in produto['variants']:
+                if not skus or not variante['sku'].startswith(skus):
+                    continue
+                encontrados += 1
+                if encontrados <= inicio or len(arestas) > primeiros:
+                    continue
+                item_id = variante['inventory_item_id']
+                niveis = [
+                    {'node': {'location': {'legacyResourceId': str(location['id'])},
+                              'quantities': [{'quantity': estado.niveis[(item_id, location['id'])]}]}}
+                    for location in estado.locations if (item_id, location['id']) in estado.niveis
+                ]
+                arestas.append({'node': {
+                    'legacyResourceId': str(variante['id']),
+                    'title': variante['title'],
+                    'sku': variante['sku'],
+                    'price': variante['price'],
+                    'inventoryQuantity': variante['inventory_quantity'],
+                    'product': {'legacyResourceId': str(produto['id']), 'title': produto['title']},
+                    'inventoryItem': {'legacyResourceId': str(item_id), 'inventoryLevels': {
+                        'edges': niveis[:limite_niveis],
+                        'pageInfo': {'hasNextPage': len(niveis) > limite_niveis}
+                    }}
+                }})
+    return {'productVariants': {
+        'edges': arestas[:primeiros],
+        'pageInfo': {'hasNextPage': len(arestas) > primeiros, 'endCursor': str(inicio + len(arestas[:primeiros]))}
+    }}
+
+def _bulk_operation(handler, variaveis):
+    return {'node': handler.servidor_estado.operacoes.get(variaveis.get('id'))}
+
+# Operações GraphQL reconhecidas (palavra-chave no documento -> resolvedor)
+RESOLVEDORES_GRAPHQL = [
+    ('stagedUploadsCreate', _staged_uploads_create),
+    ('bulkOperationRunMutation', _bulk_operation_run_mutation),
+    ('bulkOperationRunQuery', _bulk_operation_run_query),
+    ('productVariants(', _product_variants),
+    ('sortKey: CREATED_AT', _products_por_criacao),
+    ('inventoryLevels', _inventory_levels),
+    ('productDelete', _product_delete),
+    ('productVariantsBulkUpdate', _product_variants_bulk_update),
+    ('BulkOperation', _bulk_operation),
+]
+
+class HandlerShopify(HandlerBase):
+    def _parametros(self):
+        url = urlparse(self.path)
+        return url.path, {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+    def _rota(self, caminho):
+        partes = caminho.split('/')
+        # /admin/api/<versao>/<recurso...>
+        if len(partes) < 5 or partes[1] != 'admin' or partes[2] != 'api':
+            return None
+        return '/'.join(partes[4:])
+
+    def _limitar_rest(self, rota):
+        aceito, nivel = self.servidor_estado.balde_rest.consumir()
+        cabecalho = {'X-Shopify-Shop-Api-Call-Limit': f"{int(math.ceil(nivel))}/40"}
+        if not aceito:
+            self.servidor_estado.estatisticas.registrar(rota, limitada=True)
+            cabecalho['Retry-After'] = '1.0'
+            self._responder(429, {'errors': 'Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service.'}, cabecalho)
+            return None
+        self.servidor_estado.estatisticas.registrar(rota)
+        return cabecalho
+
+    def _paginar(self, itens, parametros, chave, caminho, filtros):
+        limite = min(int(parametros.get('limit', 50)), 250)
+        if parametros.get('page_info'):
+            cursor = _ler_cursor(parametros['page_info'])
+            posicao, filtros = cursor['p'], cursor['f']
+        else:
+            posicao = 0
+        selecionados = _filtrar_produtos(itens, filtros) if chave == 'products' else itens
+        pagina = selecionados[posicao:posicao + limite]
+        headers = {}
+        if posicao + limite < len(selecionados):
+            proximo = _cursor({'p': posicao + limite, 'f': filtros})
+            extra = f"&fields={parametros['fields']}" if parametros.get('fields') else ''
+            headers['Link'] = (
+                f"<http://{self.headers.get('Host')}{caminho}?limit={limite}{extra}"
+                f"&page_info={proximo}>; rel=\"next\""
+            )
+        if parametros.get('fields'):
+            campos = parametros['fields'].split(',')
+            pagina = [{c: item[c] for c in campos if c in item} for item in pagina]
+        return {chave: pagina}, headers
+
+    def do_GET(self):
+        if self._controle('GET'):
+            return
+        estado = self.servidor_estado
+        caminho, parametros = self._parametros()
+        if caminho.startswith('/__arquivos/'):
+            conteudo = estado.arquivos.get(caminho[len('/__arquivos/'):])
+            self._responder(200 if conteudo is not None else 404, conteudo if conteudo is not None else {})
+            return
+        rota = self._rota(caminho)
+        self._latencia()
+        if rota is None:
+            self._responder(404, {'errors': 'Not Found'})
+            return
+        cabecalho = self._limitar_rest(rota)
+        if cabecalho is None:
+            return
+
+        if rota == 'shop.json':
+            self._responder(200, {'shop': {'id': 1, 'name': 'Loja Bench', 'myshopify_domain': 'loja-bench.myshopify.com'}}, cabecalho)
+        elif rota == 'locations.json':
+            self._responder(200, {'locations': estado.locations}, cabecalho)
+        elif rota == 'products.json':
+            filtros = {k: parametros[k] for k in FILTROS_PRODUTOS if k in parametros}
+            corpo, extra = self._paginar(estado.produtos, parametros, 'products', caminho, filtros)
+            cabecalho.update(extra)
+            self._responder(200, corpo, cabecalho)
+        elif rota == 'products/count.json':
+            filtros = {k: parametros[k] for k in FILTROS_PRODUTOS if k in parametros}
+            self._responder(200, {'count': len(_filtrar_produtos(estado.produtos, filtros))}, cabecalho)
+        elif rota == 'inventory_levels.json':
+            itens = [int(i) for i in parametros.get('inventory_item_ids', '').split(',') if i]
+            locations = [int(i) for i in parametros.get('location_ids', '').split(',') if i] or \
+                [location['id'] for location in estado.locations]
+            niveis = []
+            with estado.lock:
+                for item_id in itens:
+                    for location_id in locations:
+                        if (item_id, location_id) in estado.niveis:
+                            niveis.append({
+                                'inventory_item_id': item_id,
+                                'location_id': location_id,
+                                'available': estado.niveis[(item_id, location_id)]
+                            })
+            # Como a Shopify: no máximo `limit` níveis (padrão 50, teto 250) por resposta
+            limite = min(int(parametros.get('limit', 50)), 250)
+            self._responder(200, {'inventory_levels': niveis[:limite]}, cabecalho)
+        elif rota == 'orders.json':
+            corpo, extra = self._paginar(estado.pedidos, parametros, 'orders', caminho, {})
+            cabecalho.update(extra)
+            self._responder(200, corpo, cabecalho)
+        else:
+            self._responder(404, {'errors': 'Not Found'}, cabecalho)
+
+    def do_POST(self):
+        if self._controle('POST'):
+            return
+        estado = self.servidor_estado
+        caminho, parametros = self._parametros()
+        rota = self._rota(caminho)
+        corpo = self._ler_corpo()
+        self._latencia()
+        if caminho == '/__staged':
+            self._receber_staged(corpo.get('_bruto', b''))
+            return
+        if rota is None:
+            self._responder(404, {'errors': 'Not Found'})
+            return
+
+        if rota == 'graphql.json':
+            self._graphql(corpo)
+            return
+
+        cabecalho = self._limitar_rest(rota)
+        if cabecalho is None:
+            return
+
+        if rota == 'products.json':
+            dados = corpo.get('product') or {}
+            if not dados.get('title'):
+                self._responder(422, {'errors': {'title': ["can't be blank"]}}, cabecalho)
+            else:
+                self._responder(201, {'product': estado.criar_produto(dados)}, cabecalho)
+        elif rota == 'inventory_levels/set.json':
+            nivel = estado.definir_nivel(
+                int(corpo.get('inventory_item_id')),
+                int(corpo.get('location_id')),
+                int(corpo.get('available'))
+            )
+            if nivel is None:
+                self._responder(422, {'errors': ['Inventory item is not stocked at the location']}, cabecalho)
+            else:
+                self._responder(200, {'inventory_level': nivel}, cabecalho)
+        else:
+            self._responder(404, {'errors': 'Not Found'}, cabecalho)
+
+    def _receber_staged(self, bruto):
+        """Recebe o multipart do staged upload e guarda o arquivo pela chave"""
+        mensagem = BytesParser(policy=policy.HTTP).parsebytes(
+            f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode() + bruto
+        )
+        campos = {}
+        for parte in mensagem.iter_parts():
+            campos[parte.get_param('name', header='content-disposition')] = parte.get_payload(decode=True)
+        chave = campos.get('key', b'').decode()
+        self.servidor_estado.arquivos[chave] = campos.get('file', b'')
+        self._responder(201, {'ok': True})
+
+    def _graphql(self, corpo):
+        """GraphQL mínimo: aplica o balde de custo e resolve as operações conhecidas"""
+        estado = self.servidor_estado
+        self.query = corpo.get('query', '')
+        # Cada mutation apelidada custa 10 pontos e cada página de níveis
+        # 2 + first x (nível, quantities e item, se pedido), como na Shopify
+        custo = 10 * max(1, len(_PRODUCT_DELETE.findall(self.query)) +
+                          len(_VARIANTS_BULK_UPDATE.findall(self.query)))
+        por_nivel = 3 if 'item {' in self.query else 2
+        if 'productVariants(first' in self.query:
+            custo = 2 + 35 * int((corpo.get('variables') or {}).get('first') or 50)
+        elif 'inventoryLevels(first' in self.query:
+            custo = 2 + por_nivel * int((corpo.get('variables') or {}).get('first') or 50)
+        aceito, nivel = estado.balde_graphql.consumir(custo)
+        extensoes = {'cost': {
+            'requestedQueryCost': custo,
+            'actualQueryCost': custo if aceito else None,
+            'throttleStatus': {
+                'maximumAvailable': 1000.0,
+                'currentlyAvailable': estado.balde_graphql.disponivel(),
+                'restoreRate': estado.balde_graphql.vazao
+            }
+        }}
+        if not aceito:
+            estado.estatisticas.registrar('graphql.json', limitada=True)
+            self._responder(200, {'errors': [{'message': 'Throttled', 'extensions': {'code': 'THROTTLED'}}],
+                                  'extensions': extensoes})
+            return
+        estado.estatisticas.registrar('graphql.json')
+        for palavra, resolvedor in RESOLVEDORES_GRAPHQL:
+            if palavra in self.query:
+                dados = resolvedor(self, corpo.get('variables') or {})
+                if 'inventoryLevels(first' in self.query and dados.get('location'):
+                    # Custo real pelos níveis devolvidos; o resto volta ao balde
+                    real = 2 + por_nivel * len(dados['location']['inventoryLevels']['edges'])
+                    estado.balde_graphql.devolver(custo - real)
+                    extensoes['cost']['actualQueryCost'] = real
+                    extensoes['cost']['throttleStatus']['currentlyAvailable'] = estado.balde_graphql.disponivel()
+                self._responder(200, {'data': dados, 'extensions': extensoes})
+                return
+        self._responder(200, {'errors': [{'message': 'Operação não suportada pelo servidor de benchmark'}],
+                              'extensions': extensoes})
+
+# ---------------------------------------------------------------------------
+# Inicialização
+# ---------------------------------------------------------------------------
+
+class ServidorLocal(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que fecham a conexão no meio (ex: stream=True + close) não são erro
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+def _criar_servidor(handler, estado, porta=0):
+    classe = type(handler.__name__, (handler,), {'servidor_estado': estado})
+    servidor = ServidorLocal(('127.0.0.1', porta), classe)
+    return servidor
+
+def _processo_servidores(conexao, opcoes):
+    produtos_hiper, produtos_shopify = gerar_catalogo(opcoes['variantes'], seed=opcoes['seed'])
+    pedidos = gerar_pedidos(opcoes['pedidos'], produtos_shopify)
+    hiper = _criar_servidor(HandlerHiper, EstadoHiper(produtos_hiper, opcoes['latencia']))
+    shopify = _criar_servidor(HandlerShopify, EstadoShopify(
+        produtos_shopify, pedidos, opcoes['latencia'], opcoes['taxa_rest'],
+        opcoes['custo_graphql'], opcoes['locations']
+    ))
+    for servidor in (hiper, shopify):
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    conexao.send({
+        'hiper': hiper.server_address[1],
+        'shopify': shopify.server_address[1],
+        'variantes_hiper': len(produtos_hiper),
+        'variantes_shopify': sum(len(p['variants']) for p in produtos_shopify)
+    })
+    conexao.close()
+    threading.Event().wait()
+
+def iniciar_servidores(variantes, latencia=0.0, taxa_rest=2.0, custo_graphql=50.0,
+                       locations=1, pedidos=50, seed=42):
+    """
+    Sobe os servidores Hiper e Shopify em um processo separado
+
+    Args:
+        variantes (int): Tamanho do catálogo sintético
+        latencia (float): Atraso (s) aplicado a cada requisição
+        taxa_rest (float): Vazão do leaky bucket REST (chamadas/s, 0 desliga)
+        custo_graphql (float): Pontos de custo GraphQL restaurados por segundo
+        locations (int): Quantidade de locations da loja
+        pedidos (int): Quantidade de pedidos sintéticos
+        seed (int): Semente do catálogo
+    Returns:
+        dict: URLs base, processo e tamanhos dos catálogos
+    """
+    contexto = multiprocessing.get_context('fork')
+    receptor, emissor = contexto.Pipe(duplex=False)
+    processo = contexto.Process(target=_processo_servidores, args=(emissor, {
+        'variantes': variantes, 'latencia': latencia, 'taxa_rest': taxa_rest,
+        'custo_graphql': custo_graphql, 'locations': locations, 'pedidos': pedidos, 'seed': seed
+    }), daemon=True)
+    processo.start()
+    emissor.close()
+    info = receptor.recv()
+    info['processo'] = processo
+    info['url_hiper'] = f"http://127.0.0.1:{info['hiper']}{PREFIXO_HIPER}"
+    info['url_shopify'] = f"http://127.0.0.1:{info['shopify']}"
+    return info
+
+def parar_servidores(info):
+    """Encerra o processo dos servidores"""
+    processo = info['processo']
+    processo.terminate()
+    processo.join(timeout=5)
+
+def ambiente_para(info, base=None):
+    """Variáveis de ambiente que apontam os scripts de sincronização para os servidores locais"""
+    env = dict(base if base is not None else os.environ)
+    env.update({
+        'HIPER_URL_BASE': info['url_hiper'],
+        'SECURITY_KEY': 'chave-bench',
+        'SHOP_NAME': 'loja-bench',
+        'PASSWORD': 'shpat_bench',
+        'SHOPIFY_SITE': info['url_shopify']
+    })
+    return env
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidores locais Hiper/Shopify para benchmark")
+    parser.add_argument('--variantes', type=int, default=1000)
+    parser.add_argument('--latencia', type=float, default=0.0)
+    parser.add_argument('--taxa-rest', type=float, default=2.0)
+    parser.add_argument('--locations', type=int, default=1)
+    args = parser.parse_args()
+
+    info = iniciar_servidores(args.variantes, args.latencia, args.taxa_rest, locations=args.locations)
+    print(f"Hiper:   {info['url_hiper']}")
+    print(f"Shopify: {info['url_shopify']}")
+    print("Variáveis de ambiente:")
+    for chave, valor in ambiente_para(info, base={}).items():
+        print(f"  export {chave}={valor}")
+    try:
+        info['processo'].join()
+    except KeyboardInterrupt:
+        parar_servidores(info)
+        sys.exit(0)
@@ -2,17 +2,47 @@ import os
 import json
 import logging
 import requests
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+import tracing
+import resiliencia
 
 # Carrega variáveis do arquivo .env
 load_dotenv()
 
 # Configurações de diretório
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-LOG_DIR = os.path.join(BASE_DIR, 'logs')
+LOG_DIR = os.getenv('SYNC_LOG_DIR') or os.path.join(BASE_DIR, 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Endpoints das APIs (sobrescrevíveis para rodar contra servidores locais)
+HIPER_URL_BASE = os.getenv('HIPER_URL_BASE', 'https://ms-ecommerce.hiper.com.br/api/v1')
+SHOPIFY_API_VERSION = '2024-01'
+
+# Validade assumida do token do Hiper antes de gerar outro
+HIPER_TOKEN_TTL = timedelta(minutes=int(os.getenv('HIPER_TOKEN_TTL', '30')))
+
+# Sessão HTTP compartilhada (pool de conexões keep-alive) e token do Hiper em cache
+_http = {'sessao': None}
+_http_lock = threading.Lock()
+_hiper = {'config': None, 'gerado_em': datetime.min}
+_hiper_lock = threading.Lock()
+
+def sessao_http():
+    """Retorna a sessão HTTP compartilhada, reaproveitando conexões entre chamadas"""
+    with _http_lock:
+        if _http['sessao'] is None:
+            _http['sessao'] = requests.Session()
+        return _http['sessao']
+
+def fechar_sessao_http():
+    """Fecha a sessão HTTP compartilhada e libera as conexões do pool"""
+    with _http_lock:
+        if _http['sessao'] is not None:
+            _http['sessao'].close()
+            _http['sessao'] = None
+
 def configurar_shopify():
     """Configura as credenciais da Shopify"""
     api_key = os.getenv("API_KEY")
@@ -21,15 +51,45 @@ def configurar_shopify():
     
     return shop_name  # Retorna apenas o nome da loja
 
+def site_shopify_local(api_version=SHOPIFY_API_VERSION):
+    """Retorna o site da API Shopify definido em SHOPIFY_SITE (ex: servidor local de benchmark)"""
+    site = os.getenv('SHOPIFY_SITE')
+    if not site:
+        return None
+    return f"{site.rstrip('/')}/admin/api/{api_version}"
+
 def configurar_hiper():
-    """Configura as credenciais e conexão com o Hiper"""
+    """
+    Configura as credenciais e conexão com o Hiper
+
+    O token gerado fica em cache por HIPER_TOKEN_TTL; chamadas seguintes
+    reaproveitam a configuração sem gerar token nem testar a conexão de novo.
+    Um token recusado antes disso é descartado com invalidar_token_hiper().
+    """
+    with _hiper_lock:
+        if _hiper['config'] and datetime.now() - _hiper['gerado_em'] < HIPER_TOKEN_TTL:
+            return _hiper['config']
+        config = _gerar_config_hiper()
+        if config:
+            _hiper['config'] = config
+            _hiper['gerado_em'] = datetime.now()
+        return config
+
+def invalidar_token_hiper():
+    """Descarta o token do Hiper em cache (ex: após um 401); o próximo configurar_hiper gera outro"""
+    with _hiper_lock:
+        _hiper['config'] = None
+        _hiper['gerado_em'] = datetime.min
+
+def _gerar_config_hiper():
+    """Gera um token novo no Hiper e valida a conexão"""
     try:
         security_key = os.getenv('SECURITY_KEY')
         if not security_key:
             logging.error("Chave de segurança do Hiper não encontrada")
             return None
             
-        url_base = 'https://ms-ecommerce.hiper.com.br/api/v1'
+        url_base = HIPER_URL_BASE
         url_token = f"{url_base}/auth/gerar-token/{security_key}"
         
         headers_token = {
@@ -38,7 +98,9 @@ def configurar_hiper():
         }
         
         # Tenta gerar o token
-        response = requests.get(url_token, headers=headers_token)
+        with tracing.span('hiper.gerar_token', categoria='hiper_calls'):
+            response = resiliencia.executar(
+                lambda: sessao_http().get(url_token, headers=headers_token, timeout=30), 'hiper')
         if response.status_code != 200:
             logging.error(f"Erro ao gerar token Hiper: {response.status_code}")
             return None
@@ -56,9 +118,12 @@ def configurar_hiper():
             }
         }
         
-        # Testa conexão
+        # Testa conexão (só o status; o corpo é o catálogo inteiro e não é lido)
         test_url = f"{url_base}/produtos/pontoDeSincronizacao"
-        test_response = requests.get(test_url, headers=config['headers'])
+        with tracing.span('hiper.validar_conexao', categoria='hiper_calls'):
+            test_response = resiliencia.executar(
+                lambda: sessao_http().get(test_url, headers=config['headers'], stream=True, timeout=30), 'hiper')
+            test_response.close()
         if test_response.status_code != 200:
             logging.error(f"Erro ao validar conexão Hiper: {test_response.status_code}")
             return None
@@ -81,7 +146,7 @@ def setup_logging():
         
         # Configura formato do log
         logging.basicConfig(
-            level=logging.INFO,
+            level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO),
             format='%(asctime)s [%(levelname)s] %(message)s',
             handlers=[
                 logging.FileHandler(log_file, encoding='utf-8'),
@@ -0,0 +1,165 @@
+"""
+Modo daemon da sincronização
+
+Mantém um único processo vivo com a sessão Shopify ativa, o token do Hiper e o
+pool de conexões HTTP aquecidos, e agenda os jobs de estoque, pedidos e preços
+com intervalos próprios. SIGTERM/SIGINT encerram o processo ao fim do job atual.
+
+O catálogo Shopify e o índice de SKUs também ficam em memória: a cada ciclo só
+os produtos alterados desde o anterior são buscados (updated_at_min), e o
+catálogo inteiro é recarregado a cada CATALOGO_RECARGA_MINUTOS (padrão: 60) ou
+quando a contagem de produtos não bate. O estoque das variantes continua sendo
+lido da loja em todo ciclo.
+
+Cada job devolve None quando falha (as sincronizações registram o erro e não
+o propagam); isso conta como falha do job, assim como uma exceção, e força
+revalidar a sessão Shopify no ciclo seguinte.
+
+Uso:
+    python daemon.py                        # intervalos do .env ou padrão
+    python daemon.py --estoque 15 --pedidos 5
+    python daemon.py --pedidos 0            # desliga o job de pedidos
+    python daemon.py --precos 60            # liga o job de preços (desligado por padrão)
+    python daemon.py --max-pedidos 50       # mais pedidos por ciclo (padrão: 1, como o sync_orders)
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+
+import shopify
+import tracing
+import sync_stock
+import sync_orders
+import sync_prices
+from config import setup_logging, fechar_sessao_http, LOG_DIR
+
+class Job:
+    """Job agendado com intervalo fixo em segundos"""
+    def __init__(self, nome, intervalo, funcao):
+        self.nome = nome
+        self.intervalo = intervalo
+        self.funcao = funcao
+        self.proxima = time.monotonic()
+        self.execucoes = 0
+        self.falhas = 0
+
+class Daemon:
+    """Agendador simples de jobs com parada limpa por sinal"""
+    def __init__(self, jobs):
+        self.jobs = [job for job in jobs if job.intervalo > 0]
+        self.parar = threading.Event()
+        self.sessao_shopify_ok = False
+
+    def tratar_sinal(self, signum, frame):
+        logging.info(f"Sinal {signal.Signals(signum).name} recebido, encerrando após o job atual...")
+        self.parar.set()
+
+    def garantir_sessao_shopify(self):
+        """Ativa a sessão Shopify uma vez e reaproveita entre os ciclos"""
+        if not self.sessao_shopify_ok:
+            self.sessao_shopify_ok = sync_stock.configurar_sessao_shopify()
+        return self.sessao_shopify_ok
+
+    def executar(self, job):
+        logger = logging.getLogger(__name__)
+        if not self.garantir_sessao_shopify():
+            logger.error(f"Job {job.nome} adiado: sessão Shopify indisponível")
+            return
+        logger.info(f"Iniciando job {job.nome} (execução {job.execucoes + 1})")
+        inicio = time.perf_counter()
+        try:
+            with tracing.span(f"job.{job.nome}", categoria='fase'):
+                resultado = job.funcao()
+            job.execucoes += 1
+            if resultado is None:
+                self.registrar_falha(job, "sincronização terminou com erro (ver log acima)")
+        except Exception as e:
+            self.registrar_falha(job, str(e))
+            logger.exception("Detalhes do erro:")
+        logger.info(f"Job {job.nome} finalizado em {time.perf_counter() - inicio:.1f}s")
+
+        if tracing.ativo():
+            tracing.exportar(LOG_DIR, prefixo=f"trace_{job.nome}")
+            tracing.ativar()
+
+    def registrar_falha(self, job, motivo):
+        job.falhas += 1
+        # Força revalidar a sessão no próximo ciclo
+        self.sessao_shopify_ok = False
+        logging.getLogger(__name__).error(f"Erro no job {job.nome}: {motivo}")
+
+    def rodar(self):
+        logger = logging.getLogger(__name__)
+        if not self.jobs:
+            logger.error("Nenhum job habilitado")
+            return False
+
+        for job in self.jobs:
+            logger.info(f"Job {job.nome} agendado a cada {job.intervalo / 60:g} min")
+
+        while not self.parar.is_set():
+            job = min(self.jobs, key=lambda j: j.proxima)
+            espera = job.proxima - time.monotonic()
+            if espera > 0 and self.parar.wait(espera):
+                break
+            self.executar(job)
+            # Intervalo fixo sem acumular execuções atrasadas
+            job.proxima = max(job.proxima + job.intervalo, time.monotonic())
+
+        for job in self.jobs:
+            logger.info(f"Job {job.nome}: {job.execucoes} execuções, {job.falhas} falhas")
+        return True
+
+def _minutos(valor_cli, variavel, padrao):
+    if valor_cli is not None:
+        return valor_cli
+    return float(os.getenv(variavel, padrao))
+
+def main():
+    """Sobe o daemon com os jobs de estoque, pedidos e preços"""
+    parser = argparse.ArgumentParser(description="Daemon de sincronização Hiper/Shopify")
+    parser.add_argument('--estoque', type=float, help="Intervalo do job de estoque em minutos (0 desliga)")
+    parser.add_argument('--pedidos', type=float, help="Intervalo do job de pedidos em minutos (0 desliga)")
+    parser.add_argument('--precos', type=float, help="Intervalo do job de preços em minutos (0 desliga)")
+    parser.add_argument('--max-pedidos', type=int, default=1,
+                        help="Limite de pedidos por ciclo (padrão: 1, o mesmo do sync_orders)")
+    parser.add_argument('--trace', action='store_true', help="Exporta um trace por ciclo")
+    args = parser.parse_args()
+
+    tracing.configurar_por_ambiente(['--trace'] if args.trace else None)
+    if not setup_logging():
+        print("Falha ao configurar logging")
+        return False
+    logger = logging.getLogger(__name__)
+
+    if not sync_orders.setup_cache():
+        logger.error("Falha ao configurar cache de pedidos")
+        return False
+
+    # Catálogo do Hiper sempre buscado de novo: o estoque precisa ser o atual
+    jobs = [
+        Job('estoque', _minutos(args.estoque, 'DAEMON_INTERVALO_ESTOQUE', '15') * 60,
+            lambda: sync_stock.sincronizar_estoque(usar_cache=False, em_memoria=True)),
+        Job('pedidos', _minutos(args.pedidos, 'DAEMON_INTERVALO_PEDIDOS', '5') * 60,
+            lambda: sync_orders.processar_pedidos(max_orders=args.max_pedidos)),
+        Job('precos', _minutos(args.precos, 'DAEMON_INTERVALO_PRECOS', '0') * 60,
+            lambda: sync_prices.sincronizar_precos(usar_cache=False, em_memoria=True))
+    ]
+    daemon = Daemon(jobs)
+    signal.signal(signal.SIGTERM, daemon.tratar_sinal)
+    signal.signal(signal.SIGINT, daemon.tratar_sinal)
+
+    logger.info("Daemon de sincronização iniciado")
+    try:
+        return daemon.rodar()
+    finally:
+        shopify.ShopifyResource.clear_session()
+        fechar_sessao_http()
+        logger.info("Daemon de sincronização finalizado")
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
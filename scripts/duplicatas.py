@@ -0,0 +1,186 @@
+"""
+Detecção de produtos duplicados no catálogo da Shopify
+
+Cada produto vira uma impressão digital (SKU base, nome normalizado e grade de
+tamanhos) numa única passada pelo catálogo. Produtos que caem no mesmo balde
+de hash (mesmo SKU base, ou mesmo nome com a mesma grade) são unidos num grupo,
+sem comparar produtos dois a dois, então o custo é linear no tamanho do
+catálogo.
+
+O relatório traz os grupos ordenados pela confiança e a lista 'excluir' no
+formato que excluir_duplicatas.py consome. Só entram em 'excluir' as
+duplicatas de grupos com o mesmo SKU base (todos os de confiança alta e os
+de confiança média ligados pelo SKU); grupos ligados só por nome e grade
+podem ser produtos diferentes com o mesmo nome e vão para 'revisar':
+
+    python duplicatas.py --saida relatorio_duplicatas.json
+    python old_things/excluir_duplicatas.py --relatorio relatorio_duplicatas.json --chave excluir
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter, namedtuple
+from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
+from dotenv import load_dotenv
+import shopify_api
+from config import setup_logging
+from sync_stock import normalizar_nome, mapear_tamanho
+
+# Impressão digital de um produto do catálogo
+Impressao = namedtuple('Impressao', [
+    'produto_id', 'titulo', 'sku_base', 'nome', 'grade', 'variantes', 'quantidade'
+])
+
+def sku_base(variantes):
+    """SKU base mais comum entre as variantes (SKU sem o sufixo do tamanho)"""
+    bases = Counter(filter(None, (shopify_api.sku_sem_tamanho(v) for v in variantes)))
+    return bases.most_common(1)[0][0] if bases else ''
+
+def impressao_produto(variantes):
+    """Impressão digital de um produto a partir das suas variantes (VarianteShopify)"""
+    primeira = variantes[0]
+    grade = tuple(sorted({mapear_tamanho(v.titulo_variante) or '' for v in variantes}))
+    return Impressao(
+        primeira.produto_id,
+        primeira.titulo_produto,
+        sku_base(variantes),
+        normalizar_nome(primeira.titulo_produto.split(' - ')[0]),
+        grade,
+        len(variantes),
+        sum(v.quantidade for v in variantes)
+    )
+
+def impressoes(variantes):
+    """Agrupa o fluxo de variantes (consecutivas por produto) em impressões digitais"""
+    for _, grupo in groupby(variantes, key=attrgetter('produto_id')):
+        yield impressao_produto(list(grupo))
+
+def _raiz(pais, i):
+    while pais[i] != i:
+        pais[i] = pais[pais[i]]
+        i = pais[i]
+    return i
+
+def _confianca(membros):
+    """Critérios que todos os membros do grupo compartilham"""
+    motivos = []
+    if len({m.sku_base for m in membros}) == 1 and membros[0].sku_base:
+        motivos.append('sku_base')
+    if len({(m.nome, m.grade) for m in membros}) == 1 and membros[0].nome:
+        motivos.append('nome_grade')
+    return motivos
+
+def _produto(impressao):
+    return {
+        'id': impressao.produto_id,
+        'title': impressao.titulo,
+        'sku_base': impressao.sku_base,
+        'variantes': impressao.variantes,
+        'quantidade': impressao.quantidade
+    }
+
+def detectar_duplicatas(variantes):
+    """
+    Encontra grupos de produtos duplicados num fluxo de VarianteShopify
+
+    Args:
+        variantes (iterable): Variantes agrupadas por produto (ex: iterar_variantes)
+    Returns:
+        dict: Relatório com os grupos ordenados por confiança e as listas
+            'excluir' (mesmo SKU base) e 'revisar' (revisão manual)
+    """
+    produtos = []
+    pais = []
+    baldes = {}
+
+    for impressao in impressoes(variantes):
+        i = len(produtos)
+        produtos.append(impressao)
+        pais.append(i)
+        chaves = []
+        if impressao.sku_base:
+            chaves.append(('sku', impressao.sku_base))
+        if impressao.nome:
+            chaves.append(('nome', impressao.nome, impressao.grade))
+        for chave in chaves:
+            primeiro = baldes.setdefault(chave, i)
+            if primeiro != i:
+                a, b = _raiz(pais, primeiro), _raiz(pais, i)
+                if a != b:
+                    pais[max(a, b)] = min(a, b)
+
+    componentes = {}
+    for i in range(len(produtos)):
+        componentes.setdefault(_raiz(pais, i), []).append(i)
+
+    grupos = []
+    excluir = []
+    revisar = []
+    for indices in componentes.values():
+        if len(indices) < 2:
+            continue
+        membros = [produtos[i] for i in indices]
+        # Fica o produto com mais estoque; no empate, o mais antigo (menor id)
+        membros.sort(key=lambda m: (-m.quantidade, m.produto_id))
+        motivos = _confianca(membros)
+        grupos.append({
+            'confianca': 'alta' if len(motivos) == 2 else 'media' if motivos else 'baixa',
+            'motivos': motivos,
+            'manter': _produto(membros[0]),
+            'duplicatas': [_produto(m) for m in membros[1:]]
+        })
+
+    ordem = {'alta': 0, 'media': 1, 'baixa': 2}
+    grupos.sort(key=lambda g: (ordem[g['confianca']], -len(g['duplicatas']), g['manter']['id']))
+    for grupo in grupos:
+        # Só o SKU base em comum basta para excluir sem revisão; grupos ligados só
+        # por nome e grade ou de forma transitiva ficam para revisão manual
+        destino = excluir if 'sku_base' in grupo['motivos'] else revisar
+        destino.extend({'id': d['id'], 'title': d['title'], 'sku_base': d['sku_base'],
+                        'manter': grupo['manter']['id']}
+                       for d in grupo['duplicatas'])
+
+    return {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'produtos_analisados': len(produtos),
+        'total_grupos': len(grupos),
+        'total_excluir': len(excluir),
+        'total_revisar': len(revisar),
+        'grupos': grupos,
+        'excluir': excluir,
+        'revisar': revisar
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Detecta produtos duplicados no catálogo da Shopify")
+    parser.add_argument('--saida', default='relatorio_duplicatas.json', help="Arquivo do relatório")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not setup_logging():
+        print("Falha ao configurar logging")
+        return False
+    cliente = shopify_api.cliente_padrao()
+    if not cliente:
+        return False
+
+    inicio = time.perf_counter()
+    relatorio = detectar_duplicatas(shopify_api.iterar_variantes(cliente))
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    logging.info(f"{relatorio['produtos_analisados']} produtos analisados em {time.perf_counter() - inicio:.1f}s")
+    logging.info(f"{relatorio['total_grupos']} grupos de duplicatas, {relatorio['total_excluir']} produtos a excluir, "
+                 f"{relatorio['total_revisar']} para revisão manual")
+    for grupo in relatorio['grupos'][:20]:
+        logging.info(f"  [{grupo['confianca']}] {grupo['manter']['title']} (ID {grupo['manter']['id']}): "
+                     f"{len(grupo['duplicatas'])} duplicata(s)")
+    logging.info(f"Relatório salvo em {args.saida}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,126 @@
+"""
+Journal de execuções longas (uma linha JSON por item concluído)
+
+Cada resultado é acrescentado ao arquivo assim que o item termina, então uma
+execução interrompida pode ser retomada lendo o journal: os itens já
+registrados são pulados sem nenhuma chamada de API. Uma linha cortada no meio
+(queda durante a escrita) é ignorada na leitura.
+
+    journal = Journal('logs/criacao.journal')
+    if not journal.concluido(sku, lambda r: r['sucesso']):
+        journal.registrar(sku, resultado)
+    journal.compactar()
+"""
+import os
+import json
+import logging
+import threading
+
+class Journal:
+    """Registro append-only de resultados por chave (o último registro de cada chave vale)"""
+    def __init__(self, caminho, sincronizar=True):
+        self.caminho = caminho
+        self.sincronizar = sincronizar
+        self.entradas = {}
+        self._lock = threading.Lock()
+        self._arquivo = None
+        self._carregar()
+
+    def _carregar(self):
+        if not os.path.exists(self.caminho):
+            return
+        descartadas = 0
+        with open(self.caminho, 'r', encoding='utf-8') as f:
+            for linha in f:
+                try:
+                    entrada = json.loads(linha)
+                    self.entradas[entrada['chave']] = entrada['registro']
+                except (ValueError, KeyError, TypeError):
+                    descartadas += 1
+        if descartadas:
+            logging.warning(f"Journal {self.caminho}: {descartadas} linhas inválidas ignoradas")
+        if self.entradas:
+            logging.info(f"Journal {self.caminho}: {len(self.entradas)} itens de execuções anteriores")
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def __contains__(self, chave):
+        return chave in self.entradas
+
+    def get(self, chave, padrao=None):
+        return self.entradas.get(chave, padrao)
+
+    def concluido(self, chave, criterio=None):
+        """Se a chave já tem registro (e ele satisfaz o critério, quando informado)"""
+        registro = self.entradas.get(chave)
+        if registro is None:
+            return False
+        return criterio is None or bool(criterio(registro))
+
+    def registrar(self, chave, registro):
+        """Acrescenta o resultado da chave ao journal e o grava em disco antes de retornar"""
+        self.registrar_varios([(chave, registro)])
+
+    def registrar_varios(self, itens):
+        """Acrescenta vários pares (chave, registro) com uma única ida ao disco"""
+        linhas = ''.join(
+            json.dumps({'chave': chave, 'registro': registro}, ensure_ascii=False) + '\n'
+            for chave, registro in itens
+        )
+        with self._lock:
+            if self._arquivo is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+                self._arquivo = open(self.caminho, 'a', encoding='utf-8')
+            self._arquivo.write(linhas)
+            self._arquivo.flush()
+            if self.sincronizar:
+                os.fsync(self._arquivo.fileno())
+            for chave, registro in itens:
+                self.entradas[chave] = registro
+
+    def compactar(self):
+        """Reescreve o journal com um registro por chave (troca atômica do arquivo)"""
+        with self._lock:
+            self._fechar_arquivo()
+            temporario = f"{self.caminho}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                for chave, registro in self.entradas.items():
+                    f.write(json.dumps({'chave': chave, 'registro': registro}, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporario, self.caminho)
+
+    def manter(self, criterio):
+        """Fica só com os registros que satisfazem o critério (descarta o journal se não sobrar nenhum)"""
+        with self._lock:
+            self.entradas = {chave: registro for chave, registro in self.entradas.items() if criterio(registro)}
+            vazio = not self.entradas
+        if vazio:
+            self.limpar()
+        else:
+            self.compactar()
+
+    def limpar(self):
+        """Descarta o journal (próxima execução começa do zero)"""
+        with self._lock:
+            self._fechar_arquivo()
+            self.entradas = {}
+            if os.path.exists(self.caminho):
+                os.remove(self.caminho)
+
+    def _fechar_arquivo(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+            self._arquivo = None
+
+    def fechar(self):
+        with self._lock:
+            self._fechar_arquivo()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+        return False
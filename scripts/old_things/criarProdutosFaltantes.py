@@ -1,12 +1,13 @@
-import shopify
-import requests
 import os
-import pandas as pd
 from dotenv import load_dotenv
-from config import configurar_shopify, configurar_hiper
+from config import configurar_hiper, sessao_http
+from journal import Journal
+from shopify_api import (cliente_padrao, iterar_variantes, executar_mutacao_em_massa,
+                         aguardar_operacao_em_massa, ler_resultado_em_massa)
 import logging
-import re
-from datetime import datetime
+import argparse
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import json
 
@@ -20,30 +21,74 @@ logging.basicConfig(
     ]
 )
 
-def verificar_produto_existente(sku_base):
+# Produtos criados ao mesmo tempo (todos dividem o limitador de chamadas do cliente)
+CRIACAO_WORKERS = int(os.getenv('CRIACAO_WORKERS', '4'))
+
+# Resultado de cada SKU base, gravado ao concluir (retomada após queda)
+JOURNAL_CRIACAO = os.getenv('CRIACAO_JOURNAL', 'criacao_produtos.journal')
+
+# Tamanhos padrão das variantes criadas
+TAMANHOS = ['36', '38', '40', '42']
+
+# Mutation aplicada a cada linha do JSONL na criação em massa
+CRIAR_PRODUTO_MUTACAO = """
+mutation criarProduto($input: ProductInput!) {
+  productCreate(input: $input) {
+    product { id title variants(first: 10) { edges { node { id sku } } } }
+    userErrors { field message }
+  }
+}
+"""
+
+class IndicePrefixos:
+    """
+    Índice dos SKUs da Shopify para buscar produtos por prefixo de SKU
+
+    Os SKUs ficam ordenados; todos os que começam com um prefixo ficam
+    contíguos a partir de bisect_left(prefixo), então cada consulta é O(log N).
+    """
+    def __init__(self, variantes):
+        pares = sorted((v.sku, v.produto_id) for v in variantes if v.sku)
+        self.skus = [sku for sku, _ in pares]
+        self.produtos = [produto_id for _, produto_id in pares]
+
+    def produto_com_prefixo(self, sku_base):
+        """Id do produto com alguma variante cujo SKU começa com sku_base (ou None)"""
+        posicao = bisect_left(self.skus, sku_base)
+        if posicao < len(self.skus) and self.skus[posicao].startswith(sku_base):
+            return self.produtos[posicao]
+        return None
+
+def montar_indice_shopify(cliente=None):
+    """Busca o catálogo da Shopify uma única vez e indexa os SKUs por prefixo"""
+    indice = IndicePrefixos(iterar_variantes(cliente or cliente_padrao()))
+    logging.info(f"Índice de SKUs da Shopify montado: {len(indice.skus)} variantes")
+    return indice
+
+def verificar_produto_existente(sku_base, indice):
     """
     Verifica se já existe um produto com o SKU base informado
+
+    O índice vem de montar_indice_shopify(), montado uma vez por execução.
     """
     try:
-        # Buscar produtos com o SKU base
-        produtos = shopify.Product.find(vendor="Marca não especificada")
-        for produto in produtos:
-            for variante in produto.variants:
-                if variante.sku and variante.sku.startswith(sku_base):
-                    return True, produto.id
-        return False, None
+        produto_id = indice.produto_com_prefixo(sku_base)
+        return produto_id is not None, produto_id
     except Exception as e:
         logging.error(f"Erro ao verificar produto existente: {str(e)}")
         return False, None
 
-def criar_produto_shopify(produto_hiper):
+def criar_produto_shopify(produto_hiper, indice, cliente=None):
     """
     Cria um produto na Shopify baseado nos dados do Hiper
+
+    Pode rodar em várias threads: usa o cliente REST compartilhado (e o
+    limitador de chamadas dele) em vez da sessão do ActiveResource.
     """
     try:
         # Verificar se o produto já existe
         sku_base = produto_hiper['codigoDeBarras']
-        produto_existe, produto_id = verificar_produto_existente(sku_base)
+        produto_existe, produto_id = verificar_produto_existente(sku_base, indice)
         
         if produto_existe:
             return {
@@ -51,18 +96,19 @@ def criar_produto_shopify(produto_hiper):
                 'erro': f"Produto já existe (ID: {produto_id})",
                 'ja_existe': True
             }
-
+        
         # Criar produto base
-        novo_produto = shopify.Product()
-        novo_produto.title = produto_hiper['nome']
-        novo_produto.body_html = produto_hiper.get('descricao', '')
-        novo_produto.vendor = produto_hiper.get('marca', 'Marca não especificada')
-        novo_produto.product_type = produto_hiper.get('categoria', 'Categoria não especificada')
+        novo_produto = {
+            'title': produto_hiper['nome'],
+            'body_html': produto_hiper.get('descricao', ''),
+            'vendor': produto_hiper.get('marca', 'Marca não especificada'),
+            'product_type': produto_hiper.get('categoria', 'Categoria não especificada')
+        }
         
         # Configurar variantes
-        tamanhos = ['36', '38', '40', '42']  # Tamanhos padrão
+        tamanhos = TAMANHOS
         
-        novo_produto.options = [
+        novo_produto['options'] = [
             {
                 "name": "Tamanho",
                 "values": tamanhos
@@ -74,7 +120,7 @@ def criar_produto_shopify(produto_hiper):
         preco = float(produto_hiper.get('preco', 0))
         
         for tamanho in tamanhos:
-            variante = shopify.Variant({
+            variantes.append({
                 "option1": tamanho,
                 "sku": f"{sku_base}{tamanho}",
                 "price": preco,
@@ -82,52 +128,177 @@ def criar_produto_shopify(produto_hiper):
                 "inventory_quantity": 0,  # Estoque inicial zero
                 "requires_shipping": True
             })
-            variantes.append(variante)
         
-        novo_produto.variants = variantes
+        novo_produto['variants'] = variantes
         
         # Salvar produto
-        if novo_produto.save():
+        cliente = cliente or cliente_padrao()
+        resposta = cliente.requisitar('POST', 'products.json', json={'product': novo_produto})
+        if resposta.status_code in (200, 201):
+            criado = resposta.json()['product']
             return {
                 'sucesso': True,
                 'produto': {
-                    'id': novo_produto.id,
-                    'title': novo_produto.title,
+                    'id': criado['id'],
+                    'title': criado['title'],
                     'sku_base': sku_base,
-                    'variantes': [v.sku for v in novo_produto.variants]
+                    'variantes': [v['sku'] for v in criado.get('variants', [])]
                 }
             }
         else:
             return {
                 'sucesso': False,
-                'erro': novo_produto.errors.full_messages()
+                'erro': resposta.json().get('errors') if resposta.content else resposta.status_code
             }
-            
+    
     except Exception as e:
         return {
             'sucesso': False,
             'erro': str(e)
         }
 
-def criar_todos_produtos():
+def montar_entrada_produto(produto_hiper):
+    """ProductInput (GraphQL) equivalente ao produto montado por criar_produto_shopify"""
+    sku_base = produto_hiper['codigoDeBarras']
+    preco = str(float(produto_hiper.get('preco', 0)))
+    return {
+        'title': produto_hiper['nome'],
+        'descriptionHtml': produto_hiper.get('descricao', ''),
+        'vendor': produto_hiper.get('marca', 'Marca não especificada'),
+        'productType': produto_hiper.get('categoria', 'Categoria não especificada'),
+        'options': ['Tamanho'],
+        'variants': [
+            {
+                'options': [tamanho],
+                'sku': f"{sku_base}{tamanho}",
+                'price': preco,
+                'inventoryManagement': 'SHOPIFY',
+                'requiresShipping': True
+            }
+            for tamanho in TAMANHOS
+        ]
+    }
+
+def criar_produtos_em_massa(faltantes, cliente=None, caminho_jsonl='criacao_em_massa.jsonl'):
+    """
+    Cria os produtos numa única operação em massa da Shopify
+
+    Grava um ProductInput por linha num JSONL, sobe o arquivo por staged upload
+    e roda productCreate com bulkOperationRunMutation. O resultado volta na
+    ordem das linhas (__lineNumber), que é a mesma de faltantes.
+
+    Returns:
+        list: Um resultado por produto, no formato de criar_produto_shopify
+    """
+    cliente = cliente or cliente_padrao()
+    with open(caminho_jsonl, 'w', encoding='utf-8') as f:
+        for produto in faltantes:
+            f.write(json.dumps({'input': montar_entrada_produto(produto)}, ensure_ascii=False) + '\n')
+    logging.info(f"{len(faltantes)} produtos gravados em {caminho_jsonl}")
+
+    operacao_id = executar_mutacao_em_massa(cliente, CRIAR_PRODUTO_MUTACAO, caminho_jsonl)
+    operacao = aguardar_operacao_em_massa(cliente, operacao_id)
+
+    resultados = [None] * len(faltantes)
+    url = operacao.get('url') or operacao.get('partialDataUrl')
+    if url:
+        for linha in ler_resultado_em_massa(url):
+            numero = linha.get('__lineNumber')
+            if numero is None or not 0 <= numero < len(faltantes):
+                continue
+            criacao = (linha.get('data') or {}).get('productCreate') or {}
+            produto = criacao.get('product')
+            if produto and not criacao.get('userErrors'):
+                resultados[numero] = {
+                    'sucesso': True,
+                    'produto': {
+                        'id': int(produto['id'].rsplit('/', 1)[-1]),
+                        'title': produto['title'],
+                        'sku_base': faltantes[numero]['codigoDeBarras'],
+                        'variantes': [aresta['node']['sku'] for aresta in produto['variants']['edges']]
+                    }
+                }
+            else:
+                resultados[numero] = {
+                    'sucesso': False,
+                    'erro': criacao.get('userErrors') or linha.get('errors') or 'Produto não criado'
+                }
+
+    # Linhas sem resultado: a operação falhou ou terminou antes de chegar nelas
+    erro_operacao = f"Operação em massa {operacao['status']}" + (
+        f" ({operacao['errorCode']})" if operacao.get('errorCode') else '')
+    return [resultado or {'sucesso': False, 'erro': erro_operacao} for resultado in resultados]
+
+def _contabilizar(resultados, produto, resultado):
+    """Soma ao relatório o resultado da criação de um produto"""
+    if resultado['sucesso']:
+        resultados['criados'].append(resultado['produto'])
+        resultados['sucesso'] += 1
+    elif resultado.get('ja_existe'):
+        resultados['ja_existentes'].append({
+            'sku': produto['codigoDeBarras'],
+            'nome': produto['nome']
+        })
+        resultados['duplicatas'] += 1
+    else:
+        resultados['erros'].append({
+            'sku': produto['codigoDeBarras'],
+            'nome': produto['nome'],
+            'erro': resultado['erro']
+        })
+        resultados['falha'] += 1
+
+def _registrar_resultado(resultados, produto, resultado):
+    """Contabiliza no relatório o resultado da criação de um produto"""
+    _contabilizar(resultados, produto, resultado)
+    if resultado['sucesso']:
+        logging.info(f"✅ Produto criado com sucesso!")
+    elif resultado.get('ja_existe'):
+        logging.info(f"⚠️ Produto já existe na Shopify")
+    else:
+        logging.error(f"❌ Erro ao criar produto: {resultado['erro']}")
+
+def _registrar_no_journal(journal, produto, resultado):
+    journal.registrar(produto['codigoDeBarras'], {'nome': produto['nome'], 'resultado': resultado})
+    return resultado
+
+def _criar_com_journal(produto, indice, cliente, journal):
+    """Cria o produto e grava o resultado no journal ainda na thread de criação"""
+    return _registrar_no_journal(journal, produto, criar_produto_shopify(produto, indice, cliente))
+
+def _finalizado(registro):
+    """Itens do journal que não precisam rodar de novo (falhas são tentadas outra vez)"""
+    resultado = registro.get('resultado') or {}
+    return bool(resultado.get('sucesso') or resultado.get('ja_existe'))
+
+def criar_todos_produtos(em_massa=False, caminho_journal=JOURNAL_CRIACAO, recomecar=False):
     """
     Cria todos os produtos do Hiper na Shopify, exceto SKUs numéricos
+
+    O catálogo da Shopify é buscado uma vez e indexado por prefixo de SKU; os
+    faltantes saem da diferença com o Hiper e só eles são criados, em paralelo
+    ou, com em_massa=True, numa operação em massa (bulkOperationRunMutation).
+
+    Cada resultado vai para o journal assim que sai. Ao reiniciar depois de
+    uma queda, os SKUs já criados (ou já existentes) são lidos do journal e
+    pulados; só as falhas e o que faltou rodam de novo. No fim, o journal é
+    compactado no relatório final e removido se não restarem falhas.
     """
     try:
         inicio = time.time()
         logging.info("\n=== INICIANDO CRIAÇÃO DE PRODUTOS ===")
         
         # Configurar Shopify
-        shop_url = configurar_shopify()
-        session = shopify.Session(shop_url, '2024-01', os.getenv("PASSWORD"))
-        shopify.ShopifyResource.activate_session(session)
+        cliente = cliente_padrao()
+        if not cliente:
+            return None
         
         # Configurar Hiper
         config_hiper = configurar_hiper()
         
         # Buscar produtos do Hiper
         url_hiper = f"{config_hiper['url_base']}/produtos/pontoDeSincronizacao"
-        response_hiper = requests.get(url_hiper, headers=config_hiper['headers'])
+        response_hiper = sessao_http().get(url_hiper, headers=config_hiper['headers'])
         response_hiper.raise_for_status()
         produtos_hiper = response_hiper.json()['produtos']
         
@@ -148,35 +319,49 @@ def criar_todos_produtos():
             'duplicatas': 0
         }
         
-        # Criar produtos
-        for i, produto in enumerate(produtos_validos, 1):
-            logging.info(f"\nProcessando produto {i}/{len(produtos_validos)}: {produto['nome']} (SKU: {produto['codigoDeBarras']})")
-            
-            resultado = criar_produto_shopify(produto)
-            if resultado['sucesso']:
-                resultados['criados'].append(resultado['produto'])
-                resultados['sucesso'] += 1
-                logging.info(f"✅ Produto criado com sucesso!")
-            elif resultado.get('ja_existe'):
-                resultados['ja_existentes'].append({
-                    'sku': produto['codigoDeBarras'],
-                    'nome': produto['nome']
-                })
-                resultados['duplicatas'] += 1
-                logging.info(f"⚠️ Produto já existe na Shopify")
+        # Journal da execução (retomada)
+        journal = Journal(caminho_journal)
+        if recomecar:
+            journal.limpar()
+        
+        # Faltantes = Hiper menos o que o journal e o índice da Shopify já têm
+        indice = montar_indice_shopify(cliente)
+        faltantes = []
+        vistos = set()
+        retomados = 0
+        for produto in produtos_validos:
+            sku_base = produto['codigoDeBarras']
+            if sku_base in vistos:
+                continue
+            vistos.add(sku_base)
+            if journal.concluido(sku_base, _finalizado):
+                _contabilizar(resultados, produto, journal.get(sku_base)['resultado'])
+                retomados += 1
+            elif indice.produto_com_prefixo(sku_base) is not None:
+                _registrar_resultado(resultados, produto, {'sucesso': False, 'ja_existe': True})
             else:
-                resultados['erros'].append({
-                    'sku': produto['codigoDeBarras'],
-                    'nome': produto['nome'],
-                    'erro': resultado['erro']
-                })
-                resultados['falha'] += 1
-                logging.error(f"❌ Erro ao criar produto: {resultado['erro']}")
-            
-            # Salvar progresso a cada 10 produtos
-            if i % 10 == 0:
-                with open('progresso_criacao.json', 'w') as f:
-                    json.dump(resultados, f, indent=2)
+                faltantes.append(produto)
+        if retomados:
+            logging.info(f"Produtos concluídos em execução anterior (journal): {retomados}")
+        logging.info(f"Produtos já existentes: {resultados['duplicatas']}")
+        logging.info(f"Produtos faltantes a criar: {len(faltantes)}")
+        
+        # Criar produtos
+        if em_massa and faltantes:
+            for i, (produto, resultado) in enumerate(zip(faltantes, criar_produtos_em_massa(faltantes, cliente)), 1):
+                logging.info(f"\nProduto {i}/{len(faltantes)}: {produto['nome']} (SKU: {produto['codigoDeBarras']})")
+                _registrar_resultado(resultados, produto, _registrar_no_journal(journal, produto, resultado))
+            faltantes = []
+        
+        with ThreadPoolExecutor(max_workers=CRIACAO_WORKERS) as executor:
+            futuros = {
+                executor.submit(_criar_com_journal, produto, indice, cliente, journal): produto
+                for produto in faltantes
+            }
+            for i, futuro in enumerate(as_completed(futuros), 1):
+                produto = futuros[futuro]
+                logging.info(f"\nProduto {i}/{len(faltantes)}: {produto['nome']} (SKU: {produto['codigoDeBarras']})")
+                _registrar_resultado(resultados, produto, futuro.result())
         
         # Relatório final
         tempo_total = time.time() - inicio
@@ -193,17 +378,27 @@ def criar_todos_produtos():
                 logging.info(f"  - {erro['nome']} (SKU: {erro['sku']})")
                 logging.info(f"    Erro: {erro['erro']}")
         
-        # Salvar relatório final
+        # Salvar relatório final e compactar o journal nele
         with open('relatorio_criacao.json', 'w') as f:
             json.dump(resultados, f, indent=2)
-            
-        return resultados
+        if resultados['falha']:
+            journal.compactar()
+            logging.info(f"Journal mantido em {caminho_journal} para tentar as falhas de novo")
+        else:
+            journal.limpar()
         
+        return resultados
+    
     except Exception as e:
         logging.error(f"Erro durante o processo: {str(e)}")
         logging.error("Stack trace:", exc_info=True)
         return None
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cria na Shopify os produtos do Hiper que faltam")
+    parser.add_argument('--massa', action='store_true', help="Cria por operação em massa (JSONL + bulk mutation)")
+    parser.add_argument('--journal', default=JOURNAL_CRIACAO, help="Arquivo de journal da execução")
+    parser.add_argument('--recomecar', action='store_true', help="Ignora o journal e começa do zero")
+    args = parser.parse_args()
     load_dotenv()
-    criar_todos_produtos()
\ No newline at end of file
+    criar_todos_produtos(em_massa=args.massa, caminho_journal=args.journal, recomecar=args.recomecar)
@@ -3,7 +3,6 @@ import shopify
 import os
 import logging
 from config import configurar_shopify, configurar_hiper
-import pandas as pd
 
 # Configuração do logging
 logging.basicConfig(filename='./logs/criacao_produtos.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -48,6 +47,7 @@ def carregar_skus_existentes():
 
 # Função para carregar SKUs válidos do arquivo CSV
 def carregar_skus_validos():
+    import pandas as pd  # só esta função usa o pandas
     skus_validos = set()
     df = pd.read_csv('./skus_nao_encontrados.csv')
     for sku in df['SKU']:
@@ -1,122 +1,195 @@
 import json
-import shopify
 import os
 import traceback
 import time
-import requests
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from dotenv import load_dotenv
-from config import configurar_shopify
+from journal import Journal
+from shopify_api import cliente_padrao
 
-def inicializar_shopify():
-    """
-    Inicializa a conexão com a Shopify usando as configurações do arquivo config.py
-    """
-    shop_url = configurar_shopify()
-    session = shopify.Session(shop_url, '2024-01', os.getenv('PASSWORD'))
-    shopify.ShopifyResource.activate_session(session)
-    return shop_url
+# Lotes de exclusão enviados ao mesmo tempo (todos dividem o balde de custo do cliente)
+EXCLUSAO_WORKERS = int(os.getenv('EXCLUSAO_WORKERS', '4'))
+# Máximo de productDelete com alias por requisição
+EXCLUSAO_LOTE_MAX = int(os.getenv('EXCLUSAO_LOTE_MAX', '50'))
+# Custo de cada productDelete no balde do GraphQL
+CUSTO_EXCLUSAO = 10
+# Resultado de cada produto, gravado ao concluir (retomada após queda)
+JOURNAL_EXCLUSAO = os.getenv('EXCLUSAO_JOURNAL', 'exclusao_produtos.journal')
+# Lotes concluídos entre duas gravações do relatório parcial (o journal já guarda cada resultado)
+EXCLUSAO_RELATORIO_LOTES = int(os.getenv('EXCLUSAO_RELATORIO_LOTES', '20'))
+
+@lru_cache(maxsize=None)
+def mutacao_exclusao(quantidade):
+    """Mutation com `quantidade` productDelete apelidados (p0, p1, ...) e ids por variável"""
+    variaveis = ', '.join(f"$id{i}: ID!" for i in range(quantidade))
+    campos = '\n'.join(
+        f"    p{i}: productDelete(input: {{id: $id{i}}}) {{ deletedProductId userErrors {{ field message }} }}"
+        for i in range(quantidade)
+    )
+    return f"mutation excluirProdutos({variaveis}) {{\n{campos}\n}}"
+
+def tamanho_lote(cliente, workers):
+    """Produtos por requisição para que os lotes em paralelo caibam juntos no balde de custo"""
+    pontos = cliente.limitador_graphql.capacidade
+    return max(1, min(EXCLUSAO_LOTE_MAX, int(pontos // (CUSTO_EXCLUSAO * max(1, workers)))))
+
+def _produto_inexistente(erros_usuario):
+    return any('not exist' in e.get('message', '') or 'not found' in e.get('message', '').lower()
+               for e in erros_usuario)
 
-def deletar_produto_graphql(shop_url, produto_id, access_token):
+def excluir_lote(cliente, produtos, journal=None):
     """
-    Deleta um produto usando a API GraphQL do Shopify
+    Exclui um lote de produtos numa única requisição GraphQL
+
+    Produtos que a Shopify informa como inexistentes contam como excluídos
+    (foram removidos numa execução anterior interrompida antes do journal).
+
+    Returns:
+        list: Um resultado por produto ({'sucesso': bool, 'erro': str})
     """
-    headers = {
-        'Content-Type': 'application/json',
-        'X-Shopify-Access-Token': access_token
-    }
+    try:
+        dados = cliente.graphql(
+            mutacao_exclusao(len(produtos)),
+            {f"id{i}": f"gid://shopify/Product/{produto['id']}" for i, produto in enumerate(produtos)},
+            custo=CUSTO_EXCLUSAO * len(produtos)
+        )
+        respostas = dados.get('data') or {}
+        erro_geral = '; '.join(e.get('message', '') for e in dados.get('errors') or []) or 'Erro desconhecido'
+        resultados = []
+        for i in range(len(produtos)):
+            resposta = respostas.get(f"p{i}") or {}
+            erros_usuario = resposta.get('userErrors') or []
+            if resposta.get('deletedProductId') or _produto_inexistente(erros_usuario):
+                resultados.append({'sucesso': True})
+            elif erros_usuario:
+                resultados.append({'sucesso': False, 'erro': '; '.join(e['message'] for e in erros_usuario)})
+            else:
+                resultados.append({'sucesso': False, 'erro': erro_geral})
+    except Exception as e:
+        resultados = [{'sucesso': False, 'erro': str(e)} for _ in produtos]
     
-    query = """
-    mutation {
-        productDelete(input: {id: "gid://shopify/Product/%s"}) {
-            deletedProductId
-            userErrors {
-                field
-                message
-            }
-        }
+    if journal is not None:
+        for produto, resultado in zip(produtos, resultados):
+            journal.registrar(str(produto['id']), resultado)
+    return resultados
+
+def _salvar_relatorio(criados, journal, caminho='relatorio_exclusao.json'):
+    """Monta o relatório de exclusão a partir do journal e o grava com troca atômica"""
+    produtos_excluidos = []
+    erros = []
+    for produto in criados:
+        resultado = journal.get(str(produto['id']))
+        if resultado is None:
+            continue
+        if resultado['sucesso']:
+            produtos_excluidos.append({
+                'id': produto['id'],
+                'title': produto['title'],
+                'sku_base': produto['sku_base']
+            })
+        else:
+            erros.append({
+                'id': produto['id'],
+                'title': produto['title'],
+                'erro': resultado['erro']
+            })
+    relatorio_exclusao = {
+        'produtos_excluidos': produtos_excluidos,
+        'erros': erros,
+        'total_processado': len(criados),
+        'total_excluido': len(produtos_excluidos),
+        'total_erros': len(erros)
     }
-    """ % produto_id
-    
-    url = f"https://{shop_url}/admin/api/2024-01/graphql.json"
-    response = requests.post(url, headers=headers, json={'query': query})
-    return response.json()
+    temporario = f"{caminho}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(relatorio_exclusao, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+    return relatorio_exclusao
+
+def excluir_produtos(workers=EXCLUSAO_WORKERS, caminho_journal=JOURNAL_EXCLUSAO, recomecar=False,
+                     caminho_relatorio='relatorio_criacao.json', chave='criados'):
+    """
+    Exclui os produtos listados em relatorio_criacao.json
+
+    Com caminho_relatorio/chave, exclui outra lista de produtos no mesmo
+    formato (id, title, sku_base), como a lista 'excluir' do relatório de
+    duplicatas.py.
 
-def excluir_produtos():
+    Os produtos vão em lotes de productDelete apelidados, dimensionados pelo
+    balde de custo do GraphQL, com vários lotes em paralelo. Cada resultado
+    vai para o journal, então uma execução interrompida retoma só com os
+    produtos que faltam. relatorio_exclusao.json é montado do journal e
+    regravado a cada EXCLUSAO_RELATORIO_LOTES lotes e no fim (cada gravação
+    percorre a lista inteira).
+    """
     try:
-        with open('relatorio_criacao.json', 'r', encoding='utf-8') as f:
+        inicio = time.time()
+        with open(caminho_relatorio, 'r', encoding='utf-8') as f:
             relatorio = json.load(f)
-            
-        produtos_excluidos = []
-        erros = []
         
-        # Criar conjunto de SKUs do relatório para verificação rápida
-        skus_para_excluir = {produto['sku_base'] for produto in relatorio['criados']}
+        criados = relatorio[chave]
+        skus_para_excluir = {produto['sku_base'] for produto in criados}
         
-        print(f"Iniciando exclusão de {len(relatorio['criados'])} produtos...")
+        print(f"Iniciando exclusão de {len(criados)} produtos...")
         print(f"SKUs a serem excluídos: {len(skus_para_excluir)}")
         
-        shop_url = configurar_shopify()
-        access_token = os.getenv('PASSWORD')
+        cliente = cliente_padrao()
+        if not cliente:
+            return None
+        
+        journal = Journal(caminho_journal)
+        if recomecar:
+            journal.limpar()
+        
+        # Já excluídos numa execução anterior não geram chamada
+        pendentes = [p for p in criados if not journal.concluido(str(p['id']), lambda r: r['sucesso'])]
+        if len(pendentes) < len(criados):
+            print(f"Excluídos em execução anterior (journal): {len(criados) - len(pendentes)}")
         
-        for produto in relatorio['criados']:
-            try:
-                produto_id = produto['id']
-                sku_base = produto['sku_base']
-                
-                # Verificação adicional de segurança
-                if not sku_base in skus_para_excluir:
-                    print(f"⚠️ SKU {sku_base} não está na lista para exclusão. Pulando...")
-                    continue
-                
-                resultado = deletar_produto_graphql(shop_url, produto_id, access_token)
-                
-                if 'data' in resultado and resultado['data']['productDelete']['deletedProductId']:
-                    produtos_excluidos.append({
-                        'id': produto_id,
-                        'title': produto['title'],
-                        'sku_base': sku_base
-                    })
-                    print(f"✅ Produto excluído com sucesso: {sku_base} - {produto['title']} (ID: {produto_id})")
-                else:
-                    erros_graphql = resultado.get('data', {}).get('productDelete', {}).get('userErrors', [])
-                    mensagem_erro = '; '.join([e['message'] for e in erros_graphql]) if erros_graphql else 'Erro desconhecido'
-                    raise Exception(mensagem_erro)
-                
-                time.sleep(0.5)  # Delay para evitar limitação da API
-                    
-            except Exception as e:
-                erro = {
-                    'id': produto_id,
-                    'title': produto['title'],
-                    'erro': str(e)
-                }
-                erros.append(erro)
-                print(f"❌ Erro ao excluir produto {produto['title']}: {str(e)}")
+        lote = tamanho_lote(cliente, workers)
+        lotes = [pendentes[i:i + lote] for i in range(0, len(pendentes), lote)]
+        print(f"{len(pendentes)} produtos em {len(lotes)} lotes de até {lote}, {workers} em paralelo")
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futuros = {executor.submit(excluir_lote, cliente, produtos, journal): produtos for produtos in lotes}
+            for i, futuro in enumerate(as_completed(futuros), 1):
+                produtos = futuros[futuro]
+                for produto, resultado in zip(produtos, futuro.result()):
+                    if resultado['sucesso']:
+                        print(f"✅ Produto excluído com sucesso: {produto['sku_base']} - {produto['title']} (ID: {produto['id']})")
+                    else:
+                        print(f"❌ Erro ao excluir produto {produto['title']}: {resultado['erro']}")
+                if i % EXCLUSAO_RELATORIO_LOTES == 0:
+                    _salvar_relatorio(criados, journal)
+                print(f"Lote {i}/{len(lotes)} concluído")
         
         # Salvar relatório de exclusão
-        relatorio_exclusao = {
-            'produtos_excluidos': produtos_excluidos,
-            'erros': erros,
-            'total_processado': len(relatorio['criados']),
-            'total_excluido': len(produtos_excluidos),
-            'total_erros': len(erros)
-        }
+        relatorio_exclusao = _salvar_relatorio(criados, journal)
+        if relatorio_exclusao['total_erros']:
+            journal.compactar()
+        else:
+            journal.limpar()
         
-        with open('relatorio_exclusao.json', 'w', encoding='utf-8') as f:
-            json.dump(relatorio_exclusao, f, ensure_ascii=False, indent=2)
-            
         print(f"\n=== RELATÓRIO FINAL ===")
-        print(f"Total processado: {len(relatorio['criados'])}")
-        print(f"Produtos excluídos com sucesso: {len(produtos_excluidos)}")
-        print(f"Erros: {len(erros)}")
+        print(f"Tempo total: {time.time() - inicio:.2f} segundos")
+        print(f"Total processado: {len(criados)}")
+        print(f"Produtos excluídos com sucesso: {relatorio_exclusao['total_excluido']}")
+        print(f"Erros: {relatorio_exclusao['total_erros']}")
         print("Relatório detalhado salvo em 'relatorio_exclusao.json'")
-            
+        return relatorio_exclusao
+    
     except Exception as e:
         print(f"Erro ao processar exclusão: {str(e)}")
         print("Stack trace:")
         print(traceback.format_exc())
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exclui da Shopify os produtos listados num relatório")
+    parser.add_argument('--relatorio', default='relatorio_criacao.json', help="Relatório com os produtos")
+    parser.add_argument('--chave', default='criados', help="Lista do relatório com os produtos a excluir")
+    parser.add_argument('--recomecar', action='store_true', help="Ignora o journal e começa do zero")
+    args = parser.parse_args()
     load_dotenv()
-    inicializar_shopify()
-    excluir_produtos() 
\ No newline at end of file
+    excluir_produtos(recomecar=args.recomecar, caminho_relatorio=args.relatorio, chave=args.chave)
@@ -1,23 +1,108 @@
 from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.pdfgen import canvas
 
-def gerar_relatorio_pdf(relatorio_atualizacoes, nome_arquivo="relatorio_atualizacoes.pdf"):
-    c = canvas.Canvas(nome_arquivo, pagesize=letter)
-    c.setFont("Helvetica", 12)
-    c.drawString(100, 750, "Relatório de Produtos que Precisam de Atualização")
-    c.drawString(100, 730, "-" * 50)
+MARGEM = 36
+ALTURA_LINHA = 14
+FONTE = "Helvetica"
+FONTE_NEGRITO = "Helvetica-Bold"
+TAMANHO_FONTE = 8
 
-    y = 710
-    for item in relatorio_atualizacoes:
-        c.drawString(100, y, f"SKU: {item['SKU']}")
-        c.drawString(100, y - 15, f"Nome: {item['Nome']}")
-        c.drawString(100, y - 30, f"Categoria: {item['Categoria']}")
-        preco_formatado = float(item['Preco']) if isinstance(item['Preco'], str) else item['Preco']
-        c.drawString(100, y - 45, f"Preço: R$ {preco_formatado:.2f}")
-        c.drawString(100, y - 60, f"Quantidade Hiper: {item['Quantidade Hiper']}")
-        c.drawString(100, y - 75, f"Quantidade Shopify: {item['Quantidade Shopify']}")
-        c.drawString(100, y - 90, f"Necessita Atualização: {item['Necessita Atualização']}")
-        c.drawString(100, y - 105, "-" * 50)
-        y -= 120  # Espaço entre os produtos
+# (título, chave do item, largura, alinhamento)
+COLUNAS = [
+    ("SKU", 'SKU', 80, 'esquerda'),
+    ("Nome", 'Nome', 180, 'esquerda'),
+    ("Categoria", 'Categoria', 80, 'esquerda'),
+    ("Preço (R$)", 'Preco', 55, 'direita'),
+    ("Qtd Hiper", 'Quantidade Hiper', 45, 'direita'),
+    ("Qtd Shopify", 'Quantidade Shopify', 50, 'direita'),
+    ("Atualizar", 'Necessita Atualização', 50, 'esquerda'),
+]
+
+def _formatar(chave, valor):
+    if valor is None:
+        return ""
+    if chave == 'Preco':
+        try:
+            return f"{float(valor):.2f}"
+        except (TypeError, ValueError):
+            return str(valor)
+    return str(valor)
+
+def _cortar(texto, largura):
+    """Corta o texto com reticências para caber na largura da coluna"""
+    # Nenhum caractere da Helvetica passa de 1.015 em: textos curtos cabem sem medir
+    if len(texto) * TAMANHO_FONTE * 1.015 <= largura or stringWidth(texto, FONTE, TAMANHO_FONTE) <= largura:
+        return texto
+    while texto and stringWidth(texto + "…", FONTE, TAMANHO_FONTE) > largura:
+        texto = texto[:-max(1, len(texto) // 8)]
+    return texto + "…"
+
+class PaginaTabela:
+    """Desenha a tabela página a página: cabeçalho repetido e quebra automática"""
+    def __init__(self, c, titulo):
+        self.c = c
+        self.titulo = titulo
+        self.largura, self.altura = letter
+        self.pagina = 0
+        self.y = None
+        self.linhas = 0
+
+    def _iniciar_pagina(self):
+        if self.pagina:
+            self.c.showPage()
+        self.pagina += 1
+        c = self.c
+        y = self.altura - MARGEM
+        c.setFont(FONTE_NEGRITO, 12)
+        c.drawString(MARGEM, y, self.titulo)
+        c.setFont(FONTE, TAMANHO_FONTE)
+        c.drawRightString(self.largura - MARGEM, y, f"Página {self.pagina}")
+
+        y -= ALTURA_LINHA * 1.5
+        self._desenhar_celulas(y, [titulo for titulo, _, _, _ in COLUNAS], FONTE_NEGRITO)
+        c.line(MARGEM, y - 4, self.largura - MARGEM, y - 4)
+        self.y = y - ALTURA_LINHA
 
+    def _desenhar_celulas(self, y, textos, fonte=FONTE):
+        # Um único objeto de texto por linha da tabela (um BT/ET em vez de um por célula)
+        texto_pdf = self.c.beginText()
+        texto_pdf.setFont(fonte, TAMANHO_FONTE)
+        x = MARGEM
+        for texto, (_, _, largura, alinhamento) in zip(textos, COLUNAS):
+            inicio = x
+            if alinhamento == 'direita':
+                inicio = x + largura - 4 - stringWidth(texto, fonte, TAMANHO_FONTE)
+            texto_pdf.setTextOrigin(inicio, y)
+            texto_pdf.textOut(texto)
+            x += largura
+        self.c.drawText(texto_pdf)
+
+    def adicionar(self, item):
+        if self.y is None or self.y < MARGEM:
+            self._iniciar_pagina()
+        textos = [_cortar(_formatar(chave, item.get(chave)), largura - 6) for _, chave, largura, _ in COLUNAS]
+        self._desenhar_celulas(self.y, textos)
+        self.y -= ALTURA_LINHA
+        self.linhas += 1
+
+def gerar_relatorio_pdf(relatorio_atualizacoes, nome_arquivo="relatorio_atualizacoes.pdf",
+                        titulo="Relatório de Produtos que Precisam de Atualização"):
+    """
+    Gera o PDF com uma linha de tabela por item
+
+    Aceita qualquer iterável (lista, gerador, leitor de CSV): cada página é
+    desenhada e fechada conforme os itens chegam, sem carregar a lista inteira.
+
+    Returns:
+        int: Quantidade de itens escritos
+    """
+    c = canvas.Canvas(nome_arquivo, pagesize=letter, pageCompression=1)
+    tabela = PaginaTabela(c, titulo)
+    for item in relatorio_atualizacoes:
+        tabela.adicionar(item)
+    if not tabela.linhas:
+        tabela._iniciar_pagina()
+        c.drawString(MARGEM, tabela.y, "Nenhum produto precisa de atualização.")
     c.save()
+    return tabela.linhas
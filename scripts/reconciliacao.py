@@ -0,0 +1,214 @@
+"""
+Reconciliação entre os catálogos do Hiper e da Shopify
+
+O Hiper vira um índice SKU -> (nome, quantidade, preço) e o catálogo da
+Shopify passa em fluxo, página a página, sem ficar inteiro na memória. Cada
+variante é casada pelo SKU exato ou, quando o Hiper guarda só o SKU base,
+pelo SKU sem o sufixo do tamanho. O que sobra do índice no fim (diferença de
+conjuntos) é o que existe só no Hiper.
+
+Com --particoes, as janelas de created_at são buscadas em paralelo e cada
+uma é reconciliada assim que chega (sync_stock.iterar_janelas_shopify), sem
+juntar o catálogo numa lista.
+
+As linhas são gravadas conforme saem, em CSV ou JSON lines (pela extensão da
+saída), e o resumo vai para <saida>.resumo.json:
+
+    python reconciliacao.py --saida reconciliacao.csv
+    python reconciliacao.py --saida reconciliacao.jsonl --apenas-divergencias
+"""
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+import shopify_api
+from config import setup_logging
+from sync_stock import buscar_produtos_hiper, iterar_janelas_shopify, SHOPIFY_PARTICOES
+
+CAMPOS = [
+    'situacao', 'divergencia', 'sku', 'sku_hiper', 'produto_id', 'variante_id',
+    'nome_hiper', 'nome_shopify', 'quantidade_hiper', 'quantidade_shopify', 'preco_hiper', 'preco_shopify'
+]
+
+class SaidaCSV:
+    """Grava as linhas da reconciliação em CSV conforme chegam"""
+    def __init__(self, caminho):
+        self.arquivo = open(caminho, 'w', newline='', encoding='utf-8')
+        self.escritor = csv.DictWriter(self.arquivo, fieldnames=CAMPOS, extrasaction='ignore')
+        self.escritor.writeheader()
+
+    def escrever(self, linha):
+        self.escritor.writerow(linha)
+
+    def fechar(self):
+        self.arquivo.close()
+
+class SaidaJSONL:
+    """Grava as linhas da reconciliação em JSON lines conforme chegam"""
+    def __init__(self, caminho):
+        self.arquivo = open(caminho, 'w', encoding='utf-8')
+
+    def escrever(self, linha):
+        self.arquivo.write(json.dumps(linha, ensure_ascii=False) + '\n')
+
+    def fechar(self):
+        self.arquivo.close()
+
+def abrir_saida(caminho):
+    """Saída CSV ou JSON lines conforme a extensão do arquivo"""
+    if caminho.endswith(('.jsonl', '.ndjson')):
+        return SaidaJSONL(caminho)
+    return SaidaCSV(caminho)
+
+def _centavos(valor):
+    try:
+        return round(float(valor) * 100)
+    except (TypeError, ValueError):
+        return None
+
+def indice_hiper(produtos_hiper, incluir_numericos=False):
+    """SKU -> (nome, quantidade, preço em centavos) dos produtos do Hiper"""
+    indice = {}
+    for produto in produtos_hiper:
+        sku = str(produto.get('codigoDeBarras') or '').strip()
+        if not sku or (sku.isdigit() and not incluir_numericos):
+            continue
+        indice[sku] = (produto.get('nome', ''), int(produto.get('quantidadeEmEstoque') or 0),
+                       _centavos(produto.get('preco')))
+    return indice
+
+def reconciliar(produtos_hiper, variantes_shopify, saida, apenas_divergencias=False, incluir_numericos=False):
+    """
+    Compara os catálogos e grava uma linha por SKU na saída
+
+    Args:
+        produtos_hiper (list): Produtos do Hiper (pontoDeSincronizacao)
+        variantes_shopify (iterable): VarianteShopify em fluxo (ex: iterar_variantes)
+        saida (SaidaCSV|SaidaJSONL): Destino das linhas
+        apenas_divergencias (bool): Não grava as linhas em ambos sem divergência
+        incluir_numericos (bool): Inclui os SKUs numéricos do Hiper
+    Returns:
+        dict: Resumo com a contagem de cada situação
+    """
+    hiper = indice_hiper(produtos_hiper, incluir_numericos)
+    casados = set()
+    resumo = {
+        'total_hiper': len(hiper),
+        'total_shopify': 0,
+        'em_ambos': 0,
+        'apenas_hiper': 0,
+        'apenas_shopify': 0,
+        'divergencia_quantidade': 0,
+        'divergencia_preco': 0
+    }
+
+    for variante in variantes_shopify:
+        resumo['total_shopify'] += 1
+        sku = (variante.sku or '').strip()
+        chave = sku if sku in hiper else shopify_api.sku_sem_tamanho(variante)
+        dados = hiper.get(chave) if chave else None
+        linha = {
+            'sku': sku,
+            'produto_id': variante.produto_id,
+            'variante_id': variante.variante_id,
+            'nome_shopify': variante.titulo_produto,
+            'quantidade_shopify': variante.quantidade,
+            'preco_shopify': variante.preco
+        }
+        if dados is None:
+            resumo['apenas_shopify'] += 1
+            linha['situacao'] = 'apenas_shopify'
+            linha['divergencia'] = ''
+            saida.escrever(linha)
+            continue
+
+        casados.add(chave)
+        resumo['em_ambos'] += 1
+        nome, quantidade, preco = dados
+        divergencias = []
+        # Casado pelo SKU base, o estoque do Hiper é do produto e não da variante
+        if chave == sku and quantidade != variante.quantidade:
+            divergencias.append('quantidade')
+            resumo['divergencia_quantidade'] += 1
+        if preco is not None and preco != _centavos(variante.preco):
+            divergencias.append('preco')
+            resumo['divergencia_preco'] += 1
+        if divergencias or not apenas_divergencias:
+            linha.update({
+                'situacao': 'em_ambos',
+                'divergencia': '+'.join(divergencias),
+                'sku_hiper': chave,
+                'nome_hiper': nome,
+                'quantidade_hiper': quantidade,
+                'preco_hiper': f"{preco / 100:.2f}" if preco is not None else None
+            })
+            saida.escrever(linha)
+
+    for sku in hiper.keys() - casados:
+        nome, quantidade, preco = hiper[sku]
+        resumo['apenas_hiper'] += 1
+        saida.escrever({
+            'situacao': 'apenas_hiper',
+            'divergencia': '',
+            'sku': sku,
+            'sku_hiper': sku,
+            'nome_hiper': nome,
+            'quantidade_hiper': quantidade,
+            'preco_hiper': f"{preco / 100:.2f}" if preco is not None else None
+        })
+
+    return resumo
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconciliação dos catálogos Hiper e Shopify")
+    parser.add_argument('--saida', default='reconciliacao.csv', help="Arquivo .csv ou .jsonl")
+    parser.add_argument('--apenas-divergencias', action='store_true',
+                        help="Grava só SKUs com divergência ou de um lado só")
+    parser.add_argument('--incluir-numericos', action='store_true', help="Inclui os SKUs numéricos do Hiper")
+    parser.add_argument('--particoes', type=int, default=SHOPIFY_PARTICOES,
+                        help="Janelas da Shopify buscadas em paralelo (1 = fluxo sequencial)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if not setup_logging():
+        print("Falha ao configurar logging")
+        return False
+    cliente = shopify_api.cliente_padrao()
+    if not cliente:
+        return False
+
+    inicio = time.perf_counter()
+    produtos_hiper = buscar_produtos_hiper(usar_cache=False)
+    if args.particoes > 1:
+        variantes = iterar_janelas_shopify(args.particoes, cliente)
+    else:
+        variantes = shopify_api.iterar_variantes(cliente)
+
+    saida = abrir_saida(args.saida)
+    try:
+        resumo = reconciliar(produtos_hiper, variantes, saida, args.apenas_divergencias, args.incluir_numericos)
+    finally:
+        saida.fechar()
+    resumo['gerado_em'] = datetime.now().isoformat(timespec='seconds')
+    resumo['duracao_s'] = round(time.perf_counter() - inicio, 2)
+    with open(f"{os.path.splitext(args.saida)[0]}.resumo.json", 'w', encoding='utf-8') as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=2)
+
+    logging.info("\n=== RESUMO DA RECONCILIAÇÃO ===")
+    logging.info(f"SKUs no Hiper: {resumo['total_hiper']}")
+    logging.info(f"Variantes na Shopify: {resumo['total_shopify']}")
+    logging.info(f"Em ambos: {resumo['em_ambos']}")
+    logging.info(f"Apenas no Hiper: {resumo['apenas_hiper']}")
+    logging.info(f"Apenas na Shopify: {resumo['apenas_shopify']}")
+    logging.info(f"Divergência de quantidade: {resumo['divergencia_quantidade']}")
+    logging.info(f"Divergência de preço: {resumo['divergencia_preco']}")
+    logging.info(f"Concluído em {resumo['duracao_s']}s, linhas em {args.saida}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,164 @@
+"""
+Retentativas e disjuntores (circuit breakers) para as chamadas externas
+
+Toda chamada ao Hiper ou à Shopify passa por executar(): falhas transitórias
+(timeout, conexão recusada, HTTP 5xx/408) são repetidas com backoff
+exponencial e jitter, mas só quando a operação é idempotente (GET, ou um POST
+que grava um valor absoluto, como inventory_levels/set). Cada serviço tem um
+disjuntor: depois de DISJUNTOR_FALHAS falhas seguidas ele abre e as chamadas
+falham na hora (DisjuntorAberto) por DISJUNTOR_TEMPO segundos, em vez de
+gastar o horário da execução esperando um serviço fora do ar. Passado esse
+tempo, uma única chamada testa o serviço (as outras continuam recusadas até
+ela terminar): sucesso fecha, falha reabre.
+
+O 429 da Shopify não é falha: continua sendo tratado pelos limitadores de
+shopify_api.
+"""
+import os
+import time
+import random
+import logging
+import threading
+import requests
+
+# Tentativas por chamada (a primeira incluída) e a espera base/máxima entre elas
+RETENTATIVAS = int(os.getenv('RETENTATIVAS', '4'))
+RETENTATIVA_BASE = float(os.getenv('RETENTATIVA_BASE', '0.5'))
+RETENTATIVA_MAX = float(os.getenv('RETENTATIVA_MAX', '30'))
+
+# Falhas seguidas que abrem o disjuntor de um serviço e por quanto tempo ele fica aberto
+DISJUNTOR_FALHAS = int(os.getenv('DISJUNTOR_FALHAS', '5'))
+DISJUNTOR_TEMPO = float(os.getenv('DISJUNTOR_TEMPO', '30'))
+
+# Respostas HTTP que indicam falha passageira do serviço
+STATUS_TRANSITORIOS = {408, 500, 502, 503, 504}
+
+# Exceções de rede que indicam falha passageira
+ERROS_TRANSITORIOS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+class DisjuntorAberto(Exception):
+    """O serviço falhou seguidamente e as chamadas estão suspensas"""
+
+class Disjuntor:
+    """Disjuntor de um serviço, compartilhado entre as threads"""
+    def __init__(self, nome, falhas=DISJUNTOR_FALHAS, tempo=DISJUNTOR_TEMPO):
+        self.nome = nome
+        self.limite = falhas
+        self.tempo = tempo
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        # Há uma chamada de teste em andamento (disjuntor meio aberto)
+        self.testando = False
+        self.lock = threading.Lock()
+
+    def verificar(self):
+        """
+        Levanta DisjuntorAberto enquanto o disjuntor estiver aberto
+
+        Passado o tempo de abertura, só a primeira chamada segue, como teste;
+        as demais são recusadas até sucesso(), falha() ou liberar().
+        """
+        with self.lock:
+            restante = self.aberto_ate - time.monotonic()
+            if restante <= 0 and self.falhas >= self.limite:
+                if not self.testando:
+                    self.testando = True
+                    return
+                raise DisjuntorAberto(f"{self.nome} indisponível ({self.falhas} falhas seguidas), "
+                                      f"aguardando a chamada de teste")
+        if restante > 0:
+            raise DisjuntorAberto(f"{self.nome} indisponível ({self.falhas} falhas seguidas), "
+                                  f"nova tentativa em {restante:.0f}s")
+
+    def sucesso(self):
+        with self.lock:
+            if self.falhas >= self.limite:
+                logging.info(f"Disjuntor de {self.nome} fechado: serviço respondendo de novo")
+            self.falhas = 0
+            self.aberto_ate = 0.0
+            self.testando = False
+
+    def liberar(self):
+        """Encerra a chamada sem resultado sobre a saúde do serviço (ex: erro não transitório)"""
+        with self.lock:
+            self.testando = False
+
+    def falha(self):
+        with self.lock:
+            self.testando = False
+            self.falhas += 1
+            if self.falhas >= self.limite:
+                self.aberto_ate = time.monotonic() + self.tempo
+                logging.error(f"Disjuntor de {self.nome} aberto após {self.falhas} falhas seguidas "
+                              f"(chamadas suspensas por {self.tempo:g}s)")
+
+_disjuntores = {}
+_disjuntores_lock = threading.Lock()
+
+def disjuntor(servico):
+    """Disjuntor do serviço (ex: 'hiper', 'shopify:minha-loja'), criado no primeiro uso"""
+    with _disjuntores_lock:
+        if servico not in _disjuntores:
+            _disjuntores[servico] = Disjuntor(servico)
+        return _disjuntores[servico]
+
+# Observadores chamados a cada retentativa: funcao(servico, tentativa, erro)
+_observadores = []
+
+def registrar_observador(funcao):
+    """Registra uma função chamada a cada retentativa (ex: métricas)"""
+    _observadores.append(funcao)
+
+def espera(tentativa, base=RETENTATIVA_BASE, maximo=RETENTATIVA_MAX):
+    """Backoff exponencial com jitter: metade fixa e metade sorteada do teto da tentativa"""
+    teto = min(maximo, base * 2 ** tentativa)
+    return teto / 2 + random.uniform(0, teto / 2)
+
+def _transitorio(erro):
+    return isinstance(erro, ERROS_TRANSITORIOS)
+
+def executar(operacao, servico, idempotente=True, tentativas=None, transitorio=None):
+    """
+    Executa a operação com retentativas e o disjuntor do serviço
+
+    Args:
+        operacao (callable): Função sem argumentos (ex: a chamada HTTP)
+        servico (str): Nome do disjuntor (ex: 'hiper')
+        idempotente (bool): Pode ser repetida sem efeito duplicado
+        tentativas (int): Tentativas ao todo (padrão: RETENTATIVAS)
+        transitorio (callable): Diz se uma exceção é passageira (padrão: erros de rede)
+    Returns:
+        O retorno da operação. Uma resposta HTTP com status transitório é
+        repetida se idempotente e, esgotadas as tentativas, devolvida ao chamador.
+    """
+    tentativas = tentativas or RETENTATIVAS
+    transitorio = transitorio or _transitorio
+    circuito = disjuntor(servico)
+    for tentativa in range(tentativas):
+        circuito.verificar()
+        try:
+            resultado = operacao()
+        except Exception as e:
+            if not transitorio(e):
+                circuito.liberar()
+                raise
+            circuito.falha()
+            if not idempotente or tentativa == tentativas - 1:
+                raise
+            motivo = e
+        else:
+            status = getattr(resultado, 'status_code', None)
+            if status not in STATUS_TRANSITORIOS:
+                circuito.sucesso()
+                return resultado
+            circuito.falha()
+            if not idempotente or tentativa == tentativas - 1:
+                return resultado
+            motivo = f"HTTP {status}"
+
+        segundos = espera(tentativa)
+        logging.warning(f"Falha passageira em {servico} ({motivo}), nova tentativa em {segundos:.1f}s "
+                        f"({tentativa + 2}/{tentativas})")
+        for observador in _observadores:
+            observador(servico, tentativa + 1, motivo)
+        time.sleep(segundos)
@@ -0,0 +1,751 @@
+"""
+Cliente da API Admin da Shopify (REST e GraphQL) seguro para threads
+
+A sessão do ActiveResource (site e token) é local à thread em que foi ativada,
+então threads de trabalho não conseguem usá-la. Este cliente fala direto com a
+API Admin usando a sessão HTTP compartilhada do config e um único leaky bucket
+por loja, dividido entre todas as threads, para que buscas concorrentes
+respeitem o limite de chamadas da Shopify. As chamadas GraphQL usam um balde
+de custo próprio, ajustado pelo throttleStatus devolvido em cada resposta.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import tracing
+import resiliencia
+from config import sessao_http, site_shopify_local, SHOPIFY_API_VERSION
+
+# Limite REST da loja: balde de 40 chamadas esvaziando 2/s (Plus: 400 e 20/s)
+REST_BALDE = int(os.getenv('SHOPIFY_REST_BALDE', '40'))
+REST_TAXA = float(os.getenv('SHOPIFY_REST_TAXA', '2'))
+
+# Balde de custo do GraphQL: 1000 pontos repondo 50/s (Plus: 2000 e 100/s)
+GRAPHQL_BALDE = float(os.getenv('SHOPIFY_GRAPHQL_BALDE', '1000'))
+GRAPHQL_TAXA = float(os.getenv('SHOPIFY_GRAPHQL_TAXA', '50'))
+
+# Registro compacto de uma variante, montado direto do JSON da API (sem os
+# objetos do ActiveResource, que carregam dicionários e referências de conexão)
+VarianteShopify = namedtuple('VarianteShopify', [
+    'produto_id', 'titulo_produto', 'variante_id', 'titulo_variante',
+    'sku', 'inventory_item_id', 'quantidade', 'preco'
+])
+
+# Campos pedidos em products.json quando só as variantes interessam
+CAMPOS_PRODUTO = 'id,title,variants'
+
+def variantes_do_produto(produto):
+    """Converte um produto do JSON REST em registros VarianteShopify"""
+    titulo = produto.get('title') or ''
+    return [
+        VarianteShopify(
+            produto['id'], titulo, variante['id'], variante.get('title'), variante.get('sku'),
+            variante.get('inventory_item_id'), int(variante.get('inventory_quantity') or 0),
+            variante.get('price')
+        )
+        for variante in produto.get('variants') or []
+    ]
+
+def sku_sem_tamanho(variante):
+    """SKU da variante sem o sufixo do tamanho (título da variante), ex: C0010021P36 -> C0010021P"""
+    sku = (variante.sku or '').strip()
+    tamanho = (variante.titulo_variante or '').strip()
+    if tamanho and len(sku) > len(tamanho) and sku.upper().endswith(tamanho.upper()):
+        return sku[:-len(tamanho)]
+    return sku
+
+# Observadores chamados a cada requisição: funcao(rota, duracao, erro)
+_observadores = []
+
+def registrar_observador(funcao):
+    """Registra uma função chamada após cada requisição (ex: métricas do job)"""
+    if funcao not in _observadores:
+        _observadores.append(funcao)
+
+class LimitadorTaxa:
+    """
+    Leaky bucket local compartilhado entre threads
+
+    Mantém uma folga abaixo da capacidade e se ajusta ao nível informado pela
+    Shopify no cabeçalho X-Shopify-Shop-Api-Call-Limit. Com fracao < 1 o
+    limitador usa só essa parte do balde da loja (ex: um de vários processos
+    dividindo a mesma loja) e lê o cabeçalho na mesma proporção.
+    """
+    def __init__(self, capacidade=REST_BALDE, taxa=REST_TAXA, folga=2, fracao=1.0):
+        self.fracao = fracao
+        self.capacidade = capacidade * fracao
+        self.taxa = taxa * fracao
+        self.limite = max(1, self.capacidade - folga * fracao)
+        self.nivel = 0.0
+        self.ultimo = time.monotonic()
+        self.bloqueado_ate = 0.0
+        self.lock = threading.Lock()
+
+    def _vazar(self, agora):
+        self.nivel = max(0.0, self.nivel - (agora - self.ultimo) * self.taxa)
+        self.ultimo = agora
+
+    def aguardar(self):
+        """Bloqueia até haver espaço no balde e reserva uma chamada"""
+        while True:
+            with self.lock:
+                agora = time.monotonic()
+                self._vazar(agora)
+                if agora >= self.bloqueado_ate and self.nivel + 1 <= self.limite:
+                    self.nivel += 1
+                    return
+                espera = max(self.bloqueado_ate - agora, (self.nivel + 1 - self.limite) / self.taxa)
+            time.sleep(espera)
+
+    def atualizar(self, cabecalho):
+        """Sincroniza o nível local com o cabeçalho 'usadas/capacidade' da resposta"""
+        if not cabecalho:
+            return
+        try:
+            usadas, capacidade = (int(v) for v in cabecalho.split('/'))
+        except ValueError:
+            return
+        with self.lock:
+            self._vazar(time.monotonic())
+            self.capacidade = capacidade * self.fracao
+            self.nivel = max(self.nivel, usadas * self.fracao)
+
+    def penalizar(self, segundos):
+        """Suspende todas as threads após um 429"""
+        with self.lock:
+            agora = time.monotonic()
+            self.bloqueado_ate = max(self.bloqueado_ate, agora + segundos)
+            self.nivel = float(self.limite)
+
+class LimitadorCusto:
+    """
+    Balde de custo do GraphQL Admin compartilhado entre threads
+
+    Reserva o custo estimado antes de cada chamada e, a cada resposta, adota
+    os pontos disponíveis e a taxa de reposição informados pela Shopify.
+    """
+    def __init__(self, capacidade=GRAPHQL_BALDE, taxa=GRAPHQL_TAXA):
+        self.capacidade = capacidade
+        self.taxa = taxa
+        self.disponivel = capacidade
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _repor(self, agora):
+        self.disponivel = min(self.capacidade, self.disponivel + (agora - self.ultimo) * self.taxa)
+        self.ultimo = agora
+
+    def aguardar(self, custo):
+        """Bloqueia até haver pontos para o custo e os reserva"""
+        custo = min(custo, self.capacidade)
+        while True:
+            with self.lock:
+                self._repor(time.monotonic())
+                if self.disponivel >= custo:
+                    self.disponivel -= custo
+                    return
+                espera = (custo - self.disponivel) / self.taxa
+            time.sleep(espera)
+
+    def atualizar(self, custo):
+        """Sincroniza com extensions.cost.throttleStatus da resposta"""
+        situacao = (custo or {}).get('throttleStatus')
+        if not situacao:
+            return
+        with self.lock:
+            self.capacidade = float(situacao.get('maximumAvailable', self.capacidade))
+            self.taxa = float(situacao.get('restoreRate', self.taxa)) or self.taxa
+            self.disponivel = float(situacao.get('currentlyAvailable', self.disponivel))
+            self.ultimo = time.monotonic()
+
+def _limitado(dados):
+    """True quando a resposta GraphQL foi recusada por falta de pontos"""
+    return any((erro.get('extensions') or {}).get('code') == 'THROTTLED' for erro in dados.get('errors') or [])
+
+class ClienteShopify:
+    """Cliente da API Admin (REST e GraphQL) de uma loja"""
+    def __init__(self, loja, token, versao=SHOPIFY_API_VERSION, site=None, limitador=None):
+        dominio = loja if '.' in loja else f"{loja}.myshopify.com"
+        self.loja = loja
+        self.base = site or f"https://{dominio}/admin/api/{versao}"
+        self.headers = {
+            'X-Shopify-Access-Token': token,
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+        self.limitador = limitador or LimitadorTaxa()
+        self.limitador_graphql = LimitadorCusto()
+        # Disjuntor da loja na camada de resiliência
+        self.servico = f"shopify:{loja}"
+
+    def requisitar(self, metodo, caminho, params=None, json=None, tentativas=5, limitar=True, idempotente=None):
+        """
+        Faz uma requisição respeitando o limite de chamadas
+
+        Falhas passageiras (rede, 5xx) passam pela camada de resiliência com o
+        disjuntor da loja; só são repetidas se a chamada for idempotente.
+
+        Args:
+            metodo (str): GET, POST, PUT ou DELETE
+            caminho (str): Rota relativa à versão da API (ex: 'products.json') ou URL completa
+            params (dict): Query string
+            json (dict): Corpo da requisição
+            tentativas (int): Tentativas em caso de 429
+            limitar (bool): Passa pelo balde REST (o GraphQL tem o próprio)
+            idempotente (bool): Pode ser repetida após falha (padrão: só GET, PUT e DELETE)
+        Returns:
+            requests.Response: Resposta final (429 só se esgotar as tentativas)
+        """
+        url = caminho if caminho.startswith('http') else f"{self.base}/{caminho}"
+        rota = url[len(self.base) + 1:].split('?')[0] if url.startswith(self.base) else caminho
+        if idempotente is None:
+            idempotente = metodo in ('GET', 'PUT', 'DELETE')
+
+        def enviar():
+            if limitar:
+                self.limitador.aguardar()
+            inicio = time.perf_counter()
+            erro = None
+            try:
+                with tracing.span(f"shopify.{metodo} {rota}", categoria='shopify_calls'):
+                    return sessao_http().request(metodo, url, params=params, json=json,
+                                                 headers=self.headers, timeout=60)
+            except Exception as e:
+                erro = e
+                raise
+            finally:
+                for observador in _observadores:
+                    observador(rota, time.perf_counter() - inicio, erro)
+
+        for tentativa in range(tentativas):
+            resposta = resiliencia.executar(enviar, self.servico, idempotente)
+            self.limitador.atualizar(resposta.headers.get('X-Shopify-Shop-Api-Call-Limit'))
+            if resposta.status_code != 429:
+                return resposta
+            espera = float(resposta.headers.get('Retry-After', '2'))
+            logging.warning(f"Limite de chamadas da Shopify atingido em {rota}, aguardando {espera:g}s "
+                            f"(tentativa {tentativa + 1}/{tentativas})")
+            self.limitador.penalizar(espera)
+        return resposta
+
+    def get(self, caminho, params=None):
+        """GET que levanta exceção em erro HTTP e devolve o JSON"""
+        resposta = self.requisitar('GET', caminho, params=params)
+        resposta.raise_for_status()
+        return resposta.json()
+
+    def paginar(self, caminho, chave, params=None):
+        """
+        Percorre uma listagem paginada por cursor (cabeçalho Link rel="next")
+
+        Yields:
+            list: Itens de cada página
+        """
+        url, parametros = caminho, dict(params or {})
+        while url:
+            resposta = self.requisitar('GET', url, params=parametros)
+            resposta.raise_for_status()
+            yield resposta.json().get(chave, [])
+            # O link seguinte já carrega os filtros no page_info
+            url = resposta.links.get('next', {}).get('url')
+            parametros = None
+
+    def graphql(self, query, variaveis=None, custo=10, tentativas=5, idempotente=None):
+        """
+        Executa uma query ou mutation GraphQL respeitando o balde de custo
+
+        Args:
+            query (str): Documento GraphQL
+            variaveis (dict): Variáveis da operação
+            custo (int): Custo estimado, reservado antes da chamada
+            tentativas (int): Tentativas quando a Shopify responde THROTTLED
+            idempotente (bool): Pode ser repetida após falha (padrão: queries sim, mutations não)
+        Returns:
+            dict: JSON da resposta ('data', 'errors', 'extensions')
+        """
+        if idempotente is None:
+            idempotente = not query.lstrip().startswith('mutation')
+        corpo = {'query': query}
+        if variaveis:
+            corpo['variables'] = variaveis
+        for tentativa in range(tentativas):
+            self.limitador_graphql.aguardar(custo)
+            resposta = self.requisitar('POST', 'graphql.json', json=corpo, limitar=False, idempotente=idempotente)
+            resposta.raise_for_status()
+            dados = resposta.json()
+            informacoes = (dados.get('extensions') or {}).get('cost') or {}
+            self.limitador_graphql.atualizar(informacoes)
+            if not _limitado(dados):
+                return dados
+            # Espera o balde repor o custo que a Shopify de fato pediu
+            custo = max(custo, informacoes.get('requestedQueryCost') or custo)
+            logging.warning(f"GraphQL da Shopify sem pontos disponíveis (custo {custo}), "
+                            f"aguardando reposição (tentativa {tentativa + 1}/{tentativas})")
+        return dados
+
+    def contar(self, caminho, params=None):
+        """Retorna o 'count' de uma rota de contagem (ex: products/count.json)"""
+        return int(self.get(caminho, params).get('count', 0))
+
+def mutacao_em_lote(nome, campo, parametros, selecao, quantidade):
+    """
+    Mutation com `quantidade` cópias apelidadas (m0, m1, ...) do mesmo campo
+
+    Cada cópia recebe variáveis próprias com o índice no nome ($productId0,
+    $variants0, ...), então os valores nunca entram no texto da query.
+
+    Args:
+        nome (str): Nome da operação
+        campo (str): Campo da mutation (ex: productVariantsBulkUpdate)
+        parametros (dict): Argumento -> tipo GraphQL (ex: {'productId': 'ID!'})
+        selecao (str): Seleção de retorno de cada cópia, com chaves
+        quantidade (int): Quantidade de cópias
+    """
+    declaracoes = ', '.join(f"${argumento}{i}: {tipo}"
+                            for i in range(quantidade) for argumento, tipo in parametros.items())
+    campos = '\n'.join(
+        f"  m{i}: {campo}({', '.join(f'{argumento}: ${argumento}{i}' for argumento in parametros)}) {selecao}"
+        for i in range(quantidade)
+    )
+    return f"mutation {nome}({declaracoes}) {{\n{campos}\n}}"
+
+def iterar_variantes(cliente, params=None):
+    """
+    Percorre o catálogo inteiro convertendo cada página em registros VarianteShopify
+
+    Args:
+        cliente (ClienteShopify): Cliente REST
+        params (dict): Filtros extras de products.json (ex: vendor, created_at_min)
+    Yields:
+        VarianteShopify: Uma variante por vez, agrupadas por produto
+    """
+    parametros = {'limit': 250, 'fields': CAMPOS_PRODUTO, **(params or {})}
+    for pagina in cliente.paginar('products.json', 'products', parametros):
+        for produto in pagina:
+            yield from variantes_do_produto(produto)
+
+STAGED_UPLOAD = """
+mutation enviar($input: [StagedUploadInput!]!) {
+  stagedUploadsCreate(input: $input) {
+    stagedTargets { url resourceUrl parameters { name value } }
+    userErrors { field message }
+  }
+}
+"""
+
+EXECUTAR_MUTACAO_EM_MASSA = """
+mutation executar($mutation: String!, $stagedUploadPath: String!) {
+  bulkOperationRunMutation(mutation: $mutation, stagedUploadPath: $stagedUploadPath) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+SITUACAO_OPERACAO_EM_MASSA = """
+query situacao($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation { id status errorCode objectCount url partialDataUrl }
+  }
+}
+"""
+
+EXECUTAR_CONSULTA_EM_MASSA = """
+mutation consultar($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+SITUACOES_FINAIS = ('COMPLETED', 'FAILED', 'CANCELED', 'EXPIRED')
+
+# Estoque disponível por item numa location, página a página. O item sai do
+# próprio id do nível (gid://shopify/InventoryLevel/<n>?inventory_item_id=<item>):
+# pedir item { legacyResourceId } custaria mais um ponto por nível
+CONSULTA_NIVEIS = """
+query niveis($location: ID!, $first: Int!, $after: String) {
+  location(id: $location) {
+    inventoryLevels(first: $first, after: $after) {
+      edges { node { id quantities(names: ["available"]) { quantity } } }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+"""
+
+# Estoque disponível de todas as locations numa operação em massa (os níveis
+# chegam como linhas próprias, com __parentId apontando para a location)
+CONSULTA_NIVEIS_EM_MASSA = """
+{
+  locations {
+    edges {
+      node {
+        id
+        inventoryLevels {
+          edges { node { item { legacyResourceId } quantities(names: ["available"]) { quantity } } }
+        }
+      }
+    }
+  }
+}
+"""
+
+# Produto mais antigo e mais novo pela data de criação (limites das janelas
+# de created_at; a listagem REST só ordena por id)
+CONSULTA_EXTREMOS_CRIACAO = """
+{
+  antigo: products(first: 1, sortKey: CREATED_AT) { edges { node { createdAt } } }
+  novo: products(first: 1, sortKey: CREATED_AT, reverse: true) { edges { node { createdAt } } }
+}
+"""
+
+# Variantes de uma lista de SKUs com o estoque de cada location (busca
+# direcionada, sem percorrer o catálogo). A busca é por termo: a página pode
+# trazer outros SKUs parecidos, então é paginada até o fim
+CONSULTA_VARIANTES_SKU = """
+query variantesPorSku($query: String!, $first: Int!, $after: String) {
+  productVariants(first: $first, after: $after, query: $query) {
+    edges {
+      node {
+        legacyResourceId title sku price inventoryQuantity
+        product { legacyResourceId title }
+        inventoryItem {
+          legacyResourceId
+          inventoryLevels(first: 10) {
+            edges { node { location { legacyResourceId } quantities(names: ["available"]) { quantity } } }
+            pageInfo { hasNextPage }
+          }
+        }
+      }
+    }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+# SKUs por consulta direcionada e o custo estimado de cada uma (até duas
+# variantes por SKU, cada uma com produto, item e até 10 níveis)
+SKUS_POR_CONSULTA = 10
+CUSTO_CONSULTA_SKUS = 2 + 2 * SKUS_POR_CONSULTA * (3 + 2 + 3 * 10)
+
+# inventory_item_ids por chamada de inventory_levels.json (limite da Shopify)
+ITENS_POR_CHAMADA_NIVEIS = 50
+# Níveis devolvidos por chamada de inventory_levels.json (um por item e location)
+NIVEIS_POR_CHAMADA = 250
+
+# Níveis por página de CONSULTA_NIVEIS e o custo pedido da página
+# (conexão: 2 + first x (nível + quantities))
+NIVEIS_POR_PAGINA = int(os.getenv('SHOPIFY_NIVEIS_POR_PAGINA', '250'))
+CUSTO_PAGINA_NIVEIS = 2 + 2 * NIVEIS_POR_PAGINA
+
+def _erros_usuario(resultado, operacao):
+    if resultado.get('errors'):
+        raise RuntimeError(f"{operacao}: {resultado['errors']}")
+    return resultado
+
+def extremos_criacao(cliente):
+    """
+    created_at do produto mais antigo e do mais novo da loja
+
+    Returns:
+        tuple: (mais antigo, mais novo) em ISO 8601, ou None com o catálogo vazio
+    """
+    dados = _erros_usuario(cliente.graphql(CONSULTA_EXTREMOS_CRIACAO, custo=6), 'products')['data']
+    extremos = [(dados.get(apelido) or {}).get('edges') for apelido in ('antigo', 'novo')]
+    if not all(extremos):
+        return None
+    return tuple(arestas[0]['node']['createdAt'] for arestas in extremos)
+
+def enviar_jsonl(cliente, caminho):
+    """
+    Sobe um arquivo JSONL de variáveis por stagedUploadsCreate
+
+    Returns:
+        str: stagedUploadPath para o bulkOperationRunMutation
+    """
+    nome = os.path.basename(caminho)
+    dados = _erros_usuario(cliente.graphql(STAGED_UPLOAD, {'input': [{
+        'resource': 'BULK_MUTATION_VARIABLES',
+        'filename': nome,
+        'mimeType': 'text/jsonl',
+        'httpMethod': 'POST'
+    }]}), 'stagedUploadsCreate')
+    resultado = dados['data']['stagedUploadsCreate']
+    if resultado['userErrors']:
+        raise RuntimeError(f"stagedUploadsCreate: {resultado['userErrors']}")
+    alvo = resultado['stagedTargets'][0]
+    parametros = {parametro['name']: parametro['value'] for parametro in alvo['parameters']}
+
+    # O destino é o storage da Shopify, sem o token da loja
+    with open(caminho, 'rb') as arquivo:
+        resposta = sessao_http().post(alvo['url'], data=parametros,
+                                      files={'file': (nome, arquivo, 'text/jsonl')}, timeout=300)
+    resposta.raise_for_status()
+    return parametros['key']
+
+def executar_mutacao_em_massa(cliente, mutacao, caminho_jsonl):
+    """
+    Roda uma mutation para cada linha de um JSONL de variáveis (bulk operation)
+
+    Args:
+        cliente (ClienteShopify): Cliente da loja
+        mutacao (str): Mutation com as variáveis de cada linha
+        caminho_jsonl (str): Arquivo com um objeto de variáveis por linha
+    Returns:
+        str: Id (GID) da operação em massa
+    """
+    caminho_staged = enviar_jsonl(cliente, caminho_jsonl)
+    dados = _erros_usuario(cliente.graphql(EXECUTAR_MUTACAO_EM_MASSA, {
+        'mutation': mutacao,
+        'stagedUploadPath': caminho_staged
+    }), 'bulkOperationRunMutation')
+    resultado = dados['data']['bulkOperationRunMutation']
+    if resultado['userErrors']:
+        raise RuntimeError(f"bulkOperationRunMutation: {resultado['userErrors']}")
+    operacao = resultado['bulkOperation']
+    logging.info(f"Operação em massa {operacao['id']} iniciada ({operacao['status']})")
+    return operacao['id']
+
+def executar_consulta_em_massa(cliente, consulta):
+    """
+    Inicia uma query em massa (bulk operation) cujo resultado sai em JSONL
+
+    Returns:
+        str: Id (GID) da operação em massa
+    """
+    dados = _erros_usuario(cliente.graphql(EXECUTAR_CONSULTA_EM_MASSA, {'query': consulta}),
+                           'bulkOperationRunQuery')
+    resultado = dados['data']['bulkOperationRunQuery']
+    if resultado['userErrors']:
+        raise RuntimeError(f"bulkOperationRunQuery: {resultado['userErrors']}")
+    operacao = resultado['bulkOperation']
+    logging.info(f"Consulta em massa {operacao['id']} iniciada ({operacao['status']})")
+    return operacao['id']
+
+def aguardar_operacao_em_massa(cliente, operacao_id, intervalo=1.0, intervalo_max=15.0):
+    """
+    Consulta a operação em massa até ela terminar, espaçando as consultas
+
+    Returns:
+        dict: Situação final (status, errorCode, objectCount, url, partialDataUrl)
+    """
+    while True:
+        dados = _erros_usuario(cliente.graphql(SITUACAO_OPERACAO_EM_MASSA, {'id': operacao_id}, custo=1),
+                               'BulkOperation')
+        operacao = dados['data']['node']
+        if operacao['status'] in SITUACOES_FINAIS:
+            logging.info(f"Operação em massa {operacao_id} finalizada: {operacao['status']} "
+                         f"({operacao.get('objectCount')} objetos)")
+            return operacao
+        logging.info(f"Operação em massa {operacao_id}: {operacao['status']} ({operacao.get('objectCount')} objetos)")
+        time.sleep(intervalo)
+        intervalo = min(intervalo * 1.5, intervalo_max)
+
+def ler_resultado_em_massa(url):
+    """
+    Lê o JSONL de resultado de uma operação em massa sem carregá-lo inteiro
+
+    Yields:
+        dict: Uma linha de resultado por vez
+    """
+    with sessao_http().get(url, stream=True, timeout=300) as resposta:
+        resposta.raise_for_status()
+        for linha in resposta.iter_lines():
+            if linha:
+                yield json.loads(linha)
+
+def _numero_gid(gid):
+    return int(str(gid).rsplit('/', 1)[-1])
+
+def _disponivel(nivel):
+    quantidades = nivel.get('quantities') or []
+    return int(quantidades[0]['quantity']) if quantidades else None
+
+def _item_do_nivel(nivel):
+    """inventory_item_id do nível, pelo parâmetro do id ou por item.legacyResourceId"""
+    if nivel.get('item'):
+        return int(nivel['item']['legacyResourceId'])
+    return int(nivel['id'].rsplit('inventory_item_id=', 1)[1].split('&')[0])
+
+def ler_niveis_paginados(cliente, location_id):
+    """
+    Estoque disponível de cada item de uma location, em páginas do GraphQL
+
+    A primeira página reserva o custo pedido; as seguintes reservam o
+    actualQueryCost da anterior, que é o que a Shopify de fato desconta (o
+    resto do custo pedido volta ao balde). Se a loja recusar por falta de
+    pontos, cliente.graphql espera o custo pedido e tenta de novo.
+
+    Returns:
+        dict: {inventory_item_id: available}
+    """
+    niveis = {}
+    variaveis = {'location': f"gid://shopify/Location/{location_id}", 'first': NIVEIS_POR_PAGINA}
+    custo = CUSTO_PAGINA_NIVEIS
+    while True:
+        dados = _erros_usuario(cliente.graphql(CONSULTA_NIVEIS, variaveis, custo=custo), 'inventoryLevels')
+        custo = ((dados.get('extensions') or {}).get('cost') or {}).get('actualQueryCost') or custo
+        location = (dados.get('data') or {}).get('location')
+        if location is None:
+            raise RuntimeError(f"Location {location_id} não encontrada")
+        conexao = location['inventoryLevels']
+        for aresta in conexao['edges']:
+            disponivel = _disponivel(aresta['node'])
+            if disponivel is not None:
+                niveis[_item_do_nivel(aresta['node'])] = disponivel
+        if not conexao['pageInfo']['hasNextPage']:
+            return niveis
+        variaveis['after'] = conexao['pageInfo']['endCursor']
+
+def ler_niveis_em_massa(cliente, location_ids):
+    """
+    Estoque disponível das locations pedidas numa única operação em massa
+
+    Returns:
+        dict: {location_id: {inventory_item_id: available}}
+    """
+    niveis = {location_id: {} for location_id in location_ids}
+    operacao = aguardar_operacao_em_massa(cliente, executar_consulta_em_massa(cliente, CONSULTA_NIVEIS_EM_MASSA))
+    if operacao['status'] != 'COMPLETED':
+        raise RuntimeError(f"Consulta em massa {operacao['id']} terminou em {operacao['status']} "
+                           f"({operacao.get('errorCode')})")
+    if not operacao.get('url'):
+        return niveis
+    for linha in ler_resultado_em_massa(operacao['url']):
+        destino = niveis.get(_numero_gid(linha['__parentId'])) if '__parentId' in linha else None
+        if destino is not None:
+            disponivel = _disponivel(linha)
+            if disponivel is not None:
+                destino[int(linha['item']['legacyResourceId'])] = disponivel
+    return niveis
+
+def ler_niveis_itens(cliente, itens, location_ids, workers=4):
+    """
+    Estoque disponível de itens conhecidos (inventory_levels.json, lotes em
+    paralelo no limitador do cliente)
+
+    Cada chamada traz até 250 níveis, um por item e location: o lote tem no
+    máximo 250 // locations itens (e até ITENS_POR_CHAMADA_NIVEIS), para a
+    resposta nunca vir cortada.
+
+    Returns:
+        dict: {location_id: {inventory_item_id: available}}
+    """
+    niveis = {location_id: {} for location_id in location_ids}
+    itens = sorted(set(itens))
+    por_lote = max(1, min(ITENS_POR_CHAMADA_NIVEIS, NIVEIS_POR_CHAMADA // max(1, len(location_ids))))
+    lotes = [itens[i:i + por_lote] for i in range(0, len(itens), por_lote)]
+    locations = ','.join(str(location_id) for location_id in location_ids)
+
+    def ler(lote):
+        return cliente.get('inventory_levels.json', {
+            'inventory_item_ids': ','.join(str(item) for item in lote),
+            'location_ids': locations,
+            'limit': NIVEIS_POR_CHAMADA
+        }).get('inventory_levels', [])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(lotes))), thread_name_prefix='niveis') as executor:
+        for lidos in executor.map(ler, lotes):
+            for nivel in lidos:
+                if nivel.get('available') is not None and nivel['location_id'] in niveis:
+                    niveis[nivel['location_id']][nivel['inventory_item_id']] = int(nivel['available'])
+    return niveis
+
+def ler_niveis_estoque(cliente, location_ids, em_massa=True):
+    """
+    Retrato do estoque disponível (inventoryLevels) das locations, sem o catálogo
+
+    Em massa, uma única bulk operation traz todas as locations sem gastar o
+    balde de custo; se ela falhar (ex: outra consulta em massa já rodando na
+    loja), cai para a leitura em páginas, uma location por thread.
+
+    Returns:
+        dict: {location_id: {inventory_item_id: available}}
+    """
+    if em_massa:
+        try:
+            return ler_niveis_em_massa(cliente, location_ids)
+        except Exception as e:
+            logging.warning(f"Consulta em massa de estoque falhou, lendo em páginas: {e}")
+    with ThreadPoolExecutor(max_workers=max(1, len(location_ids)), thread_name_prefix='niveis') as executor:
+        return dict(zip(location_ids, executor.map(lambda location_id: ler_niveis_paginados(cliente, location_id),
+                                                   location_ids)))
+
+def _termo_sku(sku):
+    return 'sku:"' + sku.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def buscar_variantes_por_sku(cliente, skus):
+    """
+    Busca só as variantes com os SKUs pedidos (productVariants com query sku:)
+
+    Cada lote de SKUs é paginado até o fim: a busca por termo também devolve
+    SKUs parecidos e um SKU repetido pode ter várias variantes, então uma
+    página cheia não quer dizer que os pedidos já vieram. Itens estocados em
+    mais locations do que cabem na consulta têm os níveis completados por
+    ler_niveis_itens.
+
+    Returns:
+        tuple: ([VarianteShopify], {location_id: {inventory_item_id: available}})
+    """
+    skus = sorted(set(skus))
+    variantes = []
+    niveis = {}
+    incompletos = []
+    for i in range(0, len(skus), SKUS_POR_CONSULTA):
+        lote = skus[i:i + SKUS_POR_CONSULTA]
+        variaveis = {'query': ' OR '.join(_termo_sku(sku) for sku in lote), 'first': 2 * len(lote)}
+        pedidos = set(lote)
+        while True:
+            dados = _erros_usuario(cliente.graphql(CONSULTA_VARIANTES_SKU, variaveis, custo=CUSTO_CONSULTA_SKUS),
+                                   'productVariants')
+            conexao = dados['data']['productVariants']
+            for aresta in conexao['edges']:
+                node = aresta['node']
+                # A busca da Shopify é por termo: só ficam os SKUs exatamente iguais
+                if (node.get('sku') or '') not in pedidos:
+                    continue
+                item = node['inventoryItem']
+                item_id = int(item['legacyResourceId'])
+                variantes.append(VarianteShopify(
+                    int(node['product']['legacyResourceId']), node['product']['title'] or '',
+                    int(node['legacyResourceId']), node.get('title'), node.get('sku'), item_id,
+                    int(node.get('inventoryQuantity') or 0), node.get('price')
+                ))
+                for nivel in item['inventoryLevels']['edges']:
+                    disponivel = _disponivel(nivel['node'])
+                    if disponivel is not None:
+                        location_id = int(nivel['node']['location']['legacyResourceId'])
+                        niveis.setdefault(location_id, {})[item_id] = disponivel
+                if item['inventoryLevels'].get('pageInfo', {}).get('hasNextPage'):
+                    incompletos.append(item_id)
+            if not conexao.get('pageInfo', {}).get('hasNextPage'):
+                break
+            variaveis['after'] = conexao['pageInfo']['endCursor']
+
+    if incompletos:
+        logging.info(f"{len(incompletos)} itens com mais níveis do que a consulta por SKU traz, "
+                     f"lendo o restante por inventory_levels.json")
+        location_ids = [location['id'] for location in cliente.get('locations.json').get('locations', [])]
+        for location_id, itens in ler_niveis_itens(cliente, incompletos, location_ids).items():
+            niveis.setdefault(location_id, {}).update(itens)
+    return variantes, niveis
+
+_padrao = {'cliente': None}
+_padrao_lock = threading.Lock()
+
+def cliente_padrao():
+    """Cliente da loja configurada no .env (SHOP_NAME/PASSWORD), criado uma única vez"""
+    with _padrao_lock:
+        if _padrao['cliente'] is None:
+            loja = os.getenv('SHOP_NAME')
+            token = os.getenv('PASSWORD')
+            if not loja or not token:
+                logging.error("Credenciais da Shopify não encontradas nas variáveis de ambiente")
+                return None
+            _padrao['cliente'] = ClienteShopify(loja, token, site=site_shopify_local())
+        return _padrao['cliente']
@@ -0,0 +1,267 @@
+"""
+Snapshots colunares de estoque
+
+Cada snapshot guarda uma linha por variante em três colunas contíguas
+(array 'q'): posição do SKU num índice compartilhado, quantidade e
+inventory_item_id. Com os dois lados (Hiper e Shopify) apontando para o mesmo
+índice, a comparação vira uma operação vetorizada sobre os arrays (NumPy quando
+instalado, laço simples sobre os arrays caso contrário). O NumPy só é importado
+na primeira comparação com SNAPSHOT_LINHAS_NUMPY SKUs ou mais: abaixo disso o
+laço simples termina antes do import.
+
+Os snapshots podem ser gravados em arquivos binários compactos e comparados
+entre execuções para auditoria:
+
+    python snapshot.py comparar logs/snapshots/minhaloja/shopify_20240601_100000.snap logs/snapshots/minhaloja/shopify_20240601_110000.snap
+"""
+import os
+import sys
+import json
+import array
+import struct
+import logging
+import argparse
+from datetime import datetime
+
+# Tamanho do índice a partir do qual a comparação usa o NumPy
+LINHAS_NUMPY = int(os.getenv('SNAPSHOT_LINHAS_NUMPY', '2000'))
+_numpy = {}
+
+# Valor das colunas quando o dado não existe (SKU ausente de um lado, item sem id)
+AUSENTE = -(2 ** 63)
+
+_MAGICO = b'SNAPEST1'
+
+class IndiceSku:
+    """Índice de SKUs internados: cada SKU vira uma posição inteira estável"""
+    __slots__ = ('posicoes', 'skus')
+
+    def __init__(self, skus=()):
+        self.posicoes = {}
+        self.skus = []
+        for sku in skus:
+            self.posicao(sku)
+
+    def posicao(self, sku):
+        """Posição do SKU, adicionando-o ao índice se for novo"""
+        posicao = self.posicoes.get(sku)
+        if posicao is None:
+            posicao = len(self.skus)
+            self.posicoes[sku] = posicao
+            self.skus.append(sku)
+        return posicao
+
+    def __len__(self):
+        return len(self.skus)
+
+class SnapshotEstoque:
+    """Estoque de um lado da sincronização em colunas (uma linha por variante)"""
+    __slots__ = ('origem', 'gerado_em', 'indice', 'skus', 'quantidades', 'itens')
+
+    def __init__(self, origem, indice=None, gerado_em=None):
+        self.origem = origem
+        self.gerado_em = gerado_em or datetime.now().isoformat(timespec='seconds')
+        self.indice = indice if indice is not None else IndiceSku()
+        self.skus = array.array('q')
+        self.quantidades = array.array('q')
+        self.itens = array.array('q')
+
+    def adicionar(self, sku, quantidade, item_id=None):
+        self.skus.append(self.indice.posicao(sku))
+        self.quantidades.append(int(quantidade))
+        self.itens.append(AUSENTE if item_id is None else int(item_id))
+
+    def __len__(self):
+        return len(self.skus)
+
+    @classmethod
+    def de_variantes_shopify(cls, variantes, indice=None):
+        """Snapshot da Shopify a partir dos registros VarianteShopify (linhas na mesma ordem)"""
+        snapshot = cls('shopify', indice)
+        for variante in variantes:
+            snapshot.adicionar(variante.sku or '', variante.quantidade, variante.inventory_item_id)
+        return snapshot
+
+    @classmethod
+    def de_estoque_hiper(cls, estoque_hiper, indice=None):
+        """Snapshot do Hiper a partir do dicionário SKU -> quantidade"""
+        snapshot = cls('hiper', indice)
+        for sku, quantidade in estoque_hiper.items():
+            snapshot.adicionar(sku, quantidade)
+        return snapshot
+
+    def por_sku(self):
+        """Quantidade por posição do índice (AUSENTE onde o SKU não aparece neste lado)"""
+        np = _modulo_numpy(len(self.indice))
+        if np is not None:
+            coluna = np.full(len(self.indice), AUSENTE, dtype=np.int64)
+            coluna[_np(self.skus)] = _np(self.quantidades)
+            return coluna
+        coluna = array.array('q', [AUSENTE]) * len(self.indice)
+        for posicao, quantidade in zip(self.skus, self.quantidades):
+            coluna[posicao] = quantidade
+        return coluna
+
+    def salvar(self, caminho):
+        """Grava o snapshot em binário: cabeçalho JSON, SKUs e as três colunas"""
+        cabecalho = json.dumps({
+            'origem': self.origem,
+            'gerado_em': self.gerado_em,
+            'linhas': len(self),
+            'skus': len(self.indice),
+            'byteorder': sys.byteorder
+        }).encode('utf-8')
+        skus = '\n'.join(self.indice.skus).encode('utf-8')
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with open(caminho, 'wb') as f:
+            f.write(_MAGICO)
+            f.write(struct.pack('<QQ', len(cabecalho), len(skus)))
+            f.write(cabecalho)
+            f.write(skus)
+            for coluna in (self.skus, self.quantidades, self.itens):
+                coluna.tofile(f)
+        return caminho
+
+    @classmethod
+    def carregar(cls, caminho):
+        """Lê um snapshot gravado por salvar()"""
+        with open(caminho, 'rb') as f:
+            if f.read(len(_MAGICO)) != _MAGICO:
+                raise ValueError(f"Arquivo não é um snapshot de estoque: {caminho}")
+            tamanho_cabecalho, tamanho_skus = struct.unpack('<QQ', f.read(16))
+            cabecalho = json.loads(f.read(tamanho_cabecalho).decode('utf-8'))
+            skus = f.read(tamanho_skus).decode('utf-8')
+            snapshot = cls(cabecalho['origem'], IndiceSku(skus.split('\n') if cabecalho['skus'] else []),
+                           cabecalho['gerado_em'])
+            for coluna in (snapshot.skus, snapshot.quantidades, snapshot.itens):
+                coluna.fromfile(f, cabecalho['linhas'])
+                if cabecalho['byteorder'] != sys.byteorder:
+                    coluna.byteswap()
+        return snapshot
+
+def _modulo_numpy(tamanho):
+    """NumPy (importado no primeiro uso) para índices com LINHAS_NUMPY SKUs ou mais; senão None"""
+    if tamanho < LINHAS_NUMPY:
+        return None
+    if 'np' not in _numpy:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy['np'] = numpy
+    return _numpy['np']
+
+def _np(coluna):
+    np = _numpy['np']
+    return np.frombuffer(coluna, dtype=np.int64)
+
+def diferencas(referencia, destino):
+    """
+    Linhas do destino cuja quantidade difere da referência para o mesmo SKU
+
+    Os dois snapshots precisam compartilhar o mesmo IndiceSku. SKUs que não
+    existem na referência são ignorados.
+
+    Returns:
+        list: Tuplas (linha no destino, nova quantidade)
+    """
+    if referencia.indice is not destino.indice:
+        raise ValueError("Snapshots com índices de SKU diferentes")
+    por_sku = referencia.por_sku()
+    np = _modulo_numpy(len(referencia.indice))
+    if np is not None:
+        alvo = por_sku[_np(destino.skus)]
+        linhas = np.flatnonzero((alvo != AUSENTE) & (alvo != _np(destino.quantidades)))
+        return list(zip(linhas.tolist(), alvo[linhas].tolist()))
+    resultado = []
+    for linha, (posicao, quantidade) in enumerate(zip(destino.skus, destino.quantidades)):
+        alvo = por_sku[posicao]
+        if alvo != AUSENTE and alvo != quantidade:
+            resultado.append((linha, alvo))
+    return resultado
+
+def em_comum(referencia, destino):
+    """Quantidade de linhas do destino cujo SKU existe na referência"""
+    por_sku = referencia.por_sku()
+    np = _modulo_numpy(len(referencia.indice))
+    if np is not None:
+        return int(np.count_nonzero(por_sku[_np(destino.skus)] != AUSENTE))
+    return sum(1 for posicao in destino.skus if por_sku[posicao] != AUSENTE)
+
+def comparar_snapshots(antigo, novo):
+    """
+    Compara snapshots de execuções diferentes (índices próprios) por SKU
+
+    Returns:
+        dict: SKUs alterados (sku, antes, depois), novos e removidos
+    """
+    indice = IndiceSku(novo.indice.skus)
+    reindexado = SnapshotEstoque(antigo.origem, indice, antigo.gerado_em)
+    mapa = array.array('q', (indice.posicao(sku) for sku in antigo.indice.skus))
+    reindexado.skus = array.array('q', (mapa[posicao] for posicao in antigo.skus))
+    reindexado.quantidades = antigo.quantidades
+    atual = SnapshotEstoque(novo.origem, indice, novo.gerado_em)
+    atual.skus, atual.quantidades = novo.skus, novo.quantidades
+
+    antes, depois = reindexado.por_sku(), atual.por_sku()
+    np = _modulo_numpy(len(indice))
+    if np is not None:
+        antes, depois = np.asarray(antes), np.asarray(depois)
+        presentes_antes, presentes_depois = antes != AUSENTE, depois != AUSENTE
+        alteradas = np.flatnonzero(presentes_antes & presentes_depois & (antes != depois)).tolist()
+        novas = np.flatnonzero(~presentes_antes & presentes_depois).tolist()
+        removidas = np.flatnonzero(presentes_antes & ~presentes_depois).tolist()
+    else:
+        alteradas, novas, removidas = [], [], []
+        for posicao, (a, d) in enumerate(zip(antes, depois)):
+            if a != AUSENTE and d != AUSENTE and a != d:
+                alteradas.append(posicao)
+            elif a == AUSENTE and d != AUSENTE:
+                novas.append(posicao)
+            elif a != AUSENTE and d == AUSENTE:
+                removidas.append(posicao)
+
+    return {
+        'antigo': {'origem': antigo.origem, 'gerado_em': antigo.gerado_em, 'linhas': len(antigo)},
+        'novo': {'origem': novo.origem, 'gerado_em': novo.gerado_em, 'linhas': len(novo)},
+        'alterados': [(indice.skus[p], int(antes[p]), int(depois[p])) for p in alteradas],
+        'novos': [indice.skus[p] for p in novas],
+        'removidos': [indice.skus[p] for p in removidas]
+    }
+
+def salvar_snapshots(diretorio, *snapshots):
+    """Grava os snapshots da execução como <origem>_<timestamp>.snap"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    caminhos = []
+    for snapshot in snapshots:
+        caminho = os.path.join(diretorio, f"{snapshot.origem}_{timestamp}.snap")
+        caminhos.append(snapshot.salvar(caminho))
+        logging.info(f"Snapshot {snapshot.origem} salvo em {caminho} ({len(snapshot)} linhas)")
+    return caminhos
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Auditoria de snapshots de estoque")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+    mostrar = subcomandos.add_parser('mostrar', help="Resumo de um snapshot")
+    mostrar.add_argument('arquivo')
+    comparar = subcomandos.add_parser('comparar', help="Diferenças entre dois snapshots")
+    comparar.add_argument('antigo')
+    comparar.add_argument('novo')
+    comparar.add_argument('--json', action='store_true', help="Saída completa em JSON")
+    args = parser.parse_args()
+
+    if args.comando == 'mostrar':
+        snapshot = SnapshotEstoque.carregar(args.arquivo)
+        total = sum(q for q in snapshot.quantidades)
+        print(f"{snapshot.origem} gerado em {snapshot.gerado_em}: {len(snapshot)} linhas, "
+              f"{len(snapshot.indice)} SKUs, {total} unidades")
+    else:
+        resultado = comparar_snapshots(SnapshotEstoque.carregar(args.antigo),
+                                       SnapshotEstoque.carregar(args.novo))
+        if args.json:
+            print(json.dumps(resultado, ensure_ascii=False, indent=2))
+        else:
+            print(f"{len(resultado['alterados'])} SKUs alterados, {len(resultado['novos'])} novos, "
+                  f"{len(resultado['removidos'])} removidos")
+            for sku, antes, depois in resultado['alterados'][:50]:
+                print(f"  {sku}: {antes} -> {depois}")
@@ -0,0 +1,209 @@
+"""
+Sincronização de estoque do Hiper para várias lojas Shopify
+
+O catálogo do Hiper é buscado e agrupado uma única vez; cada loja do arquivo
+de lojas roda a sua própria sincronização (catálogo Shopify, planejamento e
+escritas, com cliente, limitador e journal próprios) em paralelo sobre esse
+mesmo snapshot em memória, que nenhuma loja altera. Uma loja a mais custa só
+as chamadas da Shopify dela.
+
+Arquivo de lojas (LOJAS_ARQUIVO, padrão lojas.json na raiz do projeto):
+
+    {
+      "lojas": [
+        {"nome": "principal", "shop": "minha-loja", "token_env": "PASSWORD"},
+        {"nome": "outlet", "shop": "minha-loja-outlet", "token_env": "OUTLET_TOKEN",
+         "skus": {"prefixos": ["OUT"], "padrao": "^\\d{13}$"},
+         "locations": "quantidadeEmEstoque:Depósito"}
+      ]
+    }
+
+O token vem da variável de ambiente indicada em token_env (ou de "token",
+evitando deixar segredos no arquivo). "skus" restringe os SKUs do Hiper
+enviados à loja (prefixos e/ou expressão regular; sem filtro, todos) e
+"locations" segue o formato de ESTOQUE_LOCATIONS (padrão: o do .env).
+"site" aponta a loja para outro endereço da API (ex: servidor de benchmark).
+
+Uso:
+    python sync_lojas.py
+    python sync_lojas.py --arquivo /etc/sincronizacao/lojas.json --loja outlet
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+import sync_stock
+import shopify_api
+from journal import Journal
+from config import setup_logging, BASE_DIR, LOG_DIR, SHOPIFY_API_VERSION
+
+LOJAS_ARQUIVO = os.getenv('LOJAS_ARQUIVO') or os.path.join(BASE_DIR, 'lojas.json')
+
+def _filtro_skus(configuracao):
+    """Função SKU -> bool a partir de {"prefixos": [...], "padrao": "..."} (None = todos)"""
+    if not configuracao:
+        return None
+    prefixos = tuple(configuracao.get('prefixos') or ())
+    padrao = re.compile(configuracao['padrao']) if configuracao.get('padrao') else None
+    def aceita(sku):
+        sku = str(sku or '')
+        if prefixos and not sku.startswith(prefixos):
+            return False
+        return padrao is None or bool(padrao.search(sku))
+    return aceita
+
+def ler_lojas(arquivo=LOJAS_ARQUIVO):
+    """
+    Lê o arquivo de lojas e monta o cliente de cada uma
+
+    Returns:
+        list: dicts com nome, cliente, filtro e locations de cada loja
+    """
+    with open(arquivo, 'r', encoding='utf-8') as f:
+        configuracao = json.load(f)
+    lojas = []
+    for item in configuracao.get('lojas', []):
+        nome = item.get('nome') or item['shop']
+        token = item.get('token') or os.getenv(item.get('token_env') or '')
+        if not token:
+            raise ValueError(f"Loja {nome}: token não encontrado (token ou token_env)")
+        site = item.get('site')
+        if site:
+            site = f"{site.rstrip('/')}/admin/api/{SHOPIFY_API_VERSION}"
+        lojas.append({
+            'nome': nome,
+            'cliente': shopify_api.ClienteShopify(item['shop'], token, site=site),
+            'filtro': _filtro_skus(item.get('skus')),
+            'locations': item.get('locations')
+        })
+    nomes = [loja['nome'] for loja in lojas]
+    if len(set(nomes)) != len(nomes):
+        raise ValueError(f"Nomes de loja repetidos em {arquivo}")
+    return lojas
+
+def campos_estoque(lojas):
+    """Fontes de estoque do Hiper usadas por alguma loja além da quantidadeEmEstoque"""
+    campos = set()
+    for loja in lojas:
+        campos.update(campo for campo, _ in sync_stock.ler_mapa_locations(loja['locations']))
+    campos.discard(sync_stock.CAMPO_ESTOQUE_PADRAO)
+    return sorted(campos)
+
+def filtrar_hiper(produtos_hiper, filtro):
+    """Produtos agrupados do Hiper só com as variantes aceitas pelo filtro (sem copiar as variantes)"""
+    if filtro is None:
+        return produtos_hiper
+    filtrados = {}
+    for chave, produto in produtos_hiper.items():
+        variantes = [variante for variante in produto['variantes'] if filtro(variante['sku'])]
+        if variantes:
+            filtrados[chave] = dict(produto, variantes=variantes)
+    return filtrados
+
+def _caminho_journal(loja):
+    return os.path.join(LOG_DIR, f"estoque_{loja['nome']}.journal")
+
+def sincronizar_loja(loja, produtos_hiper):
+    """
+    Sincroniza uma loja a partir do snapshot do Hiper já agrupado
+
+    Escritas pendentes de uma execução anterior são recalculadas com o Hiper
+    desta execução e resolvidas antes (recuperar_escritas); a sincronização
+    completa segue em seguida.
+
+    Returns:
+        dict: Resultado da loja (atualizadas, segundos e erro, se houver)
+    """
+    logger = logging.getLogger(__name__)
+    nome = loja['nome']
+    cliente = loja['cliente']
+    inicio = time.perf_counter()
+    resultado = {'loja': nome, 'atualizadas': None, 'recuperadas': None, 'erro': None}
+    try:
+        with tracing.span(f"loja.{nome}", categoria='fase'):
+            journal = Journal(_caminho_journal(loja))
+            hiper = filtrar_hiper(produtos_hiper, loja['filtro'])
+            resultado['recuperadas'] = sync_stock.recuperar_escritas(journal, hiper, cliente, loja['locations'])
+
+            variantes_shopify = sync_stock.buscar_produtos_shopify(cliente=cliente)
+            logger.info(f"Loja {nome}: {sum(len(p['variantes']) for p in hiper.values())} variantes do Hiper, "
+                        f"{len(variantes_shopify)} na Shopify")
+            resultado['atualizadas'] = sync_stock.atualizar_estoque_shopify(
+                hiper, variantes_shopify, cliente=cliente, journal=journal, locations=loja['locations']
+            )
+            sync_stock.finalizar_journal(journal)
+    except Exception as e:
+        logger.error(f"Erro na sincronização da loja {nome}: {str(e)}")
+        resultado['erro'] = str(e)
+    resultado['segundos'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+def sincronizar_lojas(lojas, usar_cache=True):
+    """
+    Busca o Hiper uma vez e sincroniza todas as lojas em paralelo
+
+    Returns:
+        list: Resultado de cada loja (vazia se o Hiper não pôde ser lido)
+    """
+    logger = logging.getLogger(__name__)
+    # Escritas pendentes são recalculadas com o Hiper atual, nunca com o cache
+    if any(sync_stock.escritas_pendentes(Journal(_caminho_journal(loja))) for loja in lojas):
+        usar_cache = False
+    try:
+        with tracing.span('fetch.hiper', categoria='fase'):
+            produtos = sync_stock.buscar_produtos_hiper(usar_cache)
+        with tracing.span('group.hiper', categoria='fase'):
+            produtos_hiper = sync_stock.processar_produtos_hiper(produtos, campos_estoque(lojas))
+    except Exception as e:
+        logger.error(f"Erro ao buscar o catálogo do Hiper: {str(e)}")
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, len(lojas)), thread_name_prefix='loja') as executor:
+        resultados = list(executor.map(lambda loja: sincronizar_loja(loja, produtos_hiper), lojas))
+
+    logger.info("\n=== Resumo por loja ===")
+    for resultado in resultados:
+        if resultado['erro']:
+            logger.info(f"{resultado['loja']}: erro ({resultado['erro']})")
+        else:
+            logger.info(f"{resultado['loja']}: {resultado['atualizadas']} variantes atualizadas "
+                        f"em {resultado['segundos']}s")
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza o estoque do Hiper para várias lojas Shopify")
+    parser.add_argument('--arquivo', default=LOJAS_ARQUIVO, help="Arquivo JSON com as lojas")
+    parser.add_argument('--loja', action='append', default=[], help="Sincroniza só esta loja (pode repetir)")
+    parser.add_argument('--trace', action='store_true', help="Grava o trace da execução em LOG_DIR")
+    args = parser.parse_args()
+    tracing.configurar_por_ambiente(sys.argv[1:])
+    if not setup_logging():
+        print("Falha ao configurar logging")
+        return 1
+
+    logger = logging.getLogger(__name__)
+    try:
+        lojas = ler_lojas(args.arquivo)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Erro ao ler as lojas de {args.arquivo}: {str(e)}")
+        return 1
+    if args.loja:
+        lojas = [loja for loja in lojas if loja['nome'] in args.loja]
+    if not lojas:
+        logger.error("Nenhuma loja para sincronizar")
+        return 1
+
+    resultados = sincronizar_lojas(lojas)
+    logger.info(f"Métricas: {json.dumps(sync_stock.resumo_metricas(), ensure_ascii=False)}")
+    if tracing.ativo():
+        tracing.exportar(LOG_DIR, prefixo='trace_lojas', metadados=sync_stock.resumo_metricas())
+    return 0 if resultados and not any(r['erro'] for r in resultados) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
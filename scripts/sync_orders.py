@@ -3,16 +3,22 @@ import json
 import time
 import logging
 import shopify
+import sys
 from datetime import datetime
+from pyactiveresource.connection import Error as ErroActiveResource, ServerError
+import tracing
+import resiliencia
 from config import (
     configurar_shopify,
     setup_logging,
+    site_shopify_local,
     LOG_DIR,
-    BASE_DIR
+    BASE_DIR,
+    SHOPIFY_API_VERSION
 )
 
 # Configuração do arquivo de cache
-CACHE_DIR = os.path.join(BASE_DIR, "cache")
+CACHE_DIR = os.getenv('SYNC_CACHE_DIR') or os.path.join(BASE_DIR, "cache")
 ORDERS_CACHE_FILE = os.path.join(CACHE_DIR, "synced_orders.json")
 
 def setup_cache():
@@ -87,6 +93,11 @@ def update_synced_orders(order_id):
         logger.error(f"Erro ao atualizar cache: {str(e)}")
         return False
 
+def _falha_passageira(erro):
+    """5xx ou falha de rede do ActiveResource (os 4xx são subclasses de Error e não contam)"""
+    return isinstance(erro, ServerError) or type(erro) is ErroActiveResource or \
+        isinstance(erro, resiliencia.ERROS_TRANSITORIOS + (TimeoutError,))
+
 def configurar_sessao_shopify(session_configured=False):
     """Configura a sessão da Shopify"""
     logger = logging.getLogger(__name__)
@@ -97,7 +108,7 @@ def configurar_sessao_shopify(session_configured=False):
             
         # Obtém configurações da Shopify
         shop_url = configurar_shopify()  # Retorna o shop_name do config.py
-        api_version = '2024-01'
+        api_version = SHOPIFY_API_VERSION
         password = os.getenv("PASSWORD")
         
         if not shop_url or not password:
@@ -111,10 +122,15 @@ def configurar_sessao_shopify(session_configured=False):
         # Configura nova sessão
         session = shopify.Session(shop_url, api_version, password)
         shopify.ShopifyResource.activate_session(session)
+        site_local = site_shopify_local(api_version)
+        if site_local:
+            shopify.ShopifyResource.site = site_local
+            logger.info(f"Usando site Shopify local: {site_local}")
         logger.info("Nova sessão Shopify ativada")
         
         # Testa a conexão
-        test = shopify.Shop.current()
+        with tracing.span('shopify.Shop.current', categoria='shopify_calls'):
+            test = shopify.Shop.current()
         if not test:
             logger.error("Não foi possível conectar à Shopify")
             return False
@@ -150,6 +166,7 @@ def buscar_pedidos_shopify(session_configured=False, max_orders=None):
         # Recupera pedidos já sincronizados
         synced_orders, last_sync = get_synced_orders()
         logger.info(f"Última sincronização: {last_sync}")
+        servico = f"shopify:{configurar_shopify()}"
             
         while True:
             try:
@@ -171,15 +188,18 @@ def buscar_pedidos_shopify(session_configured=False, max_orders=None):
                 # Primeira página ou próximas páginas
                 if next_page_url:
                     logger.debug(f"Buscando próxima página: {next_page_url}")
-                    batch = shopify.Order.find(from_=next_page_url)
+                    with tracing.span('shopify.Order.find', categoria='shopify_calls', pagina='proxima'):
+                        batch = resiliencia.executar(lambda: shopify.Order.find(from_=next_page_url), servico,
+                                                     transitorio=_falha_passageira)
                 else:
                     logger.info("Buscando primeira página de pedidos...")
                     # Busca pedidos ordenados por data de criação (mais recentes primeiro)
-                    batch = shopify.Order.find(
-                        limit=limit,
-                        order="created_at DESC",
-                        status="any"  # Busca todos os status conforme solicitado
-                    )
+                    with tracing.span('shopify.Order.find', categoria='shopify_calls', pagina='primeira'):
+                        batch = resiliencia.executar(lambda: shopify.Order.find(
+                            limit=limit,
+                            order="created_at DESC",
+                            status="any"  # Busca todos os status conforme solicitado
+                        ), servico, transitorio=_falha_passageira)
                 
                 if not batch:
                     logger.info("Nenhum pedido encontrado nesta página")
@@ -426,8 +446,72 @@ def simular_envio_hiper(pedido_hiper):
     except Exception as e:
         logger.error(f"Erro ao simular envio: {str(e)}")
 
+def processar_pedidos(max_orders=None):
+    """
+    Busca os pedidos novos, mapeia para o formato Hiper e simula o envio
+
+    Requer a sessão Shopify já configurada. Usada pelo main() e pelo daemon.
+
+    Args:
+        max_orders (int): Número máximo de pedidos a processar (opcional)
+    Returns:
+        int: Quantidade de pedidos processados
+    """
+    logger = logging.getLogger(__name__)
+    
+    logger.info("Buscando pedidos novos...")
+    with tracing.span('fetch', categoria='fase'):
+        pedidos = buscar_pedidos_shopify(session_configured=True, max_orders=max_orders)
+    
+    if not pedidos:
+        logger.info("Nenhum pedido novo encontrado")
+        return 0
+        
+    logger.info(f"Encontrados {len(pedidos)} pedidos para processar")
+        
+    # Processa cada pedido
+    for pedido in pedidos:
+        logger.info(f"\n{'='*50}")
+        logger.info(f"Processando pedido #{pedido.order_number}")
+        logger.info(f"{'='*50}\n")
+        
+        # Exibe informações do pedido original com validações
+        logger.info("Dados do pedido Shopify:")
+        logger.info(f"ID: {pedido.id}")
+        
+        # Dados do cliente com validações
+        customer = getattr(pedido, 'customer', None)
+        first_name = getattr(customer, 'first_name', 'N/A') if customer else 'N/A'
+        last_name = getattr(customer, 'last_name', 'N/A') if customer else 'N/A'
+        email = getattr(pedido, 'email', 'N/A')
+        total_price = getattr(pedido, 'total_price', '0.00')
+        line_items = getattr(pedido, 'line_items', [])
+        
+        logger.info(f"Cliente: {first_name} {last_name}")
+        logger.info(f"Email: {email}")
+        logger.info(f"Total: {total_price}")
+        logger.info(f"Itens: {len(line_items)}")
+        
+        # Mapeia pedido para formato Hiper
+        logger.info("\nIniciando mapeamento para Hiper...")
+        with tracing.span('map', categoria='fase', pedido=str(pedido.id)):
+            pedido_hiper = mapear_pedido_para_hiper(pedido)
+        if not pedido_hiper:
+            logger.error(f"Falha ao mapear pedido #{pedido.order_number}")
+            continue
+            
+        # Simula envio para Hiper
+        logger.info("\nSimulando envio para Hiper...")
+        with tracing.span('write', categoria='fase', pedido=str(pedido.id)):
+            simular_envio_hiper(pedido_hiper)
+        
+        logger.info(f"\n{'='*50}")
+    
+    return len(pedidos)
+
 def main():
     """Função principal que coordena o processo de sincronização"""
+    tracing.configurar_por_ambiente(sys.argv[1:])
     try:
         # Configura logging
         if not setup_logging():
@@ -449,50 +533,7 @@ def main():
             return False
             
         # Busca novos pedidos (limitando a 1 para teste)
-        logger.info("Buscando pedidos novos...")
-        pedidos = buscar_pedidos_shopify(session_configured=True, max_orders=1)
-        
-        if not pedidos:
-            logger.info("Nenhum pedido novo encontrado")
-            return True
-            
-        logger.info(f"Encontrados {len(pedidos)} pedidos para processar")
-            
-        # Processa cada pedido
-        for pedido in pedidos:
-            logger.info(f"\n{'='*50}")
-            logger.info(f"Processando pedido #{pedido.order_number}")
-            logger.info(f"{'='*50}\n")
-            
-            # Exibe informações do pedido original com validações
-            logger.info("Dados do pedido Shopify:")
-            logger.info(f"ID: {pedido.id}")
-            
-            # Dados do cliente com validações
-            customer = getattr(pedido, 'customer', None)
-            first_name = getattr(customer, 'first_name', 'N/A') if customer else 'N/A'
-            last_name = getattr(customer, 'last_name', 'N/A') if customer else 'N/A'
-            email = getattr(pedido, 'email', 'N/A')
-            total_price = getattr(pedido, 'total_price', '0.00')
-            line_items = getattr(pedido, 'line_items', [])
-            
-            logger.info(f"Cliente: {first_name} {last_name}")
-            logger.info(f"Email: {email}")
-            logger.info(f"Total: {total_price}")
-            logger.info(f"Itens: {len(line_items)}")
-            
-            # Mapeia pedido para formato Hiper
-            logger.info("\nIniciando mapeamento para Hiper...")
-            pedido_hiper = mapear_pedido_para_hiper(pedido)
-            if not pedido_hiper:
-                logger.error(f"Falha ao mapear pedido #{pedido.order_number}")
-                continue
-                
-            # Simula envio para Hiper
-            logger.info("\nSimulando envio para Hiper...")
-            simular_envio_hiper(pedido_hiper)
-            
-            logger.info(f"\n{'='*50}")
+        processar_pedidos(max_orders=1)
             
         logger.info("\nProcesso de sincronização concluído com sucesso")
         return True
@@ -503,6 +544,8 @@ def main():
         return False
     finally:
         shopify.ShopifyResource.clear_session()
+        if tracing.ativo():
+            tracing.exportar(LOG_DIR, prefixo='trace_pedidos')
         logger.info("Processo finalizado")
 
 if __name__ == "__main__":
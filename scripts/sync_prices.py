@@ -0,0 +1,250 @@
+"""
+Sincronização de preços do Hiper para a Shopify
+
+Usa a mesma busca de catálogos da sincronização de estoque, compara o preço
+de cada SKU e envia só os que mudaram, agrupados por produto em
+productVariantsBulkUpdate. Vários produtos vão na mesma requisição (mutations
+apelidadas) e os lotes dividem o balde de custo do cliente compartilhado.
+
+Preços que parecem erro de cadastro (zerados ou com variação acima de
+PRECOS_VARIACAO_MAX) não são enviados; ficam no relatório como ignorados.
+Só o SKU exato define o preço: uma variante cujo SKU só casa pelo SKU base
+(sem o tamanho) também é ignorada e listada à parte, porque o preço de um
+SKU do Hiper iria para todos os tamanhos sem ninguém ter conferido.
+
+    python sync_prices.py
+    python daemon.py --precos 60
+"""
+import os
+import sys
+import json
+import logging
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import tracing
+import shopify_api
+import sync_stock
+from config import setup_logging, LOG_DIR
+
+# Lotes de produtos enviados ao mesmo tempo (todos dividem o balde de custo do cliente)
+PRECOS_WORKERS = int(os.getenv('PRECOS_WORKERS', '2'))
+# Máximo de produtos (productVariantsBulkUpdate apelidados) por requisição
+PRECOS_LOTE_MAX = int(os.getenv('PRECOS_LOTE_MAX', '25'))
+# Variação relativa acima da qual o preço não é enviado (0 desliga a verificação)
+PRECOS_VARIACAO_MAX = float(os.getenv('PRECOS_VARIACAO_MAX', '0.5'))
+# Custo de cada productVariantsBulkUpdate no balde do GraphQL
+CUSTO_ATUALIZACAO = 10
+
+def _centavos(valor):
+    try:
+        return round(float(valor) * 100)
+    except (TypeError, ValueError):
+        return None
+
+def _preco(centavos):
+    return f"{centavos / 100:.2f}"
+
+def precos_hiper(produtos_hiper):
+    """SKU -> preço em centavos a partir dos produtos agrupados do Hiper"""
+    precos = {}
+    for produto_info in produtos_hiper.values():
+        for variante in produto_info['variantes']:
+            if variante['sku']:
+                precos[variante['sku']] = _centavos(variante.get('preco'))
+    return precos
+
+def planejar_precos(produtos_hiper, variantes_shopify):
+    """
+    Compara os preços do Hiper com os das variantes da Shopify pelo SKU exato
+
+    Variantes sem o SKU no Hiper mas com o SKU base (shopify_api.sku_sem_tamanho)
+    lá entram nos ignorados com motivo 'apenas_sku_base', para revisão.
+
+    Returns:
+        tuple: ({produto_id: [(variante, novo preço em centavos)]}, lista de ignorados)
+    """
+    precos = precos_hiper(produtos_hiper)
+    por_produto = {}
+    ignorados = []
+    for variante in variantes_shopify:
+        sku = variante.sku
+        if not sku:
+            continue
+        if sku in precos:
+            novo = precos[sku]
+        else:
+            novo = precos.get(shopify_api.sku_sem_tamanho(variante))
+            if novo is None:
+                continue
+        atual = _centavos(variante.preco)
+        if novo == atual:
+            continue
+
+        motivo = None
+        if sku not in precos:
+            motivo = 'apenas_sku_base'
+        elif novo is None or novo <= 0:
+            motivo = 'preco_hiper_invalido'
+        elif PRECOS_VARIACAO_MAX and (not atual or abs(novo - atual) / atual > PRECOS_VARIACAO_MAX):
+            motivo = 'variacao_acima_limite'
+        if motivo:
+            ignorados.append({
+                'sku': sku,
+                'produto_id': variante.produto_id,
+                'motivo': motivo,
+                'preco_shopify': variante.preco,
+                'preco_hiper': _preco(novo) if novo is not None else None
+            })
+            continue
+        por_produto.setdefault(variante.produto_id, []).append((variante, novo))
+    return por_produto, ignorados
+
+@lru_cache(maxsize=None)
+def mutacao_precos(quantidade):
+    return shopify_api.mutacao_em_lote(
+        'atualizarPrecos', 'productVariantsBulkUpdate',
+        {'productId': 'ID!', 'variants': '[ProductVariantsBulkInput!]!'},
+        '{ product { id } userErrors { field message } }',
+        quantidade
+    )
+
+def _enviar_lote(cliente, lote):
+    """
+    Atualiza os preços de um lote de produtos numa única requisição
+
+    Returns:
+        list: Erro de cada produto do lote (None quando deu certo)
+    """
+    variaveis = {}
+    for i, (produto_id, alteracoes) in enumerate(lote):
+        variaveis[f"productId{i}"] = f"gid://shopify/Product/{produto_id}"
+        variaveis[f"variants{i}"] = [
+            {'id': f"gid://shopify/ProductVariant/{variante.variante_id}", 'price': _preco(novo)}
+            for variante, novo in alteracoes
+        ]
+    try:
+        # Preço absoluto: reenviar o lote após uma falha não altera o resultado
+        dados = cliente.graphql(mutacao_precos(len(lote)), variaveis, custo=CUSTO_ATUALIZACAO * len(lote),
+                                idempotente=True)
+    except Exception as e:
+        return [str(e)] * len(lote)
+
+    respostas = dados.get('data') or {}
+    erro_geral = '; '.join(e.get('message', '') for e in dados.get('errors') or []) or 'Sem resposta'
+    erros = []
+    for i in range(len(lote)):
+        resposta = respostas.get(f"m{i}")
+        if resposta is None:
+            erros.append(erro_geral)
+        elif resposta.get('userErrors'):
+            erros.append('; '.join(e['message'] for e in resposta['userErrors']))
+        else:
+            erros.append(None)
+    return erros
+
+def _salvar_relatorio(relatorio):
+    caminho = os.path.join(LOG_DIR, f"precos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    return caminho
+
+def atualizar_precos_shopify(produtos_hiper, variantes_shopify, cliente=None):
+    """
+    Envia para a Shopify os preços do Hiper que mudaram
+
+    Args:
+        produtos_hiper (dict): Produtos do Hiper agrupados (processar_produtos_hiper)
+        variantes_shopify (list): Registros VarianteShopify
+        cliente (ClienteShopify): Cliente da loja (padrão: loja do .env)
+    Returns:
+        int: Variantes com preço atualizado
+    """
+    logger = logging.getLogger(__name__)
+    cliente = cliente or shopify_api.cliente_padrao()
+
+    with tracing.span('plan.precos', categoria='fase'):
+        por_produto, ignorados = planejar_precos(produtos_hiper, variantes_shopify)
+    produtos = list(por_produto.items())
+    lotes = [produtos[i:i + PRECOS_LOTE_MAX] for i in range(0, len(produtos), PRECOS_LOTE_MAX)]
+    logger.info(f"Preços a atualizar: {sum(len(a) for a in por_produto.values())} variantes "
+                f"em {len(produtos)} produtos ({len(lotes)} lotes)")
+    logger.info(f"Preços ignorados: {len(ignorados)} "
+                f"({sum(i['motivo'] == 'apenas_sku_base' for i in ignorados)} só com o SKU base no Hiper)")
+
+    atualizados = []
+    erros = []
+    with tracing.span('write.precos', categoria='fase', produtos=len(produtos)):
+        with ThreadPoolExecutor(max_workers=PRECOS_WORKERS, thread_name_prefix='precos') as executor:
+            for lote, erros_lote in zip(lotes, executor.map(lambda lote: _enviar_lote(cliente, lote), lotes)):
+                for (produto_id, alteracoes), erro in zip(lote, erros_lote):
+                    for variante, novo in alteracoes:
+                        registro = {
+                            'sku': variante.sku,
+                            'produto_id': produto_id,
+                            'variante_id': variante.variante_id,
+                            'de': variante.preco,
+                            'para': _preco(novo)
+                        }
+                        if erro:
+                            registro['erro'] = erro
+                            erros.append(registro)
+                        else:
+                            atualizados.append(registro)
+                    if erro:
+                        logger.error(f"Erro ao atualizar preços do produto {produto_id}: {erro}")
+
+    for ignorado in ignorados[:20]:
+        logger.warning(f"Preço ignorado ({ignorado['motivo']}): {ignorado['sku']} "
+                       f"{ignorado['preco_shopify']} -> {ignorado['preco_hiper']}")
+    if atualizados or ignorados or erros:
+        caminho = _salvar_relatorio({
+            'gerado_em': datetime.now().isoformat(timespec='seconds'),
+            'atualizados': atualizados,
+            'ignorados': ignorados,
+            'erros': erros
+        })
+        logger.info(f"Relatório de preços salvo em {caminho}")
+
+    logger.info(f"\n=== Resumo de Preços ===")
+    logger.info(f"Variantes com preço atualizado: {len(atualizados)}")
+    logger.info(f"Variantes ignoradas: {len(ignorados)}")
+    logger.info(f"Variantes com erro: {len(erros)}")
+    return len(atualizados)
+
+def sincronizar_precos(usar_cache=True, em_memoria=False):
+    """
+    Busca os catálogos como a sincronização de estoque e atualiza os preços
+
+    Com em_memoria, reaproveita o catálogo Shopify mantido pelo sync_stock
+    (o preço faz parte do produto, então a busca incremental o acompanha)
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Iniciando sincronização de preços...")
+    try:
+        produtos_hiper, variantes_shopify = sync_stock.buscar_catalogos(usar_cache, em_memoria)
+        return atualizar_precos_shopify(produtos_hiper, variantes_shopify)
+    except Exception as e:
+        logger.error(f"Erro durante sincronização de preços: {str(e)}")
+        return None
+
+def main():
+    tracing.configurar_por_ambiente(sys.argv[1:])
+    if not setup_logging():
+        print("Falha ao configurar logging")
+        return False
+    logger = logging.getLogger(__name__)
+    try:
+        if not sync_stock.verificar_loja_shopify():
+            logger.error("Falha ao configurar Shopify")
+            return False
+        with tracing.span('sincronizar_precos', categoria='fase'):
+            return sincronizar_precos(usar_cache=False) is not None
+    finally:
+        sync_stock.encerrar_sessao_shopify()
+        if tracing.ativo():
+            tracing.exportar(LOG_DIR, prefixo='trace_precos')
+        logger.info("Processo de sincronização de preços finalizado")
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,362 @@
+"""
+Sincronização de estoque dividida em fatias (vários processos ou hosts)
+
+O coordenador só divide o catálogo Shopify em janelas disjuntas de
+created_at (sync_stock.dividir_janelas_shopify, com contagens baratas) e
+grava no manifesto da pasta compartilhada as janelas de cada fatia. Os
+produtos dessas janelas definem também os SKUs da fatia: cada trabalhador
+busca as suas janelas da Shopify enquanto lê o Hiper, agrupa só os produtos
+do Hiper com esses SKUs, lê os níveis de estoque só dos seus itens e planeja
+e grava a sua parte. Busca, agrupamento e planejamento correm em paralelo
+entre as fatias; as escritas não passam da taxa REST da loja, que é uma só
+para todos: cada trabalhador usa 1/N do balde e da taxa.
+
+Os trabalhadores registram plano e escritas no journal da fatia e atualizam
+um arquivo de pulso enquanto rodam. Se um trabalhador morre (processo
+encerrado sem resultado ou pulso parado por FATIA_PULSO_LIMITE segundos), o
+coordenador entrega a fatia a um trabalhador novo, que planeja de novo a
+partir do estoque atual: o que o anterior já gravou não aparece como
+diferença e suas pendências que já não fazem falta ficam resolvidas. Como
+inventory_levels/set grava valores absolutos, um trabalhador dado como morto
+que ainda esteja vivo só repete valores iguais. No fim, os resultados das
+fatias viram um resumo.json.
+
+Uso:
+    python sync_shards.py coordenar --fatias 4
+    python sync_shards.py coordenar --fatias 4 --externos --dir /mnt/compartilhado/fatias
+    python sync_shards.py trabalhador --dir /mnt/compartilhado/fatias --fatia 2
+
+Com --externos o coordenador não inicia os trabalhadores: eles são iniciados
+em outros hosts com a mesma pasta montada (e o mesmo .env); o coordenador só
+acompanha os pulsos e assume localmente as fatias que pararem.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import sync_stock
+import shopify_api
+from journal import Journal
+from config import setup_logging, site_shopify_local, LOG_DIR
+
+# Número de fatias e pasta compartilhada entre coordenador e trabalhadores
+FATIAS = int(os.getenv('FATIAS', '4'))
+FATIAS_DIR = os.getenv('FATIAS_DIR') or os.path.join(LOG_DIR, 'fatias')
+
+# Intervalo entre pulsos do trabalhador e quanto tempo sem pulso o dá como morto
+FATIA_PULSO = float(os.getenv('FATIA_PULSO', '2'))
+FATIA_PULSO_LIMITE = float(os.getenv('FATIA_PULSO_LIMITE', '30'))
+
+# Quantas vezes uma mesma fatia pode ser entregue a um trabalhador novo
+FATIA_REATRIBUICOES = int(os.getenv('FATIA_REATRIBUICOES', '2'))
+
+def _arquivo(diretorio, nome):
+    return os.path.join(diretorio, nome)
+
+def _gravar_json(caminho, dados):
+    """Grava o JSON com troca atômica do arquivo (quem lê nunca vê um arquivo pela metade)"""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+def _ler_json(caminho):
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def preparar_pasta(diretorio, janelas, total):
+    """
+    Grava o manifesto da execução com as janelas de cada fatia
+
+    Arquivos de uma execução anterior são descartados: a nova execução
+    planeja a partir do estoque lido agora. Com menos janelas que fatias, as
+    fatias que sobram ficam sem janela e terminam sem alterações.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    for nome in os.listdir(diretorio):
+        if nome.startswith('fatia_') or nome in ('manifesto.json', 'resumo.json'):
+            os.remove(_arquivo(diretorio, nome))
+    _gravar_json(_arquivo(diretorio, 'manifesto.json'), {
+        'fatias': total,
+        'fracao': 1 / total,
+        'janelas': [[list(janelas[numero])] if numero < len(janelas) else [] for numero in range(total)],
+        'inicio': time.time()
+    })
+
+def _pulsar(caminho, parar):
+    batidas = 0
+    while not parar.is_set():
+        batidas += 1
+        try:
+            _gravar_json(caminho, {'batidas': batidas, 'pid': os.getpid(), 'host': socket.gethostname()})
+        except OSError as e:
+            logging.warning(f"Falha ao gravar pulso: {str(e)}")
+        parar.wait(FATIA_PULSO)
+
+def planejar_fatia(cliente, janelas, journal, parte=None):
+    """
+    Busca, agrupa, planeja e grava a parte do catálogo de uma fatia
+
+    O Hiper é lido numa thread enquanto as janelas da Shopify são paginadas;
+    só os produtos do Hiper com SKU nessas janelas são agrupados.
+
+    Returns:
+        int: Escritas confirmadas por este trabalhador
+    """
+    logger = logging.getLogger(__name__)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='hiper') as executor:
+        futuro_hiper = executor.submit(sync_stock.buscar_produtos_hiper, False)
+        variantes_shopify = sync_stock.buscar_janelas_shopify(cliente, janelas)
+        produtos = futuro_hiper.result()
+    skus = {variante.sku for variante in variantes_shopify if variante.sku}
+    produtos_hiper = sync_stock.processar_produtos_hiper(
+        [produto for produto in produtos if str(produto.get('codigoDeBarras') or '') in skus]
+    )
+    logger.info(f"{len(variantes_shopify)} variantes da Shopify nas janelas, "
+                f"{sum(len(p['variantes']) for p in produtos_hiper.values())} com SKU no Hiper")
+
+    niveis = None
+    mapa, total_locations = sync_stock.resolver_locations(cliente, sync_stock.ler_mapa_locations())
+    if sync_stock.ESTOQUE_LEITURA != 'listagem' or total_locations > 1:
+        # Leitura direcionada aos itens da fatia: não disputa a consulta em massa
+        # (uma por loja) com as outras fatias
+        niveis = shopify_api.ler_niveis_itens(
+            cliente,
+            [variante.inventory_item_id for variante in variantes_shopify],
+            sorted({location_id for _, location_id in mapa}),
+            sync_stock.ESTOQUE_WORKERS
+        )
+    return sync_stock.atualizar_estoque_shopify(produtos_hiper, variantes_shopify, cliente, niveis, journal,
+                                                parte=parte)
+
+def executar_fatia(diretorio, numero, cliente=None):
+    """
+    Planeja e grava as alterações de uma fatia e o seu resultado
+
+    Um trabalhador que assume a fatia de outro planeja de novo com o mesmo
+    journal: as escritas confirmadas continuam contadas e não são repetidas.
+
+    Returns:
+        dict: Resultado da fatia (também gravado em fatia_<n>.resultado.json)
+    """
+    logger = logging.getLogger(__name__)
+    manifesto = _ler_json(_arquivo(diretorio, 'manifesto.json'))
+    if manifesto is None:
+        raise RuntimeError(f"Manifesto não encontrado em {diretorio}")
+    if cliente is None:
+        # A fatia usa só a sua parte do balde REST da loja
+        limitador = shopify_api.LimitadorTaxa(fracao=manifesto['fracao'])
+        cliente = shopify_api.ClienteShopify(os.getenv('SHOP_NAME'), os.getenv('PASSWORD'),
+                                             site=site_shopify_local(), limitador=limitador)
+
+    parar = threading.Event()
+    pulso = threading.Thread(target=_pulsar, args=(_arquivo(diretorio, f"fatia_{numero}.pulso"), parar),
+                             name='pulso', daemon=True)
+    pulso.start()
+    inicio = time.perf_counter()
+    try:
+        with Journal(_arquivo(diretorio, f"fatia_{numero}.journal")) as journal:
+            if len(journal):
+                logger.info(f"Fatia {numero}: retomando o journal de um trabalhador anterior "
+                            f"({len(journal)} alterações registradas)")
+            gravadas = planejar_fatia(cliente, manifesto['janelas'][numero], journal, f"fatia_{numero}")
+            estados = [registro.get('estado') for registro in journal.entradas.values()]
+
+        resultado = {
+            'fatia': numero,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'planejadas': len(estados) - estados.count('resolvida'),
+            'gravadas_agora': gravadas,
+            'confirmadas': estados.count('confirmada'),
+            'erros': estados.count('planejada'),
+            'segundos': round(time.perf_counter() - inicio, 3),
+            'metricas': sync_stock.resumo_metricas()
+        }
+        _gravar_json(_arquivo(diretorio, f"fatia_{numero}.resultado.json"), resultado)
+        logger.info(f"Fatia {numero} concluída: {resultado['confirmadas']} confirmadas, "
+                    f"{resultado['erros']} erros em {resultado['segundos']}s")
+        return resultado
+    finally:
+        parar.set()
+
+class Fatia:
+    """Estado de uma fatia no coordenador"""
+    def __init__(self, numero):
+        self.numero = numero
+        self.processo = None
+        self.atribuicoes = 0
+        self.batidas = None
+        self.ultimo_pulso = time.monotonic()
+        self.resultado = None
+        self.abandonada = False
+
+def _iniciar_trabalhador(diretorio, fatia):
+    fatia.atribuicoes += 1
+    fatia.ultimo_pulso = time.monotonic()
+    comando = [sys.executable, os.path.abspath(__file__), 'trabalhador',
+               '--dir', diretorio, '--fatia', str(fatia.numero)]
+    fatia.processo = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    logging.info(f"Fatia {fatia.numero}: trabalhador local iniciado (pid {fatia.processo.pid}, "
+                 f"atribuição {fatia.atribuicoes})")
+
+def _trabalhador_morreu(diretorio, fatia, agora):
+    """Motivo pelo qual o trabalhador da fatia é dado como morto, ou None"""
+    pulso = _ler_json(_arquivo(diretorio, f"fatia_{fatia.numero}.pulso"))
+    batidas = pulso and pulso.get('batidas')
+    # Compara com o relógio do coordenador: não depende do relógio dos outros hosts
+    if batidas != fatia.batidas:
+        fatia.batidas = batidas
+        fatia.ultimo_pulso = agora
+    if fatia.processo is not None and fatia.processo.poll() is not None:
+        return f"processo encerrado com código {fatia.processo.returncode}"
+    if agora - fatia.ultimo_pulso > FATIA_PULSO_LIMITE:
+        return f"sem pulso há {agora - fatia.ultimo_pulso:.0f}s"
+    return None
+
+def supervisionar(diretorio, total, externos=False):
+    """
+    Acompanha as fatias até todas terem resultado (ou esgotarem as reatribuições)
+
+    Returns:
+        list: Objetos Fatia com o resultado de cada uma
+    """
+    logger = logging.getLogger(__name__)
+    fatias = [Fatia(numero) for numero in range(total)]
+    if not externos:
+        for fatia in fatias:
+            _iniciar_trabalhador(diretorio, fatia)
+
+    while True:
+        agora = time.monotonic()
+        for fatia in fatias:
+            if fatia.resultado is not None or fatia.abandonada:
+                continue
+            fatia.resultado = _ler_json(_arquivo(diretorio, f"fatia_{fatia.numero}.resultado.json"))
+            if fatia.resultado is not None:
+                continue
+            motivo = _trabalhador_morreu(diretorio, fatia, agora)
+            if motivo is None:
+                continue
+            if fatia.processo is not None and fatia.processo.poll() is None:
+                fatia.processo.kill()
+                fatia.processo.wait()
+            if fatia.atribuicoes > FATIA_REATRIBUICOES:
+                logger.error(f"Fatia {fatia.numero} abandonada após {fatia.atribuicoes} trabalhadores: {motivo}")
+                fatia.abandonada = True
+                continue
+            logger.warning(f"Fatia {fatia.numero}: trabalhador perdido ({motivo}), reatribuindo")
+            _iniciar_trabalhador(diretorio, fatia)
+        if all(fatia.resultado is not None or fatia.abandonada for fatia in fatias):
+            return fatias
+        time.sleep(min(1.0, FATIA_PULSO))
+
+def consolidar(diretorio, fatias, segundos):
+    """Junta os resultados das fatias no resumo da execução (resumo.json)"""
+    resultados = [fatia.resultado for fatia in fatias if fatia.resultado is not None]
+    resumo = {
+        'fatias': len(fatias),
+        'planejadas': sum(r['planejadas'] for r in resultados),
+        'confirmadas': sum(r['confirmadas'] for r in resultados),
+        'erros': sum(r['erros'] for r in resultados),
+        'chamadas_api': sum(r['metricas']['api_calls'] for r in resultados),
+        'retentativas': sum(r['metricas']['retries'] for r in resultados),
+        'reatribuicoes': sum(max(0, fatia.atribuicoes - 1) for fatia in fatias),
+        'abandonadas': [fatia.numero for fatia in fatias if fatia.abandonada],
+        'segundos': round(segundos, 3),
+        'por_fatia': resultados
+    }
+    _gravar_json(_arquivo(diretorio, 'resumo.json'), resumo)
+    return resumo
+
+def coordenar(total=FATIAS, diretorio=FATIAS_DIR, externos=False, cliente=None):
+    """
+    Divide o catálogo em fatias, acompanha os trabalhadores e consolida o resumo
+
+    Returns:
+        dict: Resumo da execução ou None em caso de erro
+    """
+    logger = logging.getLogger(__name__)
+    inicio = time.perf_counter()
+    try:
+        cliente = cliente or shopify_api.cliente_padrao()
+        janelas = sync_stock.dividir_janelas_shopify(cliente, total)
+        preparar_pasta(diretorio, janelas, total)
+        if len(janelas) < total:
+            logger.warning(f"Catálogo dividido em só {len(janelas)} janelas: {total - len(janelas)} fatias sem trabalho")
+        else:
+            logger.info(f"Catálogo dividido em {len(janelas)} janelas para {total} fatias")
+
+        resumo = consolidar(diretorio, supervisionar(diretorio, total, externos), time.perf_counter() - inicio)
+        logger.info("\n=== Resumo das fatias ===")
+        logger.info(f"Alterações planejadas: {resumo['planejadas']}")
+        logger.info(f"Variantes atualizadas: {resumo['confirmadas']}")
+        logger.info(f"Erros: {resumo['erros']}")
+        logger.info(f"Reatribuições: {resumo['reatribuicoes']}")
+        if resumo['abandonadas']:
+            logger.error(f"Fatias sem resultado: {resumo['abandonadas']}")
+        return resumo
+
+    except Exception as e:
+        logger.error(f"Erro durante a coordenação das fatias: {str(e)}")
+        return None
+
+def _configurar_log_trabalhador(diretorio, numero):
+    """Log de cada trabalhador na pasta compartilhada (fatia_<n>.log)"""
+    logging.basicConfig(
+        level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO),
+        format=f"%(asctime)s [%(levelname)s] [fatia {numero}] %(message)s",
+        handlers=[
+            logging.FileHandler(_arquivo(diretorio, f"fatia_{numero}.log"), encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincronização de estoque dividida em fatias")
+    subparsers = parser.add_subparsers(dest='papel', required=True)
+    coordenador = subparsers.add_parser('coordenar', help="Divide o catálogo e distribui as fatias")
+    coordenador.add_argument('--fatias', type=int, default=FATIAS)
+    coordenador.add_argument('--dir', default=FATIAS_DIR, help="Pasta compartilhada com os trabalhadores")
+    coordenador.add_argument('--externos', action='store_true',
+                             help="Trabalhadores iniciados em outros hosts; só assume as fatias que pararem")
+    trabalhador = subparsers.add_parser('trabalhador', help="Planeja e grava uma fatia")
+    trabalhador.add_argument('--dir', default=FATIAS_DIR)
+    trabalhador.add_argument('--fatia', type=int, required=True)
+    args = parser.parse_args()
+
+    if args.papel == 'trabalhador':
+        _configurar_log_trabalhador(args.dir, args.fatia)
+        try:
+            executar_fatia(args.dir, args.fatia)
+        except Exception as e:
+            logging.error(f"Erro fatal na fatia {args.fatia}: {str(e)}")
+            return 1
+        return 0
+
+    if not setup_logging():
+        print("Falha ao configurar logging")
+        return 1
+    try:
+        if not sync_stock.verificar_loja_shopify():
+            logging.error("Falha ao configurar Shopify")
+            return 1
+        resumo = coordenar(args.fatias, args.dir, args.externos)
+        return 0 if resumo and not resumo['abandonadas'] else 1
+    finally:
+        sync_stock.encerrar_sessao_shopify()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,21 +2,31 @@ import os
 import json
 import time
 import logging
-import requests
 import unicodedata
 import re
 import sys
-from datetime import datetime, timedelta
-import shopify
-from shopify.base import ShopifyConnection
-from shopify.resources import *  # Importa todos os recursos
-from shopify.session import ValidationException as ShopifyValidationError
+import queue
+import argparse
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from datetime import datetime, timedelta, timezone
+import tracing
+import resiliencia
+import shopify_api
+from journal import Journal
+from snapshot import IndiceSku, SnapshotEstoque, diferencas, em_comum, salvar_snapshots
 from config import (
     configurar_shopify,
     configurar_hiper,
+    invalidar_token_hiper,
+    sessao_http,
     setup_logging,
+    site_shopify_local,
     LOG_DIR,
-    BASE_DIR
+    BASE_DIR,
+    SHOPIFY_API_VERSION
 )
 
 # Cache para produtos e estoque
@@ -24,10 +34,51 @@ _cache = {
     'produtos_hiper': {},
     'produtos_shopify': {},
     'last_update_hiper': datetime.min,
-    'last_update_shopify': datetime.min
+    'last_update_shopify': None,
+    'recarga_shopify': None,
+    'indice_sku': None
 }
+_cache_shopify_lock = threading.Lock()
 
-# Métricas de performance
+# Catálogo Shopify mantido em memória pelo daemon: recarregado inteiro a cada
+# CATALOGO_RECARGA_MINUTOS; entre as recargas, só os produtos alterados
+CATALOGO_RECARGA = float(os.getenv('CATALOGO_RECARGA_MINUTOS', '60'))
+
+# Pasta onde gravar os snapshots de estoque de cada execução (vazio = não grava);
+# cada loja grava na sua subpasta
+SNAPSHOT_DIR = os.getenv('SYNC_SNAPSHOT_DIR')
+
+# Janelas de created_at buscadas em paralelo (1 = paginação sequencial do ActiveResource)
+SHOPIFY_PARTICOES = int(os.getenv('SHOPIFY_PARTICOES', '1'))
+
+# Fontes de estoque do Hiper e a location da Shopify de cada uma:
+# "campo_do_hiper:location,..." com a location por id ou nome (vazia = principal)
+# Ex: ESTOQUE_LOCATIONS="quantidadeEmEstoque:Loja Centro,estoqueDeposito:61234567890"
+CAMPO_ESTOQUE_PADRAO = 'quantidadeEmEstoque'
+ESTOQUE_LOCATIONS = os.getenv('ESTOQUE_LOCATIONS', f"{CAMPO_ESTOQUE_PADRAO}:")
+
+# Escritas e leituras de estoque em paralelo (todas dividem o limitador do cliente)
+ESTOQUE_WORKERS = int(os.getenv('ESTOQUE_WORKERS', '4'))
+
+# De onde vem o estoque atual da Shopify comparado com o Hiper:
+# massa = inventoryLevels numa bulk operation, paginas = inventoryLevels em
+# páginas do GraphQL, listagem = inventory_quantity das variantes (só com uma location)
+ESTOQUE_LEITURA = os.getenv('ESTOQUE_LEITURA', 'massa')
+
+# Estoque a partir do qual a escrita é tratada como esgotamento (vai primeiro na fila)
+ESTOQUE_LIMIAR_ESGOTADO = int(os.getenv('ESTOQUE_LIMIAR_ESGOTADO', '0'))
+
+# Write-ahead journal das escritas de estoque: o plano é gravado antes da
+# primeira escrita e cada escrita confirmada é acrescentada
+JOURNAL_ESTOQUE = os.getenv('ESTOQUE_JOURNAL') or os.path.join(LOG_DIR, 'estoque.journal')
+
+_locations = {}
+
+# Uma escrita planejada de estoque: quantidade atual na location e a nova (do Hiper)
+AlteracaoEstoque = namedtuple('AlteracaoEstoque', ['location_id', 'variante', 'anterior', 'nova'])
+
+# Métricas de performance (atualizadas também pela thread de busca do Hiper)
+_metrics_lock = threading.Lock()
 _metrics = {
     'start_time': None,
     'api_calls': 0,
@@ -44,28 +95,79 @@ _metrics = {
 
 class PerformanceMetric:
     """Context manager para medir performance de operações"""
-    def __init__(self, operation_name):
+    def __init__(self, operation_name, detalhe=None):
         self.operation_name = operation_name
+        self.detalhe = detalhe
         self.start_time = None
+        self._span = None
         
     def __enter__(self):
-        self.start_time = time.time()
+        if self.operation_name != 'mapping_operations':
+            with _metrics_lock:
+                _metrics['api_calls'] += 1
+        self._span = tracing.span(self.detalhe or self.operation_name, categoria=self.operation_name)
+        self._span.__enter__()
+        self.start_time = time.perf_counter()
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb):
-        duration = time.time() - self.start_time
+        duration = time.perf_counter() - self.start_time
+        self._span.__exit__(exc_type, exc_val, exc_tb)
         _metrics['timing'][self.operation_name].append({
+            'operation': self.detalhe,
             'duration': duration,
             'timestamp': datetime.now().isoformat(),
             'error': str(exc_val) if exc_val else None
         })
         if exc_val:
             _metrics['errors'].append({
-                'operation': self.operation_name,
+                'operation': self.detalhe or self.operation_name,
                 'error': str(exc_val),
                 'timestamp': datetime.now().isoformat()
             })
 
+def resumo_metricas():
+    """Resume as métricas coletadas por categoria de operação"""
+    resumo = {
+        'api_calls': _metrics['api_calls'],
+        'retries': _metrics['retries'],
+        'errors': len(_metrics['errors'])
+    }
+    for categoria, registros in _metrics['timing'].items():
+        duracoes = [r['duration'] for r in registros]
+        resumo[categoria] = {
+            'total': len(duracoes),
+            'segundos': round(sum(duracoes), 3),
+            'max': round(max(duracoes), 3) if duracoes else 0
+        }
+    return resumo
+
+def _registrar_chamada_shopify(rota, duracao, erro):
+    """Contabiliza nas métricas as chamadas feitas pelo cliente REST de shopify_api"""
+    with _metrics_lock:
+        _metrics['api_calls'] += 1
+        _metrics['timing']['shopify_calls'].append({
+            'operation': f"shopify.{rota}",
+            'duration': duracao,
+            'timestamp': datetime.now().isoformat(),
+            'error': str(erro) if erro else None
+        })
+        if erro:
+            _metrics['errors'].append({
+                'operation': f"shopify.{rota}",
+                'error': str(erro),
+                'timestamp': datetime.now().isoformat()
+            })
+
+shopify_api.registrar_observador(_registrar_chamada_shopify)
+
+def _registrar_retentativa(servico, tentativa, erro):
+    """Conta nas métricas as retentativas feitas pela camada de resiliência"""
+    with _metrics_lock:
+        _metrics['retries'] += 1
+
+resiliencia.registrar_observador(_registrar_retentativa)
+
 def normalizar_nome(nome):
     """Normaliza o nome do produto para comparação"""
     if not nome:
@@ -172,10 +274,16 @@ def extrair_tamanho(texto):
     return texto
 
 def configurar_sessao_shopify():
-    """Configura a sessão da Shopify"""
+    """
+    Configura a sessão da Shopify (ActiveResource)
+
+    Só os pedidos usam a biblioteca shopify; estoque e preços falam com a loja
+    pelo cliente de shopify_api (verificar_loja_shopify) e não a importam.
+    """
+    import shopify
     try:
         shop_url = os.getenv("SHOP_NAME")
-        api_version = '2024-01'
+        api_version = SHOPIFY_API_VERSION
         password = os.getenv("PASSWORD")
         
         logging.info(f"Tentando configurar sessão Shopify...")
@@ -194,10 +302,15 @@ def configurar_sessao_shopify():
         logging.info("Sessão criada")
         
         shopify.ShopifyResource.activate_session(session)
+        site_local = site_shopify_local(api_version)
+        if site_local:
+            shopify.ShopifyResource.site = site_local
+            logging.info(f"Usando site Shopify local: {site_local}")
         logging.info("Sessão ativada")
         
         # Testa a conexão
-        test = shopify.Shop.current()
+        with PerformanceMetric('shopify_calls', 'shopify.Shop.current'):
+            test = shopify.Shop.current()
         if not test:
             logging.error("Não foi possível conectar à Shopify")
             return False
@@ -210,17 +323,60 @@ def configurar_sessao_shopify():
         logging.error(f"Tipo do erro: {type(e)}")
         return False
 
-def buscar_produtos_hiper():
-    """Busca produtos do Hiper e armazena em cache"""
+def encerrar_sessao_shopify():
+    """Limpa a sessão do ActiveResource, se alguma chegou a ser aberta neste processo"""
+    shopify = sys.modules.get('shopify')
+    if shopify is not None:
+        shopify.ShopifyResource.clear_session()
+
+def verificar_loja_shopify(cliente=None):
+    """Testa a conexão com a loja pelo cliente REST de shopify_api (GET shop.json)"""
+    logger = logging.getLogger(__name__)
+    cliente = cliente or shopify_api.cliente_padrao()
+    if cliente is None:
+        return False
+    try:
+        resposta = cliente.requisitar('GET', 'shop.json')
+    except Exception as e:
+        logger.error(f"Erro ao conectar à Shopify: {str(e)}")
+        return False
+    if resposta.status_code != 200:
+        logger.error(f"Não foi possível conectar à Shopify: HTTP {resposta.status_code}")
+        return False
+    logger.info(f"Conexão com Shopify estabelecida ({cliente.loja})")
+    return True
+
+def buscar_produtos_hiper(usar_cache=True):
+    """
+    Busca produtos do Hiper e armazena em cache
+
+    Args:
+        usar_cache (bool): Reaproveita o resultado dos últimos 10 minutos
+    """
     global _cache
-    if (datetime.now() - _cache['last_update_hiper']) < timedelta(minutes=10):
+    if usar_cache and (datetime.now() - _cache['last_update_hiper']) < timedelta(minutes=10):
         logging.info("Usando cache de produtos do Hiper.")
         return _cache['produtos_hiper']
 
     logging.info("Buscando produtos do Hiper...")
     config_hiper = configurar_hiper()
+    if not config_hiper:
+        raise RuntimeError("Falha ao configurar Hiper")
     url_hiper = f"{config_hiper['url_base']}/produtos/pontoDeSincronizacao"
-    response = requests.get(url_hiper, headers=config_hiper['headers'])
+    with PerformanceMetric('hiper_calls', 'hiper.produtos'):
+        response = resiliencia.executar(
+            lambda: sessao_http().get(url_hiper, headers=config_hiper['headers'], timeout=120), 'hiper')
+    
+    # Token expirado antes do previsto: gera outro e tenta de novo
+    if response.status_code == 401:
+        logging.info("Token do Hiper expirado, gerando um novo...")
+        invalidar_token_hiper()
+        config_hiper = configurar_hiper()
+        if not config_hiper:
+            raise RuntimeError("Falha ao renovar o token do Hiper")
+        with PerformanceMetric('hiper_calls', 'hiper.produtos'):
+            response = resiliencia.executar(
+                lambda: sessao_http().get(url_hiper, headers=config_hiper['headers'], timeout=120), 'hiper')
     response.raise_for_status()
     
     produtos = response.json()['produtos']
@@ -228,29 +384,295 @@ def buscar_produtos_hiper():
     _cache['last_update_hiper'] = datetime.now()
     return produtos
 
-def buscar_produtos_shopify():
-    """Busca todos os produtos da Shopify usando paginação baseada em links"""
+def buscar_produtos_shopify(particoes=None, cliente=None):
+    """
+    Busca todas as variantes da Shopify usando paginação baseada em links
+
+    Os produtos chegam com só os campos usados (id, title, variants) e viram
+    registros VarianteShopify página a página, sem manter o JSON nem objetos do
+    ActiveResource vivos durante a sincronização.
+
+    Args:
+        particoes (int): Janelas buscadas em paralelo (padrão SHOPIFY_PARTICOES);
+            com 1 a paginação é sequencial
+        cliente (ClienteShopify): Loja a consultar (padrão: loja do .env)
+    Returns:
+        list: Registros VarianteShopify agrupados por produto
+    """
     logger = logging.getLogger(__name__)
-    todos_produtos = []
-    
-    # Primeira requisição
-    produtos = shopify.Product.find(limit=250)
-    todos_produtos.extend(produtos)
-    logger.info(f"Produtos encontrados: {len(produtos)}")
-    
-    # Continua buscando enquanto houver próxima página
-    while produtos.has_next_page():
-        produtos = produtos.next_page()
-        todos_produtos.extend(produtos)
-        logger.info(f"Produtos encontrados na próxima página: {len(produtos)}")
+    cliente = cliente or shopify_api.cliente_padrao()
+    particoes = particoes or SHOPIFY_PARTICOES
+    if particoes > 1:
+        return buscar_produtos_shopify_particionado(particoes, cliente)
+
+    variantes = []
+    total_produtos = 0
+    parametros = {'limit': 250, 'fields': shopify_api.CAMPOS_PRODUTO}
+    for pagina in cliente.paginar('products.json', 'products', parametros):
+        for produto in pagina:
+            variantes.extend(shopify_api.variantes_do_produto(produto))
+        total_produtos += len(pagina)
+        logger.info(f"Produtos encontrados: {len(pagina)}")
     
-    logger.info(f"Total de produtos encontrados: {len(todos_produtos)}")
-    return todos_produtos
+    logger.info(f"Total de produtos encontrados: {total_produtos}")
+    return variantes
+
+def catalogo_shopify(cliente=None):
+    """
+    Variantes da Shopify mantidas em memória entre execuções do mesmo processo
+
+    A primeira chamada, e a primeira depois de CATALOGO_RECARGA minutos, busca
+    o catálogo inteiro (buscar_produtos_shopify) e começa um índice de SKUs
+    novo. As demais só pedem os produtos com updated_at desde a busca anterior
+    (com um minuto de folga) e trocam as variantes deles. Exclusões não mudam
+    o updated_at de nada, então a contagem de produtos é conferida: se não
+    bater, o catálogo é recarregado.
 
-def processar_produtos_hiper(produtos_hiper):
-    """Processa produtos do Hiper agrupando por produto base e suas variantes"""
+    O estoque das variantes em memória envelhece (inventory_levels/set não
+    altera o produto); quem usa este catálogo lê os níveis à parte.
+
+    Returns:
+        list: Registros VarianteShopify ordenados pelo id do produto
+    """
+    logger = logging.getLogger(__name__)
+    cliente = cliente or shopify_api.cliente_padrao()
+    with _cache_shopify_lock:
+        inicio = datetime.now(timezone.utc)
+        recarga = _cache['recarga_shopify']
+        por_produto = _cache['produtos_shopify']
+        if recarga is not None and inicio - recarga < timedelta(minutes=CATALOGO_RECARGA):
+            parametros = {
+                'limit': 250,
+                'fields': shopify_api.CAMPOS_PRODUTO,
+                'updated_at_min': (_cache['last_update_shopify'] - timedelta(minutes=1)).isoformat(timespec='seconds')
+            }
+            alterados = 0
+            with tracing.span('shopify.incremental', categoria='fase'):
+                for pagina in cliente.paginar('products.json', 'products', parametros):
+                    for produto in pagina:
+                        por_produto[produto['id']] = shopify_api.variantes_do_produto(produto)
+                    alterados += len(pagina)
+                total = cliente.contar('products/count.json')
+            if total == len(por_produto):
+                logger.info(f"Catálogo Shopify em memória: {alterados} produtos alterados, {total} no total")
+                _cache['last_update_shopify'] = inicio
+                return [variante for produto_id in sorted(por_produto) for variante in por_produto[produto_id]]
+            logger.info(f"Catálogo Shopify em memória com {len(por_produto)} produtos e a loja com {total} "
+                        f"(exclusões), recarregando")
+
+        variantes = buscar_produtos_shopify(cliente=cliente)
+        _cache['produtos_shopify'] = {
+            produto_id: list(grupo) for produto_id, grupo in groupby(variantes, key=lambda v: v.produto_id)
+        }
+        _cache['last_update_shopify'] = _cache['recarga_shopify'] = inicio
+        _cache['indice_sku'] = IndiceSku()
+        por_produto = _cache['produtos_shopify']
+        return [variante for produto_id in sorted(por_produto) for variante in por_produto[produto_id]]
+
+def _momento(texto):
+    return datetime.fromisoformat(texto.replace('Z', '+00:00'))
+
+def _filtro_janela(janela):
+    """Parâmetros created_at_min/max de uma janela (None = sem limite)"""
+    inicio, fim = janela
+    filtro = {}
+    if inicio:
+        filtro['created_at_min'] = inicio
+    if fim:
+        filtro['created_at_max'] = fim
+    return filtro
+
+def dividir_janelas_shopify(cliente, particoes, orcamento=None):
+    """
+    Divide o catálogo em janelas disjuntas de created_at com volumes parecidos
+
+    Os limites são a criação do produto mais antigo e a do mais novo (não o
+    momento atual: um catálogo importado anos atrás ocuparia uma fração ínfima
+    do intervalo). Cada corte procura o momento t em que "produtos criados
+    antes de t" chega ao quantil total*k/particoes: a cada rodada, os cortes
+    ainda longe do quantil contam em paralelo (products/count.json) um ponto
+    do intervalo que os cerca, interpolado pelas contagens nas rodadas pares
+    (acerta de primeira com criações regulares) e no meio do intervalo nas
+    ímpares (converge mesmo com o catálogo concentrado em poucos segundos).
+    As contagens gastam o mesmo limite de chamadas que as páginas, por isso
+    ficam limitadas a `orcamento`; no fim cada corte fica no ponto contado
+    mais perto do quantil. Nenhuma janela volta vazia; menos janelas que
+    `particoes` só saem quando não há segundos de criação distintos para
+    tantas. A primeira e a última janela ficam abertas, então nenhum produto
+    fica de fora mesmo com criações durante a busca.
+
+    Args:
+        cliente (ClienteShopify): Cliente REST
+        particoes (int): Quantidade desejada de janelas
+        orcamento (int): Máximo de chamadas de contagem (padrão: 30 por corte; criações
+            regulares resolvem com uma ou duas)
+    Returns:
+        list: Tuplas (created_at_min, created_at_max) em ISO 8601 (None = aberto)
+    """
+    logger = logging.getLogger(__name__)
+    orcamento = orcamento if orcamento is not None else (particoes - 1) * 30
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix='shopify') as executor:
+        futuro_total = executor.submit(cliente.contar, 'products/count.json')
+        extremos = shopify_api.extremos_criacao(cliente)
+        total = futuro_total.result()
+    if not extremos or not total:
+        return []
+    if particoes < 2:
+        return [(None, None)]
+
+    segundo = timedelta(seconds=1)
+    inicio, fim = (_momento(momento).replace(microsecond=0) for momento in extremos)
+    # Momentos já contados -> produtos criados antes deles (created_at_max é inclusivo)
+    antes = {inicio: 0, fim + segundo: total}
+    metas = [total * k / particoes for k in range(1, particoes)]
+    tolerancia = max(1.0, total / particoes / 10)
+
+    def contar_antes(momento):
+        return cliente.contar('products/count.json',
+                              {'created_at_max': (momento - segundo).isoformat(timespec='seconds')})
+
+    def proximo_ponto(meta, bissecao):
+        """Momento a contar para a meta, ou None se ela já está resolvida"""
+        pontos = sorted(antes.items())
+        if any(0 < contagem < total and abs(contagem - meta) <= tolerancia for _, contagem in pontos):
+            return None
+        a = max(p for p in pontos if p[1] <= meta)
+        b = min(p for p in pontos if p[1] >= meta)
+        largura = (b[0] - a[0]).total_seconds()
+        if largura <= 1:
+            return None
+        fracao = 0.5 if bissecao or b[1] == a[1] else (meta - a[1]) / (b[1] - a[1])
+        momento = a[0] + timedelta(seconds=max(1, min(largura - 1, round(largura * fracao))))
+        return momento if momento not in antes else None
+
+    with ThreadPoolExecutor(max_workers=max(1, particoes - 1), thread_name_prefix='shopify') as executor:
+        rodada = 0
+        while orcamento > 0:
+            pontos = (proximo_ponto(meta, rodada % 2 == 1) for meta in metas)
+            pedidos = sorted({ponto for ponto in pontos if ponto is not None})[:orcamento]
+            if not pedidos:
+                break
+            orcamento -= len(pedidos)
+            rodada += 1
+            antes.update(zip(pedidos, executor.map(contar_antes, pedidos)))
+
+    # Cada corte no ponto contado mais perto do seu quantil, sem janelas vazias
+    cortes = []
+    anterior = 0
+    for meta in metas:
+        candidatos = [(momento, contagem) for momento, contagem in antes.items() if anterior < contagem < total]
+        if not candidatos:
+            break
+        momento, anterior = min(candidatos, key=lambda p: (abs(p[1] - meta), p[0]))
+        cortes.append((momento, anterior))
+    if len(cortes) < len(metas):
+        logger.warning(f"Só {len(cortes) + 1} janelas com volume: criações concentradas em poucos segundos")
+
+    bordas = [None] + [momento.isoformat(timespec='seconds') for momento, _ in cortes] + [None]
+    volumes = [b - a for a, b in zip([0] + [c for _, c in cortes], [c for _, c in cortes] + [total])]
+    logger.info(f"Catálogo Shopify dividido em {len(bordas) - 1} janelas: {volumes} produtos")
+    return list(zip(bordas[:-1], bordas[1:]))
+
+def _buscar_janela_shopify(cliente, janela):
+    """
+    Variantes de uma janela, indexadas pelo id do produto
+
+    Janelas vizinhas dividem a borda (created_at_min/max são inclusivos); aqui
+    cada uma fica com [início, fim), então um produto criado exatamente na
+    borda pertence só à janela seguinte.
+    """
+    fim = _momento(janela[1]) if janela[1] else None
+    por_produto = {}
+    parametros = {'limit': 250, 'fields': f"{shopify_api.CAMPOS_PRODUTO},created_at", **_filtro_janela(janela)}
+    with tracing.span('shopify.janela', categoria='fase', inicio=janela[0], fim=janela[1]):
+        for pagina in cliente.paginar('products.json', 'products', parametros):
+            for produto in pagina:
+                if fim is None or _momento(produto['created_at']) < fim:
+                    por_produto[produto['id']] = shopify_api.variantes_do_produto(produto)
+    return por_produto
+
+def buscar_janelas_shopify(cliente, janelas):
+    """
+    Variantes dos produtos de algumas das janelas de dividir_janelas_shopify
+
+    Processos que buscam janelas diferentes nunca recebem o mesmo produto.
+
+    Returns:
+        list: Registros VarianteShopify ordenados pelo id do produto
+    """
+    por_produto = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(janelas)), thread_name_prefix='shopify') as executor:
+        for produtos in executor.map(lambda janela: _buscar_janela_shopify(cliente, tuple(janela)), janelas):
+            por_produto.update(produtos)
+    return [variante for produto_id in sorted(por_produto) for variante in por_produto[produto_id]]
+
+def buscar_produtos_shopify_particionado(particoes, cliente=None):
+    """
+    Busca o catálogo Shopify paginando várias janelas de created_at em paralelo
+
+    Todas as threads dividem o mesmo limitador de taxa do cliente.
+
+    Args:
+        particoes (int): Quantidade de janelas buscadas ao mesmo tempo
+        cliente (ClienteShopify): Cliente REST (padrão: loja do .env)
+    Returns:
+        list: Registros VarianteShopify ordenados pelo id do produto
+    """
+    logger = logging.getLogger(__name__)
+    cliente = cliente or shopify_api.cliente_padrao()
+    janelas = dividir_janelas_shopify(cliente, particoes)
+
+    por_produto = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(janelas)), thread_name_prefix='shopify') as executor:
+        for produtos in executor.map(lambda janela: _buscar_janela_shopify(cliente, janela), janelas):
+            logger.info(f"Produtos encontrados na janela: {len(produtos)}")
+            por_produto.update(produtos)
+
+    logger.info(f"Total de produtos encontrados: {len(por_produto)}")
+    return [variante for produto_id in sorted(por_produto) for variante in por_produto[produto_id]]
+
+def iterar_janelas_shopify(particoes, cliente=None, janelas_por_particao=4):
+    """
+    Variantes do catálogo Shopify em fluxo, janela a janela
+
+    O catálogo é dividido em particoes * janelas_por_particao janelas e no
+    máximo `particoes` delas ficam em busca ou esperando o consumidor: a
+    próxima só começa quando a mais antiga é entregue. A memória fica na
+    ordem de 1/janelas_por_particao do catálogo, e não dele inteiro como em
+    buscar_produtos_shopify_particionado.
+
+    Yields:
+        VarianteShopify: Variantes de cada janela, na ordem das janelas
+    """
+    cliente = cliente or shopify_api.cliente_padrao()
+    janelas = dividir_janelas_shopify(cliente, particoes * janelas_por_particao)
+    with ThreadPoolExecutor(max_workers=max(1, particoes), thread_name_prefix='shopify') as executor:
+        pendentes = deque()
+        for janela in janelas:
+            pendentes.append(executor.submit(_buscar_janela_shopify, cliente, janela))
+            if len(pendentes) < particoes:
+                continue
+            por_produto = pendentes.popleft().result()
+            for produto_id in sorted(por_produto):
+                yield from por_produto[produto_id]
+        while pendentes:
+            por_produto = pendentes.popleft().result()
+            for produto_id in sorted(por_produto):
+                yield from por_produto[produto_id]
+
+def processar_produtos_hiper(produtos_hiper, campos_extras=None):
+    """
+    Processa produtos do Hiper agrupando por produto base e suas variantes
+
+    Args:
+        campos_extras (list): Fontes de estoque guardadas além da
+            quantidadeEmEstoque (padrão: as mapeadas em ESTOQUE_LOCATIONS)
+    """
     logger = logging.getLogger(__name__)
     produtos_agrupados = {}  # Dicionário para agrupar produtos e variantes
+    # Fontes de estoque mapeadas além da quantidadeEmEstoque
+    if campos_extras is None:
+        campos_extras = [campo for campo, _ in ler_mapa_locations() if campo != CAMPO_ESTOQUE_PADRAO]
     
     for produto in produtos_hiper:
         nome_original = produto.get('nome', '').strip()
@@ -277,8 +699,13 @@ def processar_produtos_hiper(produtos_hiper):
             'sku': sku,
             'nome_completo': nome_original,
             'quantidade': int(produto.get('quantidadeEmEstoque', 0)),
+            'preco': produto.get('preco'),
             'tamanho': nome_original.split(' - ')[-1] if ' - ' in nome_original else None
         })
+        if campos_extras:
+            produtos_agrupados[chave_agrupamento]['variantes'][-1]['estoques'] = {
+                campo: int(produto.get(campo) or 0) for campo in campos_extras
+            }
     
     # Log dos produtos e suas variantes
     for info in produtos_agrupados.values():
@@ -297,89 +724,388 @@ def processar_produtos_hiper(produtos_hiper):
     
     return produtos_agrupados
 
-def processar_produtos_shopify(produtos_shopify):
-    """Processa produtos da Shopify mostrando produtos e variantes"""
+def processar_produtos_shopify(variantes_shopify):
+    """Processa as variantes da Shopify mostrando produtos e variantes"""
     logger = logging.getLogger(__name__)
-    produtos_filtrados = []
+    total_produtos = 0
     
-    for produto in produtos_shopify:
-        nome = produto.title.strip().lower()
+    for _, variantes in groupby(variantes_shopify, key=lambda v: v.produto_id):
+        variantes = list(variantes)
+        total_produtos += 1
         
         # Remove a verificação de "saphira" e processa todos os produtos
-        logger.info(f"\nProduto Shopify: {produto.title}")
-        logger.info(f"Total de variantes: {len(produto.variants)}")
-        
-        for variant in produto.variants:
-            logger.info(f"  - Variante: {variant.title}")
-            logger.info(f"    SKU: {variant.sku}")
-            logger.info(f"    Quantidade: {variant.inventory_quantity}")
+        logger.info(f"\nProduto Shopify: {variantes[0].titulo_produto}")
+        logger.info(f"Total de variantes: {len(variantes)}")
         
-        produtos_filtrados.append(produto)
+        for variante in variantes:
+            logger.info(f"  - Variante: {variante.titulo_variante}")
+            logger.info(f"    SKU: {variante.sku}")
+            logger.info(f"    Quantidade: {variante.quantidade}")
     
-    logger.info(f"\nTotal de produtos únicos na Shopify: {len(produtos_filtrados)}")
-    total_variantes = sum(len(p.variants) for p in produtos_filtrados)
-    logger.info(f"Total de variantes: {total_variantes}")
+    logger.info(f"\nTotal de produtos únicos na Shopify: {total_produtos}")
+    logger.info(f"Total de variantes: {len(variantes_shopify)}")
     
-    return produtos_filtrados
+    return variantes_shopify
+
+def montar_estoque_hiper(produtos_hiper, campo=CAMPO_ESTOQUE_PADRAO):
+    """
+    Monta o dicionário SKU -> quantidade a partir dos produtos agrupados do Hiper
 
-def atualizar_estoque_shopify(produtos_hiper, produtos_shopify):
-    """Atualiza o estoque dos produtos Shopify baseado no Hiper"""
+    Args:
+        campo (str): Campo de estoque do Hiper (fonte mapeada para uma location)
+    """
     logger = logging.getLogger(__name__)
-    logger.info("Iniciando atualização de estoque...")
-    
-    # Criar dicionário de SKUs do Hiper para fácil acesso
     estoque_hiper = {}
     for produto_info in produtos_hiper.values():
         for variante in produto_info['variantes']:
             sku = variante['sku']
-            quantidade = variante['quantidade']
+            if campo == CAMPO_ESTOQUE_PADRAO:
+                quantidade = variante['quantidade']
+            else:
+                quantidade = variante.get('estoques', {}).get(campo, 0)
             if sku:
                 estoque_hiper[sku] = quantidade
                 logger.info(f"Estoque Hiper - SKU: {sku}, Quantidade: {quantidade}")
                 logger.info(f"                Nome: {variante['nome_completo']}")
+    return estoque_hiper
+
+def ler_mapa_locations(texto=None):
+    """Pares (campo de estoque do Hiper, referência da location) de ESTOQUE_LOCATIONS"""
+    pares = []
+    for parte in (ESTOQUE_LOCATIONS if texto is None else texto).split(','):
+        if parte.strip():
+            campo, _, location = parte.partition(':')
+            pares.append((campo.strip(), location.strip()))
+    return pares or [(CAMPO_ESTOQUE_PADRAO, '')]
+
+def buscar_locations(cliente):
+    """Locations ativas da loja (buscadas uma vez por processo e loja)"""
+    if cliente.servico not in _locations:
+        _locations[cliente.servico] = [
+            location for location in cliente.get('locations.json').get('locations', [])
+            if location.get('active', True)
+        ]
+    return _locations[cliente.servico]
+
+def resolver_locations(cliente, mapa):
+    """
+    Troca as referências do mapa (id, nome ou vazio = principal) por location_ids
+
+    Returns:
+        tuple: ([(campo do Hiper, location_id)], quantidade de locations ativas da loja)
+    """
+    locations = buscar_locations(cliente)
+    if not locations:
+        raise ValueError("Nenhuma location ativa na loja")
+    por_referencia = {str(location['id']): location['id'] for location in locations}
+    por_referencia.update({location['name']: location['id'] for location in locations})
+    resolvido = []
+    for campo, referencia in mapa:
+        if not referencia:
+            resolvido.append((campo, locations[0]['id']))
+        elif referencia in por_referencia:
+            resolvido.append((campo, por_referencia[referencia]))
+        else:
+            raise ValueError(f"Location '{referencia}' de ESTOQUE_LOCATIONS não encontrada na loja")
+    return resolvido, len(locations)
+
+def buscar_niveis_shopify(cliente, location_ids):
+    """
+    Estoque disponível de cada item nas locations pedidas (inventoryLevels)
+
+    Returns:
+        dict: {location_id: {inventory_item_id: available}} (item sem nível = não estocado)
+    """
+    logger = logging.getLogger(__name__)
+    niveis = shopify_api.ler_niveis_estoque(cliente, location_ids, em_massa=ESTOQUE_LEITURA == 'massa')
+    for location_id, itens in niveis.items():
+        logger.info(f"Níveis de estoque lidos da location {location_id}: {len(itens)}")
+    return niveis
+
+def _snapshot_location(variantes_shopify, niveis, indice, origem):
+    """Snapshot da Shopify numa location e as variantes de cada linha (só itens estocados nela)"""
+    snapshot = SnapshotEstoque(origem, indice)
+    linhas = []
+    for variante in variantes_shopify:
+        disponivel = niveis.get(variante.inventory_item_id)
+        if disponivel is not None:
+            snapshot.adicionar(variante.sku or '', disponivel, variante.inventory_item_id)
+            linhas.append(variante)
+    return snapshot, linhas
+
+def _definir_nivel(cliente, variante, location_id, quantidade):
+    """Grava o estoque disponível de um item numa location; devolve o erro ou None"""
+    # Grava um valor absoluto: repetir a chamada após uma falha não duplica nada
+    resposta = cliente.requisitar('POST', 'inventory_levels/set.json', json={
+        'location_id': location_id,
+        'inventory_item_id': variante.inventory_item_id,
+        'available': quantidade
+    }, idempotente=True)
+    if resposta.status_code == 200:
+        return None
+    return f"HTTP {resposta.status_code}: {resposta.text[:200]}"
+
+def prioridade_escrita(alteracao):
+    """
+    Ordem na fila de escrita: esgotamentos (chegando a ESTOQUE_LIMIAR_ESGOTADO
+    ou abaixo), depois baixas e por último reposições. Dentro de cada classe,
+    vai antes quem fica com menos estoque (ou, nas reposições, quem tinha menos).
+    """
+    if alteracao.nova < alteracao.anterior:
+        classe = 0 if alteracao.nova <= ESTOQUE_LIMIAR_ESGOTADO else 1
+        return (classe, alteracao.nova)
+    return (2, alteracao.anterior)
+
+def _escrever_da_fila(cliente, fila, concluidas):
+    while True:
+        try:
+            _, _, alteracao = fila.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            erro = _definir_nivel(cliente, alteracao.variante, alteracao.location_id, alteracao.nova)
+        except Exception as e:
+            erro = str(e)
+        concluidas.put((alteracao, erro))
+
+def escrever_alteracoes(cliente, alteracoes, workers=None):
+    """
+    Grava as alterações a partir de uma fila de prioridade (prioridade_escrita)
+
+    Os workers dividem o limitador do cliente e sempre pegam a alteração mais
+    urgente que falta, de qualquer location: um SKU que esgotou no Hiper não
+    espera atrás de milhares de reposições.
+
+    Yields:
+        tuple: (AlteracaoEstoque, erro ou None) na ordem em que terminam
+    """
+    fila = queue.PriorityQueue()
+    for ordem, alteracao in enumerate(alteracoes):
+        fila.put((prioridade_escrita(alteracao), ordem, alteracao))
+    concluidas = queue.Queue()
+    trabalhadores = [
+        threading.Thread(target=_escrever_da_fila, args=(cliente, fila, concluidas),
+                         name=f"estoque_{i}", daemon=True)
+        for i in range(max(1, min(workers or ESTOQUE_WORKERS, len(alteracoes))))
+    ]
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+    for _ in range(len(alteracoes)):
+        yield concluidas.get()
+
+def chave_alteracao(alteracao):
+    return f"{alteracao.location_id}:{alteracao.variante.inventory_item_id}"
+
+def registro_alteracao(alteracao):
+    return {
+        'estado': 'planejada',
+        'sku': alteracao.variante.sku,
+        'location_id': alteracao.location_id,
+        'inventory_item_id': alteracao.variante.inventory_item_id,
+        'anterior': alteracao.anterior,
+        'nova': alteracao.nova
+    }
+
+def alteracao_do_registro(registro, anterior=None):
+    """AlteracaoEstoque a partir de um registro do journal (só o necessário para gravar e logar)"""
+    variante = shopify_api.VarianteShopify(None, '', None, None, registro.get('sku'),
+                                           registro['inventory_item_id'], anterior, None)
+    return AlteracaoEstoque(registro['location_id'], variante,
+                            registro['anterior'] if anterior is None else anterior, registro['nova'])
+
+def _pendente(registro):
+    return registro.get('estado') == 'planejada'
+
+def escritas_pendentes(journal):
+    """Escritas do journal planejadas e ainda sem confirmação ({chave: registro})"""
+    return {chave: registro for chave, registro in journal.entradas.items() if _pendente(registro)}
+
+def recuperar_escritas(journal, produtos_hiper, cliente=None, locations=None):
+    """
+    Termina as escritas de uma execução interrompida a partir do journal
+
+    O valor de cada escrita pendente é recalculado a partir do Hiper recém
+    lido (produtos_hiper), e não do plano antigo: um SKU que esgotou depois
+    da queda não volta para a quantidade de antes. Os níveis atuais desses
+    itens vêm de uma leitura direcionada (shopify_api.ler_niveis_itens); o
+    que já está certo na Shopify só é confirmado, o resto é gravado pela fila
+    de prioridade. Escritas que falharem continuam pendentes no journal.
+
+    Args:
+        produtos_hiper (dict): Produtos do Hiper agrupados, lidos nesta execução
+        locations (str): Mapa no formato de ESTOQUE_LOCATIONS (padrão: o do .env)
+    Returns:
+        int: Escritas reaplicadas (None se não havia execução interrompida)
+    """
+    logger = logging.getLogger(__name__)
+    pendentes = escritas_pendentes(journal)
+    if not pendentes:
+        return None
+    
+    logger.info(f"Journal de estoque com {len(pendentes)} escritas sem confirmação, conferindo na Shopify...")
+    cliente = cliente or shopify_api.cliente_padrao()
+    mapa, _ = resolver_locations(cliente, ler_mapa_locations(locations))
+    campo_da_location = {location_id: campo for campo, location_id in mapa}
+    estoques = {campo: montar_estoque_hiper(produtos_hiper, campo) for campo in set(campo_da_location.values())}
+    with tracing.span('recover.fetch', categoria='fase', pendentes=len(pendentes)):
+        niveis = shopify_api.ler_niveis_itens(
+            cliente,
+            [registro['inventory_item_id'] for registro in pendentes.values()],
+            sorted({registro['location_id'] for registro in pendentes.values()}),
+            ESTOQUE_WORKERS
+        )
+    
+    alteracoes = []
+    resolvidas = []
+    for chave, registro in pendentes.items():
+        campo = campo_da_location.get(registro['location_id'])
+        nova = estoques[campo].get(registro.get('sku')) if campo else None
+        atual = niveis.get(registro['location_id'], {}).get(registro['inventory_item_id'])
+        if nova is None or atual is None:
+            logger.warning(f"SKU {registro.get('sku')} do journal sem estoque no Hiper ou na location "
+                           f"{registro['location_id']}, escrita descartada")
+            resolvidas.append((chave, {'estado': 'descartada'}))
+        elif atual == nova:
+            resolvidas.append((chave, {'estado': 'confirmada'}))
+        else:
+            alteracoes.append(alteracao_do_registro(dict(registro, nova=nova), atual))
+    journal.registrar_varios(resolvidas)
+    logger.info(f"Já corretas na Shopify: {len(resolvidas)}, a reaplicar: {len(alteracoes)}")
+    
+    reaplicadas = 0
+    with tracing.span('recover.write', categoria='fase', alteracoes=len(alteracoes)):
+        for alteracao, erro in escrever_alteracoes(cliente, alteracoes):
+            if erro:
+                logger.error(f"Erro ao reaplicar {alteracao.variante.sku}: {erro}")
+                continue
+            journal.registrar(chave_alteracao(alteracao), {'estado': 'confirmada'})
+            logger.info(f"Reaplicado: {alteracao.variante.sku} na location {alteracao.location_id}: "
+                        f"{alteracao.anterior} -> {alteracao.nova}")
+            reaplicadas += 1
+    return reaplicadas
+
+def finalizar_journal(journal):
+    """Descarta as escritas resolvidas; as que falharam ficam para a próxima execução"""
+    journal.manter(_pendente)
+    if len(journal):
+        logging.getLogger(__name__).warning(
+            f"{len(journal)} escritas sem confirmação ficam no journal para a próxima execução")
+
+def planejar_estoque(produtos_hiper, variantes_shopify, cliente=None, niveis=None, locations=None, indice=None,
+                     parte=None):
+    """
+    Compara o Hiper com o estoque atual da Shopify, sem escrever nada
 
+    Cada fonte de estoque do Hiper vai para a location mapeada em
+    ESTOQUE_LOCATIONS e é comparada com o estoque disponível daquela location,
+    lido de inventoryLevels (ESTOQUE_LEITURA) e não do inventory_quantity
+    agregado da listagem.
+
+    Args:
+        niveis (dict): Estoque atual já lido ({location_id: {item: available}});
+            sem ele, é lido conforme ESTOQUE_LEITURA
+        locations (str): Mapa no formato de ESTOQUE_LOCATIONS (padrão: o do .env)
+        indice (IndiceSku): Índice de SKUs reaproveitado entre execuções
+            (padrão: um novo a cada planejamento)
+        parte (str): Identifica nos snapshots uma parte do catálogo planejada
+            em paralelo com outras da mesma loja (ex: fatia_2)
+    Returns:
+        tuple: (lista de AlteracaoEstoque, variantes sem alteração)
+    """
+    logger = logging.getLogger(__name__)
+    cliente = cliente or shopify_api.cliente_padrao()
+    sem_alteracao = 0
+    
+    # Locations de destino de cada fonte de estoque do Hiper
+    mapa, total_locations = resolver_locations(cliente, ler_mapa_locations(locations))
+    if niveis is None and (ESTOQUE_LEITURA != 'listagem' or total_locations > 1):
+        with tracing.span('fetch.niveis', categoria='fase'):
+            niveis = buscar_niveis_shopify(cliente, sorted({location_id for _, location_id in mapa}))
+    
+    # Os dois lados viram snapshots colunares sobre o mesmo índice de SKUs e a
+    # comparação é vetorizada
+    alteracoes = []
+    with tracing.span('plan', categoria='fase'):
+        indice = indice if indice is not None else IndiceSku()
+        for campo, location_id in mapa:
+            with tracing.span('match', categoria='fase', campo=campo):
+                estoque_hiper = montar_estoque_hiper(produtos_hiper, campo)
+            sufixo = (f"_{parte}" if parte else '') + (f"_{location_id}" if len(mapa) > 1 else '')
+            if niveis is None:
+                linhas = variantes_shopify
+                snapshot_shopify = SnapshotEstoque.de_variantes_shopify(variantes_shopify, indice)
+                snapshot_shopify.origem = f"shopify{sufixo}"
+            else:
+                snapshot_shopify, linhas = _snapshot_location(variantes_shopify, niveis.get(location_id, {}), indice,
+                                                              f"shopify{sufixo}")
+            snapshot_hiper = SnapshotEstoque.de_estoque_hiper(estoque_hiper, indice)
+            snapshot_hiper.origem = f"hiper{sufixo}"
+            
+            # Só atualiza se houver diferença no estoque
+            planejadas = [
+                AlteracaoEstoque(location_id, linhas[linha], snapshot_shopify.quantidades[linha], quantidade_hiper)
+                for linha, quantidade_hiper in diferencas(snapshot_hiper, snapshot_shopify)
+            ]
+            alteracoes.extend(planejadas)
+            sem_alteracao += em_comum(snapshot_hiper, snapshot_shopify) - len(planejadas)
+            
+            if SNAPSHOT_DIR:
+                salvar_snapshots(os.path.join(SNAPSHOT_DIR, cliente.loja), snapshot_hiper, snapshot_shopify)
+        classes = [0, 0, 0]
+        for alteracao in alteracoes:
+            classes[prioridade_escrita(alteracao)[0]] += 1
+        logger.info(f"Alterações planejadas: {len(alteracoes)} em {len({a.location_id for a in alteracoes})} "
+                    f"location(s) - esgotando: {classes[0]}, baixas: {classes[1]}, reposições: {classes[2]}")
+    return alteracoes, sem_alteracao
+
+def atualizar_estoque_shopify(produtos_hiper, variantes_shopify, cliente=None, niveis=None, journal=None,
+                              locations=None, indice=None, parte=None):
+    """
+    Atualiza o estoque dos produtos Shopify baseado no Hiper
+
+    Planeja com planejar_estoque e grava direto na location certa (sem buscar
+    o nível antes de gravar), em ordem de urgência (escrever_alteracoes).
+
+    Args:
+        niveis (dict): Estoque atual já lido ({location_id: {item: available}})
+        journal (Journal): Recebe o plano antes da primeira escrita e cada
+            escrita confirmada (recuperar_escritas retoma após uma queda)
+        locations (str): Mapa no formato de ESTOQUE_LOCATIONS (padrão: o do .env)
+        indice (IndiceSku): Índice de SKUs reaproveitado entre execuções
+        parte (str): Parte do catálogo, repassada a planejar_estoque
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Iniciando atualização de estoque...")
+    cliente = cliente or shopify_api.cliente_padrao()
+    
     # Contadores para o relatório
     atualizados = 0
-    sem_alteracao = 0
+    alteracoes, sem_alteracao = planejar_estoque(produtos_hiper, variantes_shopify, cliente, niveis, locations,
+                                                 indice, parte)
     
-    # Atualizar estoque na Shopify
-    for produto in produtos_shopify:
-        for variant in produto.variants:
-            sku = variant.sku
-            if sku in estoque_hiper:
-                quantidade_hiper = estoque_hiper[sku]
-                quantidade_atual = int(variant.inventory_quantity or 0)
-                
-                # Só atualiza se houver diferença no estoque
-                if quantidade_atual != quantidade_hiper:
-                    try:
-                        # Busca o location_id
-                        inventory_levels = shopify.InventoryLevel.find(
-                            inventory_item_ids=variant.inventory_item_id
-                        )
-                        
-                        if inventory_levels:
-                            location_id = inventory_levels[0].location_id
-                            
-                            # Atualiza o estoque
-                            result = shopify.InventoryLevel.set(
-                                location_id=location_id,
-                                inventory_item_id=variant.inventory_item_id,
-                                available=quantidade_hiper
-                            )
-                            
-                            if result:
-                                logger.info(f"Atualizado: {produto.title} - {variant.title}")
-                                logger.info(f"SKU: {sku}")
-                                logger.info(f"Quantidade anterior: {quantidade_atual}")
-                                logger.info(f"Nova quantidade: {quantidade_hiper}")
-                                atualizados += 1
-                                
-                    except Exception as e:
-                        logger.error(f"Erro ao atualizar {sku}: {str(e)}")
-                else:
-                    sem_alteracao += 1
-                    logger.debug(f"Sem alteração necessária: {produto.title} - {variant.title} (SKU: {sku})")
+    if journal is not None:
+        planejadas = [(chave_alteracao(a), registro_alteracao(a)) for a in alteracoes]
+        chaves = {chave for chave, _ in planejadas}
+        # Pendências de execuções anteriores que a comparação atual já não precisa gravar
+        resolvidas = [(chave, {'estado': 'resolvida'}) for chave in escritas_pendentes(journal) if chave not in chaves]
+        journal.registrar_varios(planejadas + resolvidas)
+    
+    # Atualizar estoque na Shopify, das alterações mais urgentes para as menos
+    with tracing.span('write', categoria='fase', alteracoes=len(alteracoes)):
+        for alteracao, erro in escrever_alteracoes(cliente, alteracoes):
+            variante = alteracao.variante
+            sku = variante.sku
+            if erro:
+                logger.error(f"Erro ao atualizar {sku}: {erro}")
+                continue
+            if journal is not None:
+                journal.registrar(chave_alteracao(alteracao), {'estado': 'confirmada'})
+            logger.info(f"Atualizado: {variante.titulo_produto} - {variante.titulo_variante}")
+            logger.info(f"SKU: {sku}")
+            logger.info(f"Location: {alteracao.location_id}")
+            logger.info(f"Quantidade anterior: {alteracao.anterior}")
+            logger.info(f"Nova quantidade: {alteracao.nova}")
+            atualizados += 1
     
     logger.info(f"\n=== Resumo de Atualizações ===")
     logger.info(f"Variantes atualizadas: {atualizados}")
@@ -388,34 +1114,142 @@ def atualizar_estoque_shopify(produtos_hiper, produtos_shopify):
     
     return atualizados
 
-def sincronizar_estoque():
-    """Função principal com atualização de estoque"""
+def buscar_e_processar_hiper(usar_cache=True):
+    """Busca o catálogo do Hiper e agrupa por produto base (roda em thread própria)"""
+    with tracing.span('fetch.hiper', categoria='fase'):
+        produtos_hiper = buscar_produtos_hiper(usar_cache)
+    with tracing.span('group.hiper', categoria='fase'):
+        return processar_produtos_hiper(produtos_hiper)
+
+def buscar_catalogos(usar_cache=True, em_memoria=False):
+    """
+    Busca os dois catálogos ao mesmo tempo: o Hiper numa thread (já agrupando
+    assim que chega) e a Shopify na thread principal
+
+    Args:
+        em_memoria (bool): Usa o catálogo Shopify mantido entre execuções
+            (catalogo_shopify), atualizado só com os produtos alterados
+    Returns:
+        tuple: (produtos do Hiper agrupados, variantes VarianteShopify)
+    """
+    with tracing.span('fetch', categoria='fase'):
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='hiper') as executor:
+            futuro_hiper = executor.submit(buscar_e_processar_hiper, usar_cache)
+            
+            with tracing.span('fetch.shopify', categoria='fase'):
+                produtos_shopify = catalogo_shopify() if em_memoria else buscar_produtos_shopify()
+            with tracing.span('group.shopify', categoria='fase'):
+                variantes_shopify = processar_produtos_shopify(produtos_shopify)
+            
+            return futuro_hiper.result(), variantes_shopify
+
+def sincronizar_skus(skus, usar_cache=True, cliente=None):
+    """
+    Sincroniza só os SKUs pedidos, sem percorrer o catálogo da Shopify
+
+    As variantes e o estoque de cada location vêm de uma consulta
+    productVariants(query: "sku:...") por lote de SKUs. O Hiper não tem busca
+    por SKU: o catálogo vem de uma única chamada (ou do cache) e é filtrado
+    antes de agrupar.
+
+    Returns:
+        int: Variantes atualizadas (None em caso de erro)
+    """
+    logger = logging.getLogger(__name__)
+    skus = {str(sku).strip() for sku in skus if sku and str(sku).strip()}
+    logger.info(f"Sincronização direcionada de {len(skus)} SKU(s)...")
+    try:
+        cliente = cliente or shopify_api.cliente_padrao()
+        with tracing.span('fetch', categoria='fase', skus=len(skus)):
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix='hiper') as executor:
+                futuro_hiper = executor.submit(buscar_produtos_hiper, usar_cache)
+                with tracing.span('fetch.shopify', categoria='fase'):
+                    variantes_shopify, niveis = shopify_api.buscar_variantes_por_sku(cliente, skus)
+                produtos_hiper = [
+                    produto for produto in futuro_hiper.result()
+                    if str(produto.get('codigoDeBarras') or '').strip() in skus
+                ]
+        
+        for sku in sorted(skus - {str(p.get('codigoDeBarras')).strip() for p in produtos_hiper}):
+            logger.warning(f"SKU {sku} não encontrado no Hiper")
+        for sku in sorted(skus - {v.sku for v in variantes_shopify}):
+            logger.warning(f"SKU {sku} não encontrado na Shopify")
+        
+        return atualizar_estoque_shopify(processar_produtos_hiper(produtos_hiper), variantes_shopify,
+                                         cliente, niveis)
+    except Exception as e:
+        logger.error(f"Erro durante sincronização direcionada: {str(e)}")
+        return None
+
+def ler_skus(arquivo):
+    """SKUs de um arquivo texto, um por linha (linhas vazias e # comentários ignorados)"""
+    with open(arquivo, 'r', encoding='utf-8') as f:
+        return [linha.strip() for linha in f if linha.strip() and not linha.lstrip().startswith('#')]
+
+def sincronizar_estoque(usar_cache=True, caminho_journal=JOURNAL_ESTOQUE, recomecar=False, em_memoria=False):
+    """
+    Função principal com atualização de estoque
+
+    Se a execução anterior caiu no meio das escritas (ou deixou escritas com
+    erro no journal), o Hiper é lido de novo, sem cache, e as pendências são
+    resolvidas primeiro (recuperar_escritas), antes da leitura do catálogo da
+    Shopify; a sincronização completa segue na mesma execução.
+
+    Args:
+        usar_cache (bool): Permite reaproveitar o catálogo do Hiper em cache
+        caminho_journal (str): Write-ahead journal das escritas de estoque
+        recomecar (bool): Descarta o journal de uma execução interrompida
+        em_memoria (bool): Reaproveita o catálogo Shopify e o índice de SKUs
+            da execução anterior do mesmo processo (modo daemon); ignorado com
+            ESTOQUE_LEITURA=listagem, em que o estoque vem da própria listagem
+    Returns:
+        int: Variantes atualizadas (None em caso de erro)
+    """
     logger = logging.getLogger(__name__)
     logger.info("Iniciando sincronização...")
     
     try:
-        # Busca produtos
-        produtos_hiper = buscar_produtos_hiper()
-        produtos_shopify = buscar_produtos_shopify()
-        
-        # Processa produtos
-        saphira_hiper = processar_produtos_hiper(produtos_hiper)
-        saphira_shopify = processar_produtos_shopify(produtos_shopify)
+        em_memoria = em_memoria and ESTOQUE_LEITURA != 'listagem'
+        journal = Journal(caminho_journal)
+        if recomecar:
+            journal.limpar()
+        if escritas_pendentes(journal):
+            saphira_hiper = buscar_e_processar_hiper(usar_cache=False)
+            recuperadas = recuperar_escritas(journal, saphira_hiper)
+            logger.info(f"Execução anterior interrompida concluída: {recuperadas} escritas reaplicadas")
+            with tracing.span('fetch.shopify', categoria='fase'):
+                saphira_shopify = processar_produtos_shopify(
+                    catalogo_shopify() if em_memoria else buscar_produtos_shopify())
+        else:
+            saphira_hiper, saphira_shopify = buscar_catalogos(usar_cache, em_memoria)
         
         # Atualiza estoque
-        total_atualizados = atualizar_estoque_shopify(saphira_hiper, saphira_shopify)
+        indice = _cache['indice_sku'] if em_memoria else None
+        total_atualizados = atualizar_estoque_shopify(saphira_hiper, saphira_shopify, journal=journal,
+                                                      indice=indice)
+        finalizar_journal(journal)
         
         # Log do resumo
         logger.info("\n=== Resumo ===")
         logger.info(f"Total de produtos no Hiper: {len(saphira_hiper)}")
-        logger.info(f"Total de produtos na Shopify: {len(saphira_shopify)}")
+        logger.info(f"Total de variantes na Shopify: {len(saphira_shopify)}")
         logger.info(f"Total de variantes atualizadas: {total_atualizados}")
+        return total_atualizados
         
     except Exception as e:
         logger.error(f"Erro durante processamento: {str(e)}")
+        return None
 
 def main():
     """Função principal que coordena o processo de sincronização"""
+    parser = argparse.ArgumentParser(description="Sincroniza o estoque do Hiper para a Shopify")
+    parser.add_argument('--sku', action='append', default=[], help="Sincroniza só este SKU (pode repetir)")
+    parser.add_argument('--sku-file', help="Arquivo com os SKUs a sincronizar, um por linha")
+    parser.add_argument('--recomecar', action='store_true',
+                        help="Descarta o journal de escritas de uma execução interrompida")
+    parser.add_argument('--trace', action='store_true', help="Grava o trace da execução em LOG_DIR")
+    args = parser.parse_args()
+    tracing.configurar_por_ambiente(sys.argv[1:])
     try:
         if not setup_logging():
             print("Falha ao configurar logging")
@@ -424,16 +1258,25 @@ def main():
         logger = logging.getLogger(__name__)
         logger.info("Iniciando processo de sincronização...")
         
-        if not configurar_sessao_shopify():
+        if not verificar_loja_shopify():
             logger.error("Falha ao configurar Shopify")
             return False
         
-        sincronizar_estoque()
+        skus = args.sku + (ler_skus(args.sku_file) if args.sku_file else [])
+        if skus:
+            with tracing.span('sincronizar_skus', categoria='fase'):
+                sincronizar_skus(skus, usar_cache=False)
+        else:
+            with tracing.span('sincronizar_estoque', categoria='fase'):
+                sincronizar_estoque(recomecar=args.recomecar)
         
     except Exception as e:
         logger.error(f"Erro fatal durante sincronização: {str(e)}")
     finally:
-        shopify.ShopifyResource.clear_session()
+        encerrar_sessao_shopify()
+        logger.info(f"Métricas: {json.dumps(resumo_metricas(), ensure_ascii=False)}")
+        if tracing.ativo():
+            tracing.exportar(LOG_DIR, prefixo='trace_estoque', metadados=resumo_metricas())
         logger.info("Processo de sincronização finalizado")
 
 if __name__ == "__main__":
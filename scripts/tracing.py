@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+
+# Estado global do tracing (desligado por padrão)
+_estado = {
+    'ativo': False,
+    'inicio': 0.0,
+    'eventos': [],
+    'pilhas': {},
+    'threads': {}
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+
+class _SpanNulo:
+    """Span vazio usado quando o tracing está desligado"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+_SPAN_NULO = _SpanNulo()
+
+class Span:
+    """Context manager que mede um trecho da sincronização com perf_counter"""
+    __slots__ = ('nome', 'categoria', 'args', 'inicio', 'filhos')
+
+    def __init__(self, nome, categoria, args):
+        self.nome = nome
+        self.categoria = categoria
+        self.args = args
+        self.inicio = None
+        self.filhos = 0.0
+
+    def __enter__(self):
+        pilha = getattr(_local, 'pilha', None)
+        if pilha is None:
+            pilha = _local.pilha = []
+        pilha.append(self)
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        fim = time.perf_counter()
+        duracao = fim - self.inicio
+        pilha = _local.pilha
+        caminho = ';'.join(s.nome for s in pilha)
+        pilha.pop()
+        if pilha:
+            pilha[-1].filhos += duracao
+
+        thread = threading.current_thread()
+        evento = {
+            'name': self.nome,
+            'cat': self.categoria,
+            'ph': 'X',
+            'ts': (self.inicio - _estado['inicio']) * 1e6,
+            'dur': duracao * 1e6,
+            'pid': os.getpid(),
+            'tid': thread.ident
+        }
+        if self.args or exc_val:
+            evento['args'] = dict(self.args)
+            if exc_val:
+                evento['args']['erro'] = str(exc_val)
+
+        with _lock:
+            _estado['eventos'].append(evento)
+            _estado['threads'][thread.ident] = thread.name
+            # Tempo próprio (sem os filhos) para o arquivo de pilhas colapsadas
+            _estado['pilhas'][caminho] = _estado['pilhas'].get(caminho, 0.0) + (duracao - self.filhos)
+        return False
+
+def ativar():
+    """Liga o tracing e descarta eventos anteriores"""
+    with _lock:
+        _estado['eventos'] = []
+        _estado['pilhas'] = {}
+        _estado['threads'] = {}
+        _estado['inicio'] = time.perf_counter()
+        _estado['ativo'] = True
+
+def desativar():
+    """Desliga o tracing mantendo os eventos já coletados"""
+    _estado['ativo'] = False
+
+def ativo():
+    """Indica se o tracing está ligado"""
+    return _estado['ativo']
+
+def configurar_por_ambiente(argv=None):
+    """Liga o tracing se SYNC_TRACE estiver definido ou --trace for passado"""
+    valor = os.getenv('SYNC_TRACE', '').strip().lower()
+    if valor in ('1', 'true', 'sim', 'on') or (argv and '--trace' in argv):
+        ativar()
+    return ativo()
+
+def span(nome, categoria='sync', **args):
+    """
+    Abre um span nomeado
+
+    Args:
+        nome (str): Nome da fase ou chamada (ex: 'fetch', 'hiper.produtos')
+        categoria (str): Categoria exibida no Perfetto (ex: 'fase', 'http')
+        **args: Atributos extras gravados no evento
+    """
+    if not _estado['ativo']:
+        return _SPAN_NULO
+    return Span(nome, categoria, args)
+
+def exportar(diretorio, prefixo='trace', metadados=None):
+    """
+    Grava o trace no formato Chrome (JSON) e em pilhas colapsadas (flamegraph)
+
+    Args:
+        diretorio (str): Diretório de saída
+        prefixo (str): Prefixo dos arquivos gerados
+        metadados (dict): Dados extras gravados em otherData
+    Returns:
+        tuple: (caminho do JSON, caminho do arquivo .folded) ou None se vazio
+    """
+    logger = logging.getLogger(__name__)
+
+    with _lock:
+        eventos = list(_estado['eventos'])
+        pilhas = dict(_estado['pilhas'])
+        threads = dict(_estado['threads'])
+
+    if not eventos:
+        logger.info("Nenhum span registrado, trace não exportado")
+        return None
+
+    os.makedirs(diretorio, exist_ok=True)
+    carimbo = datetime.now().strftime('%Y%m%d_%H%M%S')
+    arquivo_trace = os.path.join(diretorio, f"{prefixo}_{carimbo}.json")
+    arquivo_pilhas = os.path.join(diretorio, f"{prefixo}_{carimbo}.folded")
+
+    pid = os.getpid()
+    nomes_threads = [
+        {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': nome}}
+        for tid, nome in threads.items()
+    ]
+
+    with open(arquivo_trace, 'w', encoding='utf-8') as f:
+        json.dump({
+            'traceEvents': nomes_threads + eventos,
+            'displayTimeUnit': 'ms',
+            'otherData': metadados or {}
+        }, f, ensure_ascii=False, default=str)
+
+    # Formato "a;b;c <microssegundos>" aceito por flamegraph.pl / speedscope
+    with open(arquivo_pilhas, 'w', encoding='utf-8') as f:
+        for caminho, segundos in sorted(pilhas.items()):
+            f.write(f"{caminho} {max(int(segundos * 1e6), 0)}\n")
+
+    logger.info(f"Trace exportado: {arquivo_trace}")
+    logger.info(f"Pilhas colapsadas: {arquivo_pilhas}")
+    return arquivo_trace, arquivo_pilhas